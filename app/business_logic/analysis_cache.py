@@ -0,0 +1,146 @@
+#Two-tier cache for LLM verdicts: an in-memory LRU in front of an optional SQLite file.
+#Essentially identical transactions (same customer, IP, card, merchant and amount bucket, or a retried webhook)
+#reuse the previous RiskAnalysis instead of paying provider latency and cost again.
+
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.utils.shared_state import SharedState, SQLiteState, shared_state
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _field(transaction: Transaction, path: str):
+    value = transaction
+    for part in path.split("."):
+        value = getattr(value, part)
+    return value
+
+
+def make_key_builder(fields: List[str], amount_bucket: float):
+    """
+    Build the normalization function that turns a transaction into a cache key.
+    "amount" is bucketed so that small differences map to the same key, strings are case-folded.
+    """
+    def build(transaction: Transaction, llm_name: str) -> str:
+        parts = [llm_name]
+        for path in fields:
+            if path == "amount":
+                parts.append(str(int(transaction.amount // amount_bucket)) if amount_bucket > 0 else repr(transaction.amount))
+            else:
+                parts.append(str(_field(transaction, path)).strip().lower())
+        return "|".join(parts)
+    return build
+
+
+class DiskTier(SQLiteState):
+    """
+    SQLite file tier that survives restarts and is shared by the workers of the host.
+    """
+    def __init__(self, path: str):
+        super().__init__(path, table="analysis_cache")
+
+
+class AnalysisCache:
+    """
+    Size-bounded LRU with TTL, optionally backed by a second tier shared between workers
+    (a DiskTier or any SharedState). Entries found there are copied into the LRU.
+    """
+    def __init__(self, ttl: float, max_entries: int, key_builder, disk: Optional[SharedState] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_builder = key_builder
+        self.disk = disk
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, transaction: Transaction, llm_name: str) -> str:
+        return self.key_builder(transaction, llm_name)
+
+    async def get(self, transaction: Transaction, llm_name: str) -> Optional[RiskAnalysis]:
+        key = self.key(transaction, llm_name)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, analysis = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analysis.model_copy(deep=True)
+            del self._entries[key]
+            self.expirations += 1
+
+        if self.disk is not None:
+            entry = await self._shared_get(key)
+            if entry is not None and entry[0] > now:
+                expires_at, analysis = entry
+                self._put(key, expires_at, analysis)
+                self.disk_hits += 1
+                return analysis.model_copy(deep=True)
+
+        self.misses += 1
+        return None
+
+    async def set(self, transaction: Transaction, llm_name: str, analysis: RiskAnalysis):
+        key = self.key(transaction, llm_name)
+        expires_at = time.time() + self.ttl
+        self._put(key, expires_at, analysis.model_copy(deep=True))
+        if self.disk is not None:
+            #the absolute expiry travels with the value so a copy in another worker's LRU expires at the same time
+            try:
+                await self.disk.set(f"analysis:{key}", f"{expires_at}|{analysis.model_dump_json()}", self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared cache tier unavailable: {e}")
+
+    async def _shared_get(self, key: str) -> Optional[tuple]:
+        #a tier that is down or holds an unreadable entry is a miss, never a failed request
+        try:
+            value = await self.disk.get(f"analysis:{key}")
+            if value is None:
+                return None
+            expires_at, _, data = value.partition("|")
+            return float(expires_at), RiskAnalysis.model_validate_json(data)
+        except Exception as e:
+            logger.warning(f"Shared cache tier unavailable: {e}")
+            return None
+
+    def _put(self, key: str, expires_at: float, analysis: RiskAnalysis):
+        self._entries[key] = (expires_at, analysis)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        #the second tier is shared with the other workers and expires on its own, only this process' state is reset
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+analysis_cache = AnalysisCache(
+    ttl=settings.cache_ttl_seconds,
+    max_entries=settings.cache_max_entries,
+    key_builder=make_key_builder(settings.cache_key_fields, settings.cache_amount_bucket),
+    disk=DiskTier(settings.cache_db_path) if settings.cache_db_path
+    else shared_state if settings.shared_state_url != "memory" else None,
+)
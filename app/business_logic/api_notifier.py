@@ -1,9 +1,16 @@
+import asyncio
 import httpx
+from typing import List, Optional
 from app.models import Transaction, RiskAnalysis
 from app.config import settings
+from app.utils.http_clients import http_clients
+from app.utils.metrics import notifications, time_stage
 
-async def notify_api(transaction: Transaction, risk_analysis: RiskAnalysis):
-    message = {
+import logging
+logger = logging.getLogger(__name__)
+
+def build_notification(transaction: Transaction, risk_analysis: RiskAnalysis) -> dict:
+    return {
         "alert_type": "high_risk_transaction",
         "transaction_id": transaction.transaction_id,
         "risk_score": risk_analysis.risk_score,
@@ -29,14 +36,70 @@ async def notify_api(transaction: Transaction, risk_analysis: RiskAnalysis):
             }    
         }
     }   
+
+async def notify_api(transaction: Transaction, risk_analysis: RiskAnalysis, client: Optional[httpx.AsyncClient] = None):
+    message = build_notification(transaction, risk_analysis)
     
-    try:
-        async with httpx.AsyncClient() as client:
+    #reuse the shared notifier pool unless a client is passed in
+    client = client or http_clients.get("notifier")
+    with time_stage("notification"):
+        try:
             response = await client.post(settings.notifyadmin_api_url, json=message)
             response.raise_for_status()
-            print(f"Notification sent successfully: {response.status_code}")
-    except httpx.RequestError as e:
-        print(f"Error sending notification: {e}")
-    except httpx.HTTPStatusError as e:
-        print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+            notifications.inc("sent")
+            logger.info("Notification sent", extra={"status_code": response.status_code})
+        except httpx.RequestError as e:
+            notifications.inc("failed")
+            logger.error(f"Error sending notification: {e}")
+        except httpx.HTTPStatusError as e:
+            notifications.inc("failed")
+            logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+
+
+
+class PartialDelivery(Exception):
+    """
+    Some messages of a batch posted one by one went out, the ones in failed did not.
+    """
+    def __init__(self, failed: List[dict], error: Exception):
+        super().__init__(f"{len(failed)} notifications failed: {error}")
+        self.failed = failed
+
+
+async def send_notifications(messages: List[dict], client: Optional[httpx.AsyncClient] = None):
+    """
+    Deliver a batch of notifications, raising on failure so the caller can retry.
+    With notifyadmin_batch_url set the batch is posted as one JSON array,
+    otherwise every message is posted to notifyadmin_api_url over the shared pool
+    and PartialDelivery names the messages to retry.
+    """
+    client = client or http_clients.get("notifier")
+    with time_stage("notification"):
+        try:
+            await _deliver(client, messages)
+        except PartialDelivery as e:
+            notifications.inc("sent", amount=len(messages) - len(e.failed))
+            notifications.inc("failed", amount=len(e.failed))
+            raise
+        except Exception:
+            notifications.inc("failed", amount=len(messages))
+            raise
+    notifications.inc("sent", amount=len(messages))
+
+
+async def _post(client: httpx.AsyncClient, message: dict):
+    response = await client.post(settings.notifyadmin_api_url, json=message)
+    response.raise_for_status()
+
+
+async def _deliver(client: httpx.AsyncClient, messages: List[dict]):
+    if settings.notifyadmin_batch_url:
+        response = await client.post(settings.notifyadmin_batch_url, json=messages)
+        response.raise_for_status()
+        return
 
+    #every post runs to completion, so a retry only resends the messages that did not go out
+    results = await asyncio.gather(*(_post(client, message) for message in messages), return_exceptions=True)
+    errors = [(message, result) for message, result in zip(messages, results) if isinstance(result, Exception)]
+    if errors:
+        raise PartialDelivery([message for message, _ in errors], errors[0][1])
@@ -0,0 +1,319 @@
+#Online amount baselines learned from every scored transaction:
+#an EWMA mean/variance per customer (-> z-score of the amount against the customer's history)
+#and a mergeable quantile sketch per merchant category and currency (-> percentile of the amount).
+#Both live in flat arrays and are snapshotted to disk so a restart does not forget them.
+
+import asyncio
+import base64
+import json
+import math
+import os
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import Transaction
+
+import logging
+logger = logging.getLogger(__name__)
+
+MIN_RELATIVE_STD = 0.1  # std floor as a share of the mean, so near-constant histories don't turn any change into a huge z
+
+
+class EWMATable:
+    """
+    Exponentially weighted mean and variance per key, stored in parallel arrays (LRU-bounded).
+    """
+    def __init__(self, alpha: float, max_keys: int):
+        self.alpha = alpha
+        self.max_keys = max_keys
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.free: List[int] = []
+        self.mean = array("d")
+        self.var = array("d")
+        self.count = array("I")
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, key: str) -> Optional[Tuple[float, float, int]]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        return self.mean[slot], self.var[slot], self.count[slot]
+
+    def update(self, key: str, x: float):
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.slots.move_to_end(key)
+            diff = x - self.mean[slot]
+            incr = self.alpha * diff
+            self.mean[slot] += incr
+            self.var[slot] = (1 - self.alpha) * (self.var[slot] + diff * incr)
+            self.count[slot] += 1
+            return
+        if len(self.slots) >= self.max_keys:
+            _, slot = self.slots.popitem(last=False)
+            self.free.append(slot)
+            self.evicted += 1
+        if self.free:
+            slot = self.free.pop()
+            self.mean[slot], self.var[slot], self.count[slot] = x, 0.0, 1
+        else:
+            slot = len(self.mean)
+            self.mean.append(x)
+            self.var.append(0.0)
+            self.count.append(1)
+        self.slots[key] = slot
+
+    def clear(self):
+        self.slots.clear()
+        self.free.clear()
+        self.mean, self.var, self.count = array("d"), array("d"), array("I")
+
+    def dump(self) -> dict:
+        keys = list(self.slots)
+        slots = [self.slots[k] for k in keys]
+        return {
+            "keys": keys,
+            "mean": [self.mean[s] for s in slots],
+            "var": [self.var[s] for s in slots],
+            "count": [self.count[s] for s in slots],
+        }
+
+    def load(self, data: dict):
+        self.clear()
+        for key, mean, var, count in list(zip(data["keys"], data["mean"], data["var"], data["count"]))[-self.max_keys:]:
+            self.slots[key] = len(self.mean)
+            self.mean.append(mean)
+            self.var.append(var)
+            self.count.append(count)
+
+
+class QuantileSketch:
+    """
+    Relative-error quantile sketch: log-spaced buckets, so any quantile is within `accuracy` of the true value.
+    Two sketches with the same accuracy merge by adding their bucket counts.
+    """
+    MIN_VALUE = 0.01
+    MAX_VALUE = 1e9
+
+    def __init__(self, accuracy: float = 0.02):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(self.MIN_VALUE) / self._log_gamma)
+        size = math.ceil(math.log(self.MAX_VALUE) / self._log_gamma) - self._offset + 1
+        self.counts = array("I", bytes(4 * size))
+        self.zero_count = 0  # values below MIN_VALUE
+        self.count = 0
+
+    def _index(self, x: float) -> int:
+        x = min(x, self.MAX_VALUE)
+        return math.ceil(math.log(x) / self._log_gamma) - self._offset
+
+    def add(self, x: float):
+        self.count += 1
+        if x < self.MIN_VALUE:
+            self.zero_count += 1
+        else:
+            self.counts[self._index(x)] += 1
+
+    def merge(self, other: "QuantileSketch"):
+        if other.accuracy != self.accuracy:
+            raise ValueError("Sketches with different accuracy can't be merged")
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return 0.0
+        for i, c in enumerate(self.counts):
+            cumulative += c
+            if cumulative > rank:
+                #midpoint of the bucket (gamma^(k-1), gamma^k] in relative terms
+                return 2 * self.gamma ** (i + self._offset) / (self.gamma + 1)
+        return self.MAX_VALUE
+
+    def rank(self, x: float) -> Optional[float]:
+        """
+        Share of the observed values below x (0.0-1.0), values in x's own bucket count as half.
+        """
+        if self.count == 0:
+            return None
+        if x < self.MIN_VALUE:
+            return self.zero_count / 2 / self.count
+        index = self._index(x)
+        below = self.zero_count + sum(self.counts[:index])
+        return (below + self.counts[index] / 2) / self.count
+
+    def dump(self) -> dict:
+        return {
+            "accuracy": self.accuracy,
+            "zero_count": self.zero_count,
+            "counts": base64.b64encode(self.counts.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["accuracy"])
+        counts = array("I")
+        counts.frombytes(base64.b64decode(data["counts"]))
+        if len(counts) == len(sketch.counts):
+            sketch.counts = counts
+        sketch.zero_count = data["zero_count"]
+        sketch.count = sketch.zero_count + sum(sketch.counts)
+        return sketch
+
+
+def sketch_key(transaction: Transaction) -> str:
+    return f"{transaction.merchant.category.strip().lower()}|{transaction.currency.upper()}"
+
+
+class BaselineStore:
+    """
+    Customer EWMA and merchant category/currency sketches, with periodic snapshots to disk.
+    """
+    def __init__(self, cfg=settings):
+        self.cfg = cfg
+        self.customers = EWMATable(cfg.baseline_ewma_alpha, cfg.baseline_max_customers)
+        self.sketches: "OrderedDict[str, QuantileSketch]" = OrderedDict()
+        self.observed = 0
+        self.snapshots = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def observe(self, transaction: Transaction):
+        self.observed += 1
+        self.customers.update(transaction.customer.id, transaction.amount)
+        key = sketch_key(transaction)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            if len(self.sketches) >= self.cfg.baseline_max_sketches:
+                self.sketches.popitem(last=False)
+            sketch = self.sketches[key] = QuantileSketch(self.cfg.baseline_sketch_accuracy)
+        else:
+            self.sketches.move_to_end(key)
+        sketch.add(transaction.amount)
+
+    def features(self, transaction: Transaction) -> Dict[str, Optional[float]]:
+        """
+        amount_z: z-score of the amount against the customer's EWMA (None until baseline_min_samples),
+        category_percentile: 0-100 position of the amount among the merchant category/currency amounts.
+        """
+        amount_z = customer_mean = None
+        stats = self.customers.get(transaction.customer.id)
+        if stats is not None and stats[2] >= self.cfg.baseline_min_samples:
+            mean, var, _ = stats
+            std = max(math.sqrt(var), abs(mean) * MIN_RELATIVE_STD, 0.01)
+            amount_z = (transaction.amount - mean) / std
+            customer_mean = mean
+
+        percentile = None
+        sketch = self.sketches.get(sketch_key(transaction))
+        if sketch is not None and sketch.count >= self.cfg.baseline_min_samples:
+            percentile = sketch.rank(transaction.amount) * 100
+        return {"amount_z": amount_z, "customer_mean": customer_mean, "category_percentile": percentile}
+
+    def clear(self):
+        self.customers.clear()
+        self.sketches.clear()
+        self.observed = 0
+
+    def dump(self) -> dict:
+        """
+        Copy of the state as plain data. Taken on the event loop thread, which is the only one that mutates it.
+        """
+        return {
+            "alpha": self.customers.alpha,
+            "customers": self.customers.dump(),
+            "sketches": {key: sketch.dump() for key, sketch in self.sketches.items()},
+        }
+
+    def snapshot(self, path: str):
+        write_snapshot(path, self.dump())
+        self.snapshots += 1
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.customers.load(data["customers"])
+            self.sketches = OrderedDict(
+                (key, QuantileSketch.load(sketch)) for key, sketch in data["sketches"].items()
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not load baseline snapshot {path}: {e}")
+            self.clear()
+            return False
+        return True
+
+    async def start(self):
+        path = self.cfg.baseline_snapshot_path
+        if not path:
+            return
+        await asyncio.to_thread(self.load, path)
+        self._task = asyncio.create_task(self._run(path))
+
+    async def _run(self, path: str):
+        while True:
+            await asyncio.sleep(self.cfg.baseline_snapshot_interval)
+            try:
+                #only serializing and writing happen in the thread, the loop keeps updating the live state
+                data = self.dump()
+                await asyncio.to_thread(write_snapshot, path, data)
+                self.snapshots += 1
+            except Exception as e:
+                logger.error(f"Baseline snapshot failed: {e}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.snapshot(self.cfg.baseline_snapshot_path)
+
+    def stats(self) -> dict:
+        return {
+            "observed": self.observed,
+            "customers": len(self.customers),
+            "customers_evicted": self.customers.evicted,
+            "sketches": len(self.sketches),
+            "snapshots": self.snapshots,
+            "categories": {
+                key: {
+                    "count": sketch.count,
+                    "p50": _round(sketch.quantile(0.5)),
+                    "p95": _round(sketch.quantile(0.95)),
+                    "p99": _round(sketch.quantile(0.99)),
+                }
+                for key, sketch in list(self.sketches.items())[-20:]
+            },
+        }
+
+
+def write_snapshot(path: str, data: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)  # readers never see a half-written snapshot
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+baseline_store = BaselineStore()
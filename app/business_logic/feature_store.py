@@ -0,0 +1,222 @@
+#In-process velocity features: transaction counts and amount sums per customer, card and IP address
+#over 1 minute, 1 hour and 24 hours, so the prompt and the rules can see the history of a key.
+#Each window is a small ring of time buckets stored in flat arrays, updates touch a constant number of slots,
+#the number of keys is bounded and keys that have been idle for a full day are dropped.
+
+import time
+from array import array
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import Transaction
+
+#(name, span in seconds, buckets): the windows slide one bucket at a time
+WINDOWS: Tuple[Tuple[str, int, int], ...] = (("1m", 60, 6), ("1h", 3600, 6), ("24h", 86400, 12))
+
+_WIDTHS = tuple(span / buckets for _, span, buckets in WINDOWS)
+_OFFSETS = tuple(sum(2 * b for _, _, b in WINDOWS[:i]) for i in range(len(WINDOWS)))
+_STRIDE = sum(2 * buckets for _, _, buckets in WINDOWS)  # per key: counts then amount sums of every window
+_NWIN = len(WINDOWS)
+_IDLE_SECONDS = max(span for _, span, _ in WINDOWS)
+
+#window totals of one key: {"1m": (count, amount), "1h": ..., "24h": ...}
+Velocity = Dict[str, Tuple[int, float]]
+
+
+class VelocityTable:
+    """
+    Sliding-window counters for one kind of key (customer, card or IP).
+    Key -> slot in an LRU-ordered dict, the buckets of all slots live in one float32 array.
+    """
+    def __init__(self, max_keys: int, idle_seconds: float = _IDLE_SECONDS):
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.free: List[int] = []
+        self.values = array("f")
+        self.epochs = array("q")  # newest bucket number per slot and window
+        self.last_seen = array("d")
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _allocate(self, key: str, now: float) -> int:
+        self._expire(now)
+        if len(self.slots) >= self.max_keys:
+            _, slot = self.slots.popitem(last=False)
+            self.free.append(slot)
+            self.evicted += 1
+        if self.free:
+            slot = self.free.pop()
+            base = slot * _STRIDE
+            self.values[base:base + _STRIDE] = array("f", bytes(4 * _STRIDE))
+        else:
+            slot = len(self.last_seen)
+            self.values.extend(array("f", bytes(4 * _STRIDE)))
+            self.epochs.extend((0,) * _NWIN)
+            self.last_seen.append(0.0)
+        for w in range(_NWIN):
+            self.epochs[slot * _NWIN + w] = int(now // _WIDTHS[w])
+        self.slots[key] = slot
+        return slot
+
+    def _expire(self, now: float):
+        #the dict is in last-use order, so idle keys are at the front
+        cutoff = now - self.idle_seconds
+        while self.slots:
+            key, slot = next(iter(self.slots.items()))
+            if self.last_seen[slot] >= cutoff:
+                return
+            del self.slots[key]
+            self.free.append(slot)
+            self.expired += 1
+
+    def _advance(self, slot: int, w: int, now: float) -> int:
+        #clear the buckets that slid out of the window since the slot was last touched
+        epoch = int(now // _WIDTHS[w])
+        buckets = WINDOWS[w][2]
+        idx = slot * _NWIN + w
+        last = self.epochs[idx]
+        if epoch > last:
+            base = slot * _STRIDE + _OFFSETS[w]
+            for e in range(last + 1, min(epoch, last + buckets) + 1):
+                i = e % buckets
+                self.values[base + i] = 0.0
+                self.values[base + buckets + i] = 0.0
+            self.epochs[idx] = epoch
+        return epoch
+
+    def add(self, key: str, amount: float, now: float):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self._allocate(key, now)
+        else:
+            self.slots.move_to_end(key)
+        for w in range(_NWIN):
+            #late arrivals count towards the newest bucket
+            epoch = max(self._advance(slot, w, now), self.epochs[slot * _NWIN + w])
+            buckets = WINDOWS[w][2]
+            i = slot * _STRIDE + _OFFSETS[w] + epoch % buckets
+            self.values[i] += 1.0
+            self.values[i + buckets] += amount
+        self.last_seen[slot] = max(self.last_seen[slot], now)
+
+    def get(self, key: str, now: float) -> Velocity:
+        slot = self.slots.get(key)
+        if slot is None:
+            return {name: (0, 0.0) for name, _, _ in WINDOWS}
+        result = {}
+        for w, (name, _, buckets) in enumerate(WINDOWS):
+            self._advance(slot, w, now)
+            base = slot * _STRIDE + _OFFSETS[w]
+            result[name] = (int(sum(self.values[base:base + buckets])), sum(self.values[base + buckets:base + 2 * buckets]))
+        return result
+
+    def clear(self):
+        self.slots.clear()
+        self.free.clear()
+        self.values = array("f")
+        self.epochs = array("q")
+        self.last_seen = array("d")
+
+    def memory_bytes(self) -> int:
+        arrays = self.values.buffer_info()[1] * 4 + len(self.epochs) * 8 + len(self.last_seen) * 8
+        return arrays + len(self.slots) * 100  # rough per-entry cost of the ordered dict
+
+
+def event_timestamp(transaction: Transaction) -> Optional[float]:
+    """
+    The transaction's ISO 8601 timestamp as epoch seconds, None if it can't be parsed.
+    """
+    try:
+        return datetime.fromisoformat(transaction.timestamp.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def card_key(transaction: Transaction) -> str:
+    return f"{transaction.payment_method.last_four}:{transaction.payment_method.country_of_issue.upper()}"
+
+
+class FeatureStore:
+    """
+    Velocity features per customer.id, card (last_four + country_of_issue) and customer.ip_address.
+    Windows follow the wall clock; with event_time they follow the transactions' own timestamps instead,
+    which is what a backfill of historical transactions needs.
+    """
+    KINDS = ("customer", "card", "ip")
+
+    def __init__(self, max_keys: int = settings.feature_max_keys, idle_seconds: float = settings.feature_idle_seconds,
+                 event_time: bool = False):
+        self.tables = {kind: VelocityTable(max_keys, idle_seconds) for kind in self.KINDS}
+        self.event_time = event_time
+        self.observed = 0
+
+    def _now(self, transaction: Transaction, now: Optional[float]) -> float:
+        if now is not None:
+            return now
+        if self.event_time:
+            timestamp = event_timestamp(transaction)
+            if timestamp is not None:
+                return timestamp
+        return time.time()
+
+    @staticmethod
+    def _keys(transaction: Transaction):
+        return (
+            ("customer", transaction.customer.id),
+            ("card", card_key(transaction)),
+            ("ip", transaction.customer.ip_address),
+        )
+
+    def observe(self, transaction: Transaction, now: Optional[float] = None):
+        now = self._now(transaction, now)
+        self.observed += 1
+        for kind, key in self._keys(transaction):
+            self.tables[kind].add(key, transaction.amount, now)
+
+    def features(self, transaction: Transaction, now: Optional[float] = None) -> Dict[str, Velocity]:
+        now = self._now(transaction, now)
+        return {kind: self.tables[kind].get(key, now) for kind, key in self._keys(transaction)}
+
+    def exceeded(self, transaction: Transaction, limits: Dict[str, int], now: Optional[float] = None) -> List[str]:
+        """
+        Velocity limits ("customer_1h": 10, ...) the transaction's keys are at or above.
+        """
+        if not limits:
+            return []
+        features = self.features(transaction, now)
+        alerts = []
+        for name, limit in limits.items():
+            kind, _, window = name.partition("_")
+            count = features.get(kind, {}).get(window, (0, 0.0))[0]
+            if count >= limit:
+                alerts.append(f"{count} transactions per {kind} in the last {window}")
+        return alerts
+
+    def clear(self):
+        self.observed = 0
+        for table in self.tables.values():
+            table.clear()
+
+    def stats(self) -> dict:
+        return {
+            "observed": self.observed,
+            "windows": [name for name, _, _ in WINDOWS],
+            "tables": {
+                kind: {
+                    "keys": len(table),
+                    "max_keys": table.max_keys,
+                    "evicted": table.evicted,
+                    "expired_idle": table.expired,
+                    "approx_memory_bytes": table.memory_bytes(),
+                }
+                for kind, table in self.tables.items()
+            },
+        }
+
+
+feature_store = FeatureStore()
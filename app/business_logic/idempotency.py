@@ -0,0 +1,202 @@
+#Idempotent webhook handling keyed by transaction_id.
+#Upstream retries a webhook on timeout: a retry that arrives while the first request is still running joins its
+#in-flight analysis (single flight), a retry that arrives after it finished gets the stored RiskAnalysis back.
+#Either way the LLM is called once and the admin API is notified once.
+#In-flight analyses and the LRU live in this process. With a shared tier (settings.shared_state_url), a worker claims
+#the transaction_id with SharedState.add before analyzing it and publishes the result there, so a retry that lands
+#on another worker waits for that result or replays it instead of analyzing the transaction again.
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.utils.metrics import webhook_coalesced, webhook_replayed
+from app.utils.shared_state import SharedState, shared_state
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(transaction: Transaction) -> str:
+    """
+    Digest of the whole payload, so that a transaction_id reused for a different transaction is not answered
+    with the verdict of the first one.
+    """
+    return hashlib.blake2b(transaction.model_dump_json().encode(), digest_size=16).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    In-flight analyses plus a size-bounded LRU of finished ones, both keyed by transaction_id,
+    optionally backed by a SharedState tier for claims and results across workers.
+    Only successful results are stored: a failed analysis is retried by the next request.
+    """
+    poll_interval = 0.05  # seconds between looks at a transaction_id claimed by another worker
+
+    def __init__(self, ttl: float, max_entries: int, enabled: bool = True,
+                 shared: Optional[SharedState] = None, claim_seconds: float = 30.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.shared = shared
+        self.claim_seconds = claim_seconds
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._done: "OrderedDict[str, tuple]" = OrderedDict()
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def run(self, transaction: Transaction,
+                  process: Callable[[Transaction], Awaitable[RiskAnalysis]]) -> RiskAnalysis:
+        """
+        process(transaction), unless the same payload is already running or finished within the window.
+        """
+        if not self.enabled:
+            return await process(transaction)
+        key = transaction.transaction_id
+        digest = fingerprint(transaction)
+
+        entry = self._done.get(key)
+        if entry is not None:
+            expires_at, stored_digest, analysis = entry
+            if expires_at <= time.time():
+                del self._done[key]
+                self.expirations += 1
+            elif stored_digest == digest:
+                self._done.move_to_end(key)
+                self.replayed += 1
+                webhook_replayed.inc()
+                logger.info(f"Replaying stored analysis for {key}")
+                return analysis.model_copy(deep=True)
+            else:
+                logger.warning(f"transaction_id {key} reused with a different payload, analyzing it again")
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == digest:
+            future = inflight[1]
+            self.coalesced += 1
+            webhook_coalesced.inc()
+        else:
+            #run as its own task: a caller that disconnects must not cancel the analysis the others are waiting for
+            future = asyncio.ensure_future(self._execute(key, digest, transaction, process))
+            future.add_done_callback(_retrieve_exception)
+            self._inflight[key] = (digest, future)
+        analysis = await asyncio.shield(future)
+        return analysis.model_copy(deep=True)
+
+    async def _execute(self, key: str, digest: str, transaction: Transaction,
+                       process: Callable[[Transaction], Awaitable[RiskAnalysis]]) -> RiskAnalysis:
+        claimed = False
+        try:
+            if self.shared is not None:
+                analysis, claimed = await self._claim(key, digest)
+                if analysis is not None:
+                    self._store(key, digest, analysis)
+                    return analysis
+            self.executed += 1
+            analysis = await process(transaction)
+            self._store(key, digest, analysis)
+            if self.shared is not None:
+                await self._publish(key, digest, analysis)
+            return analysis
+        finally:
+            if claimed:
+                await self._release(key, digest)
+            if self._inflight.get(key, (None, None))[0] == digest:
+                del self._inflight[key]
+
+    async def _claim(self, key: str, digest: str) -> Tuple[Optional[RiskAnalysis], bool]:
+        """
+        (another worker's analysis, False) if it has one or finishes one while this worker waits,
+        (None, True) once this worker holds the claim, (None, False) if the tier is down or the claim outlived claim_seconds.
+        """
+        deadline = time.monotonic() + self.claim_seconds
+        waited = False
+        try:
+            while True:
+                stored = await self.shared.get(f"idempotency:{key}")
+                if stored is not None:
+                    stored_digest, _, data = stored.partition("|")
+                    if stored_digest == digest:
+                        analysis = RiskAnalysis.model_validate_json(data)
+                        if waited:
+                            self.coalesced += 1
+                            webhook_coalesced.inc()
+                        else:
+                            self.replayed += 1
+                            webhook_replayed.inc()
+                        return analysis, False
+                if await self.shared.add(f"idempotency-claim:{key}:{digest}", "1", ttl=self.claim_seconds):
+                    return None, True
+                if time.monotonic() >= deadline:
+                    logger.warning(f"{key} claimed by another worker for over {self.claim_seconds}s, analyzing it here")
+                    return None, False
+                waited = True
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            #a shared tier that is down only costs the cross-worker deduplication, never the request
+            logger.warning(f"Shared idempotency tier unavailable: {e}")
+            return None, False
+
+    async def _publish(self, key: str, digest: str, analysis: RiskAnalysis):
+        try:
+            await self.shared.set(f"idempotency:{key}", f"{digest}|{analysis.model_dump_json()}", self.ttl)
+        except Exception as e:
+            logger.warning(f"Shared idempotency tier unavailable: {e}")
+
+    async def _release(self, key: str, digest: str):
+        #after a failure this lets the next retry, on any worker, try again right away
+        try:
+            await self.shared.delete(f"idempotency-claim:{key}:{digest}")
+        except Exception as e:
+            logger.warning(f"Shared idempotency tier unavailable: {e}")
+
+    def _store(self, key: str, digest: str, analysis: RiskAnalysis):
+        if self.max_entries <= 0:
+            return
+        self._done[key] = (time.time() + self.ttl, digest, analysis)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        #the shared tier expires on its own, only this process' state is reset
+        self._inflight.clear()
+        self._done.clear()
+        self.executed = self.coalesced = self.replayed = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared is not None,
+            "in_flight": len(self._inflight),
+            "stored": len(self._done),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _retrieve_exception(future: asyncio.Future):
+    #every waiter may have gone away, mark the failure as seen so asyncio does not log it as unhandled
+    if not future.cancelled():
+        future.exception()
+
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.idempotency_ttl_seconds,
+    max_entries=settings.idempotency_max_entries,
+    enabled=settings.idempotency_enabled,
+    shared=shared_state if settings.shared_state_url != "memory" else None,
+    claim_seconds=settings.idempotency_claim_seconds,
+)
@@ -0,0 +1,181 @@
+#"Accept now, decide later" mode: the webhook stores a job and returns 202 right away,
+#a pool of background workers runs the analysis and the result is polled or pushed to a callback URL.
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.utils.http_clients import http_clients
+
+import logging
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStoreFull(Exception):
+    pass
+
+
+class JobStore:
+    """
+    Bounded job store keyed by transaction_id.
+    When full, the oldest finished job is evicted; if every job is still pending, new jobs are refused.
+    """
+    def __init__(self, max_jobs: int = 10000):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, transaction_id: str) -> Optional[dict]:
+        return self._jobs.get(transaction_id)
+
+    def create(self, transaction_id: str, callback_url: Optional[str]) -> dict:
+        if transaction_id in self._jobs:
+            #a rerun replaces its own finished job, no other job has to make room
+            del self._jobs[transaction_id]
+        elif len(self._jobs) >= self.max_jobs:
+            self._evict_one()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "transaction_id": transaction_id,
+            "status": QUEUED,
+            "result": None,
+            "error": None,
+            "callback_url": callback_url,
+            "callback_status": None,
+            "created_at": time.time(),
+            "completed_at": None,
+        }
+        self._jobs[transaction_id] = job
+        return job
+
+    def remove(self, transaction_id: str):
+        self._jobs.pop(transaction_id, None)
+
+    def _evict_one(self):
+        for transaction_id, job in self._jobs.items():
+            if job["status"] in (DONE, FAILED):
+                del self._jobs[transaction_id]
+                self.evicted += 1
+                return
+        raise JobStoreFull("Too many pending analysis jobs")
+
+    def clear(self):
+        self._jobs.clear()
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class AnalysisWorkerPool:
+    """
+    Runs queued jobs with a fixed number of asyncio workers.
+    process() does the actual analysis (the same code path as the synchronous webhook).
+    """
+    def __init__(self, store: JobStore, workers: int = 4, max_queue: int = 1000):
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self._process: Optional[Callable[[Transaction], Awaitable[RiskAnalysis]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.callbacks_failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, process: Callable[[Transaction], Awaitable[RiskAnalysis]]):
+        self._process = process
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Analysis workers did not finish pending jobs in time")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, transaction: Transaction, callback_url: Optional[str] = None) -> dict:
+        """
+        Create (or return the existing) job for the transaction and queue it.
+        Raises JobStoreFull when neither the store nor the queue has room.
+        """
+        existing = self.store.get(transaction.transaction_id)
+        if existing is not None and existing["status"] in (QUEUED, PROCESSING):
+            return existing
+
+        job = self.store.create(transaction.transaction_id, callback_url)
+        try:
+            self._queue.put_nowait((job, transaction))
+        except asyncio.QueueFull:
+            self.store.remove(transaction.transaction_id)
+            raise JobStoreFull("Analysis queue is full")
+        return job
+
+    async def _run(self):
+        while True:
+            job, transaction = await self._queue.get()
+            try:
+                await self._execute(job, transaction)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: dict, transaction: Transaction):
+        job["status"] = PROCESSING
+        try:
+            analysis = await self._process(transaction)
+            job.update(status=DONE, result=analysis.model_dump())
+            self.completed += 1
+        except Exception as e:
+            job.update(status=FAILED, error=str(getattr(e, "detail", e)))
+            self.failed += 1
+        job["completed_at"] = time.time()
+
+        if job["callback_url"]:
+            await self._callback(job)
+
+    async def _callback(self, job: dict):
+        try:
+            response = await http_clients.get("callbacks").post(job["callback_url"], json=public_job(job))
+            response.raise_for_status()
+            job["callback_status"] = response.status_code
+        except Exception as e:
+            logger.warning(f"Callback for {job['transaction_id']} failed: {e}")
+            job["callback_status"] = "failed"
+            self.callbacks_failed += 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "jobs_stored": len(self.store),
+            "jobs_evicted": self.store.evicted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "callbacks_failed": self.callbacks_failed,
+        }
+
+
+def public_job(job: dict) -> Dict:
+    return {key: value for key, value in job.items() if key != "callback_url"}
+
+
+job_store = JobStore(max_jobs=settings.job_store_max)
+worker_pool = AnalysisWorkerPool(job_store, workers=settings.async_workers, max_queue=settings.async_queue_max)
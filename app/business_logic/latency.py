@@ -0,0 +1,55 @@
+#Per-provider latency histograms, used to tune the hedge delay from observed latencies.
+
+import bisect
+from typing import List, Optional
+
+
+def default_bounds() -> List[float]:
+    #log-spaced bucket upper bounds from 5ms to ~60s (25% apart)
+    bounds = []
+    bound = 0.005
+    while bound < 60.0:
+        bounds.append(round(bound, 6))
+        bound *= 1.25
+    return bounds
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of latencies in seconds.
+    Percentiles are reported as the upper bound of the bucket that contains them.
+    """
+    def __init__(self, bounds: Optional[List[float]] = None):
+        self.bounds = bounds or default_bounds()
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": self._ms(self.percentile(0.5)),
+            "p95_ms": self._ms(self.percentile(0.95)),
+            "p99_ms": self._ms(self.percentile(0.99)),
+        }
+
+    @staticmethod
+    def _ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
@@ -0,0 +1,182 @@
+#In-process outbox for admin notifications.
+#The webhook only enqueues the AdminNotification payload, a background worker delivers them in batches
+#with retries, so a slow admin API no longer adds to the webhook response time.
+
+import asyncio
+import json
+import os
+import random
+from typing import List, Optional
+from app.config import settings
+from app.business_logic import api_notifier
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class NotificationOutbox:
+    """
+    Bounded queue + single delivery worker.
+    When the queue is full (or delivery keeps failing) messages are appended to an NDJSON spool file
+    if spool_path is set, otherwise they are dropped and counted. The spool is replayed on start.
+    """
+    def __init__(self, max_size: int = 10000, batch_size: int = 20, flush_interval: float = 0.5,
+                 max_retries: int = 5, backoff_base: float = 0.5, spool_path: Optional[str] = None):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.spool_path = spool_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spooled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._replay_spool()
+        self._worker = asyncio.create_task(self._run())
+
+    def enqueue(self, message: dict) -> bool:
+        """
+        Queue a notification without waiting for delivery. Returns False if it had to be spooled or dropped.
+        """
+        try:
+            self._queue.put_nowait(message)
+            self.enqueued += 1
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Notification outbox full")
+            self._spool([message])
+            return False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[dict] = []
+            received = 0
+            try:
+                batch.append(await self._queue.get())
+                received += 1
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                        received += 1
+                    except asyncio.TimeoutError:
+                        break
+                await self._deliver(batch)
+            except asyncio.CancelledError:
+                #stopped while collecting or delivering, keep what was not delivered instead of losing it
+                self._spool(batch)
+                raise
+            finally:
+                for _ in range(received):
+                    self._queue.task_done()
+
+    async def _deliver(self, batch: List[dict]):
+        """
+        Deliver with retries. batch is narrowed in place to the messages still undelivered,
+        so neither a retry nor the spool repeats a notification that already went out.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                await api_notifier.send_notifications(batch)
+                self.delivered += len(batch)
+                return
+            except Exception as e:
+                if isinstance(e, api_notifier.PartialDelivery):
+                    self.delivered += len(batch) - len(e.failed)
+                    batch[:] = e.failed
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up on {len(batch)} notifications after {attempt + 1} attempts: {e}")
+                    break
+                self.retries += 1
+                #exponential backoff with jitter
+                wait = self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Notification delivery failed ({e}), retrying in {wait:.2f}s")
+                await asyncio.sleep(wait)
+        self.failed += len(batch)
+        self._spool(batch)
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Drain the queue (up to timeout), then stop the worker and spool anything left.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Notification outbox did not drain in time")
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        leftovers = []
+        while not self._queue.empty():
+            leftovers.append(self._queue.get_nowait())
+        self._spool(leftovers)
+
+    def _spool(self, messages: List[dict]):
+        if not messages:
+            return
+        if not self.spool_path:
+            self.dropped += len(messages)
+            return
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+        self.spooled += len(messages)
+
+    def _replay_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding="utf-8") as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        os.remove(self.spool_path)
+        for index, message in enumerate(messages):
+            if self._queue.full():
+                self._spool(messages[index:])
+                break
+            self._queue.put_nowait(message)
+        logger.info(f"Replayed {len(messages)} spooled notifications")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "retries": self.retries,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "spooled": self.spooled,
+        }
+
+
+notification_outbox = NotificationOutbox(
+    max_size=settings.outbox_max_size,
+    batch_size=settings.outbox_batch_size,
+    flush_interval=settings.outbox_flush_interval,
+    max_retries=settings.outbox_max_retries,
+    backoff_base=settings.outbox_backoff_base,
+    spool_path=settings.outbox_spool_path,
+)
@@ -0,0 +1,221 @@
+#Provider failover: per-provider circuit breakers and health-weighted routing.
+#A provider that is failing or too slow is taken out of rotation (open), probed again after a cooldown
+#(half-open) and put back once a probe succeeds, so a provider brownout does not fail every webhook.
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+
+import logging
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks an EWMA of the error rate and of the latency of one provider.
+    Opens when either goes above its threshold (after min_requests calls), lets one probe through
+    after open_seconds and closes again when the probe succeeds.
+    """
+    def __init__(self, error_rate_threshold: float = 0.5, latency_threshold: float = 15.0,
+                 min_requests: int = 5, open_seconds: float = 30.0, alpha: float = 0.2):
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_threshold = latency_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.alpha = alpha
+
+        self.state = CLOSED
+        self.error_rate = 0.0
+        self.latency = 0.0
+        self.requests = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def available(self, now: Optional[float] = None) -> bool:
+        """
+        Whether a call could be made now (does not reserve the half-open probe).
+        """
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN:
+            return now - self.opened_at >= self.open_seconds
+        return not self.probe_in_flight
+
+    def allow_request(self, now: Optional[float] = None) -> bool:
+        """
+        Reserve a call. Moves an open breaker to half-open once the cooldown is over.
+        """
+        if not self.available(now):
+            return False
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """
+        Give back a half-open probe that ended without an outcome (cancelled), so the next call can probe.
+        """
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+
+    def record_success(self, latency: float):
+        self._update(0.0, latency)
+        if self.state == HALF_OPEN:
+            logger.info("Circuit closed after successful probe")
+            self._close()
+        elif self.requests >= self.min_requests and self.latency > self.latency_threshold:
+            self._open()
+
+    def record_failure(self):
+        self._update(1.0, None)
+        if self.state == HALF_OPEN:
+            self._open()
+        elif self.requests >= self.min_requests and self.error_rate >= self.error_rate_threshold:
+            self._open()
+
+    def health(self) -> float:
+        """
+        1.0 for a perfect provider, lower with errors or latency close to the threshold.
+        """
+        if self.state == OPEN:
+            return 0.0
+        latency_factor = 1.0
+        if self.latency > 0:
+            latency_factor = min(1.0, max(0.05, 1.0 - self.latency / (2 * self.latency_threshold)))
+        return max(0.05, 1.0 - self.error_rate) * latency_factor
+
+    def _update(self, error: float, latency: Optional[float]):
+        self.requests += 1
+        self.error_rate += self.alpha * (error - self.error_rate)
+        if latency is not None:
+            self.latency = latency if self.latency == 0.0 else self.latency + self.alpha * (latency - self.latency)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.times_opened += 1
+
+    def _close(self):
+        self.state = CLOSED
+        self.error_rate = 0.0
+        self.latency = 0.0
+        self.requests = 0
+        self.probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ms": round(self.latency * 1000, 2),
+            "health": round(self.health(), 4),
+            "times_opened": self.times_opened,
+        }
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        error_rate_threshold=settings.breaker_error_rate,
+        latency_threshold=settings.breaker_latency_threshold,
+        min_requests=settings.breaker_min_requests,
+        open_seconds=settings.breaker_open_seconds,
+        alpha=settings.breaker_ewma_alpha,
+    )
+
+
+class ProviderRouter:
+    """
+    Picks the provider for each call by weight * health among the providers whose breaker allows it,
+    and fails over to the remaining ones in order of their effective weight.
+    """
+    def __init__(self, providers: List[str], weights: Dict[str, float], rng: Optional[random.Random] = None):
+        self.breakers = {name: make_breaker() for name in providers}
+        self.weights = weights
+        self.rng = rng or random.Random()
+        self.failovers = 0
+
+    def reset(self):
+        self.breakers = {name: make_breaker() for name in self.breakers}
+        self.failovers = 0
+
+    def record(self, name: str, ok: bool, latency: float = 0.0):
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            return
+        if ok:
+            breaker.record_success(latency)
+        else:
+            breaker.record_failure()
+
+    def available(self, name: str) -> bool:
+        breaker = self.breakers.get(name)
+        return breaker is None or breaker.available()
+
+    def candidates(self, preferred: str) -> List[str]:
+        weights = dict(self.weights)
+        weights.setdefault(preferred, 1.0)
+        scored = [
+            (name, weight * self.breakers[name].health())
+            for name, weight in weights.items()
+            if weight > 0 and name in self.breakers and self.breakers[name].available()
+        ]
+        if not scored:
+            return []
+
+        #weighted random choice for the first provider, the others as failover by effective weight
+        total = sum(score for _, score in scored)
+        pick = self.rng.random() * total
+        first = scored[-1][0]
+        for name, score in scored:
+            pick -= score
+            if pick <= 0:
+                first = name
+                break
+        rest = sorted((item for item in scored if item[0] != first), key=lambda item: item[1], reverse=True)
+        return [first] + [name for name, _ in rest]
+
+    async def call(self, transaction: Transaction, preferred: str,
+                   call: Callable[[Transaction, str], Awaitable[RiskAnalysis]]) -> RiskAnalysis:
+        """
+        Run call(transaction, provider) on the best available provider, failing over on errors.
+        call() is expected to report its outcome through record().
+        """
+        last_error: Optional[Exception] = None
+        for attempt, name in enumerate(self.candidates(preferred)):
+            if not self.breakers[name].allow_request():
+                continue
+            if attempt > 0:
+                self.failovers += 1
+                logger.warning(f"Failing over {transaction.transaction_id} to {name}")
+            try:
+                return await call(transaction, name)
+            except asyncio.CancelledError:
+                #a cancelled call (hedge loser, client gone) says nothing about the provider
+                self.breakers[name].release_probe()
+                raise
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Provider {name} failed: {e}")
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("No healthy LLM provider available")
+
+    def stats(self) -> dict:
+        return {
+            "failovers": self.failovers,
+            "providers": {
+                name: dict(breaker.stats(), weight=self.weights.get(name))
+                for name, breaker in self.breakers.items()
+            },
+        }
@@ -1,22 +1,35 @@
-from app.llm.base import LLM
+from typing import Dict
 from app.models import Transaction, RiskAnalysis
-from app.llm.openai_llm import OpenAILLM
-from app.llm.claude_llm import ClaudeLLM
-from app.llm.groq_llm import GroqLLM 
+from app.llm.batcher import MicroBatcher
+from app.llm.registry import llm_providers
+from app.llm.response_parser import VALID_ACTIONS
+from app.business_logic.rules import rule_engine
+from app.business_logic.analysis_cache import analysis_cache
+from app.business_logic.feature_store import feature_store
+from app.business_logic.baselines import baseline_store
+from app.business_logic.latency import LatencyHistogram
+from app.business_logic.provider_router import ProviderRouter
+from app.utils.metrics import cache_lookups, provider_duration, provider_errors, record_decision, stage_duration
 from app.config import settings
+import asyncio
+import time
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create instances of LLM providers
-llm_provider = {
-    "openai": OpenAILLM(),
-    "claude": ClaudeLLM(),
-    "groq": GroqLLM(),  # Uncomment when GroqLLM is implemented
-    # Add other LLM providers here once implemented
-}
+#LLM providers, imported and constructed on first use (add new ones to app/llm/registry.py)
+llm_provider = llm_providers
+
+#One micro-batcher per provider, created on first use and only when settings.batching_enabled is set
+batchers: Dict[str, MicroBatcher] = {}
+
+#Observed latency of successful calls per provider, used to pick the hedge delay
+latency_histograms = {name: LatencyHistogram() for name in llm_provider}
+hedge_stats = {"hedged_requests": 0, "hedges_fired": 0, "primary_wins": 0, "hedge_wins": 0}
+
+#Circuit breakers and weighted failover, only used for routing when settings.routing_enabled is set
+provider_router = ProviderRouter(list(llm_provider), settings.routing_weights)
+
 
 async def analyze_transaction(transaction: Transaction, llm_name: str) -> RiskAnalysis:
     llm_name = llm_name.lower()
@@ -27,12 +40,136 @@ async def analyze_transaction(transaction: Transaction, llm_name: str) -> RiskAn
         logger.error(f"LLM provider '{llm_name}' is not supported.")
         raise ValueError(f"LLM provider '{llm_name}' is not supported.")
     
+    #Velocity features: count this transaction before the rules and the prompt read the windows
+    if settings.features_enabled:
+        feature_store.observe(transaction)
+    
+    risk_analysis = await decide(transaction, llm_name)
+    
+    #Amount baselines learn from scored transactions only, so the z-score/percentile compare against history
+    if settings.baselines_enabled:
+        baseline_store.observe(transaction)
+    return risk_analysis
+
+async def decide(transaction: Transaction, llm_name: str) -> RiskAnalysis:
+    #Rule pre-screen: obvious allow/block decisions never reach the LLM
+    if settings.prescreen_enabled:
+        decision = rule_engine.prescreen(transaction)
+        if decision is not None:
+            logger.info(f"Pre-screen decided {transaction.transaction_id}: {decision.recommended_action}")
+            record_decision("prescreen", decision)
+            return decision
+    
+    #Cache: repeats of an essentially identical transaction reuse the previous verdict
+    #(a burst of activity on the customer/card/IP must be judged fresh, not from an earlier verdict)
+    velocity_alert = settings.features_enabled and bool(feature_store.exceeded(transaction, settings.velocity_limits))
+    if settings.cache_enabled and not velocity_alert:
+        cached = await analysis_cache.get(transaction, llm_name)
+        cache_lookups.inc("miss" if cached is None else "hit")
+        if cached is not None:
+            logger.info(f"Cache hit for {transaction.transaction_id}")
+            record_decision("cache", cached)
+            return cached
+    elif settings.cache_enabled:
+        cache_lookups.inc("bypassed")
+    
     try:
-        llm = llm_provider[llm_name]
         logger.info(f"Starting analysis with {llm_name}")
-        risk_analysis = await llm.analyze_transaction(transaction)
+        if settings.routing_enabled:
+            risk_analysis = await provider_router.call(transaction, llm_name, provider_call)
+        else:
+            risk_analysis = await provider_call(transaction, llm_name)
         logger.info(f"Analysis complete with risk score: {risk_analysis.risk_score}")
+        record_decision("llm", risk_analysis)
+        if settings.cache_enabled:
+            await analysis_cache.set(transaction, llm_name, risk_analysis)
         return risk_analysis
     except Exception as e:
         logger.error(f"Error during transaction analysis: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+async def provider_call(transaction: Transaction, llm_name: str) -> RiskAnalysis:
+    hedge = (settings.hedge_provider or "").lower()
+    if settings.hedge_enabled and hedge != llm_name and hedge in llm_provider and provider_router.available(hedge):
+        return await hedged_call(transaction, llm_name, hedge)
+    return await timed_call(transaction, llm_name)
+
+async def call_provider(transaction: Transaction, llm_name: str) -> RiskAnalysis:
+    if settings.batching_enabled:
+        return await get_batcher(llm_name).analyze_transaction(transaction)
+    return await llm_provider[llm_name].analyze_transaction(transaction)
+
+def get_batcher(llm_name: str) -> MicroBatcher:
+    batcher = batchers.get(llm_name)
+    if batcher is None:
+        batcher = batchers[llm_name] = MicroBatcher(
+            llm_provider[llm_name], settings.batch_max_size, settings.batch_max_wait_ms / 1000)
+    return batcher
+
+async def timed_call(transaction: Transaction, llm_name: str) -> RiskAnalysis:
+    start = time.perf_counter()
+    try:
+        risk_analysis = await call_provider(transaction, llm_name)
+    except asyncio.CancelledError:
+        #hedged_call cancels the loser itself, so a half-open probe is handed back here, not only in the router
+        provider_router.breakers[llm_name].release_probe()
+        raise
+    except Exception:
+        provider_router.record(llm_name, ok=False)
+        provider_errors.inc(llm_name)
+        raise
+    latency = time.perf_counter() - start
+    latency_histograms[llm_name].observe(latency)
+    stage_duration.observe(latency, "provider_call")
+    provider_duration.observe(latency, llm_name)
+    provider_router.record(llm_name, ok=True, latency=latency)
+    return risk_analysis
+
+def hedge_delay(llm_name: str) -> float:
+    """
+    Seconds to wait for the primary before firing the hedge, tuned from its latency histogram.
+    """
+    histogram = latency_histograms[llm_name]
+    delay = settings.hedge_default_delay
+    if histogram.count >= settings.hedge_min_samples:
+        delay = histogram.percentile(settings.hedge_percentile)
+    return min(max(delay, settings.hedge_min_delay), settings.hedge_max_delay)
+
+def is_valid_analysis(risk_analysis: RiskAnalysis) -> bool:
+    return 0.0 <= risk_analysis.risk_score <= 1.0 and risk_analysis.recommended_action in VALID_ACTIONS
+
+async def hedged_call(transaction: Transaction, primary: str, secondary: str) -> RiskAnalysis:
+    """
+    Fire the primary, and the secondary as well once the hedge delay has passed (or the primary failed).
+    The first valid analysis wins and the other request is cancelled.
+    """
+    hedge_stats["hedged_requests"] += 1
+    primary_task = asyncio.ensure_future(timed_call(transaction, primary))
+    #cancelled with the caller too, so no provider call outlives the request
+    pending = {primary_task}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay(primary))
+        if done and primary_task.exception() is None and is_valid_analysis(primary_task.result()):
+            hedge_stats["primary_wins"] += 1
+            return primary_task.result()
+
+        logger.info(f"Hedging {transaction.transaction_id}: firing {secondary} after {primary}")
+        hedge_stats["hedges_fired"] += 1
+        secondary_task = asyncio.ensure_future(timed_call(transaction, secondary))
+        pending = pending | {secondary_task}
+        errors = [primary_task.exception() or ValueError(f"Invalid analysis from {primary}")] if done else []
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                elif not is_valid_analysis(task.result()):
+                    errors.append(ValueError(f"Invalid analysis: {task.result()}"))
+                else:
+                    hedge_stats["primary_wins" if task is primary_task else "hedge_wins"] += 1
+                    return task.result()
+        raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
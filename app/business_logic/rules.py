@@ -0,0 +1,153 @@
+#Deterministic rule pre-screen that runs before the LLM.
+#Clear-cut transactions (small domestic purchases, or several hard risk rules at once) are decided here
+#and only the ambiguous middle band is sent to the LLM.
+
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.business_logic.feature_store import feature_store
+from app.business_logic.baselines import baseline_store
+from app.utils.geoip import geoip
+
+
+_UNSET = object()
+
+
+class Signals:
+    """
+    Per-transaction values shared by the rules and their risk factor texts.
+    The lookups run at most once, and only if a rule asks for them.
+    amount is the amount in the currency of the prescreen thresholds, None for a currency without a rate.
+    """
+    __slots__ = ("t", "cfg", "amount", "_ip_country", "_velocity_alerts", "_baseline")
+
+    def __init__(self, transaction: Transaction, cfg, rates: Dict[str, float]):
+        self.t = transaction
+        self.cfg = cfg
+        rate = rates.get(transaction.currency.upper())
+        self.amount = None if rate is None else transaction.amount * rate
+        self._ip_country = self._velocity_alerts = self._baseline = _UNSET
+
+    @property
+    def ip_country(self) -> Optional[str]:
+        if self._ip_country is _UNSET:
+            self._ip_country = geoip.country(self.t.customer.ip_address)
+        return self._ip_country
+
+    @property
+    def velocity_alerts(self) -> List[str]:
+        if self._velocity_alerts is _UNSET:
+            self._velocity_alerts = feature_store.exceeded(self.t, self.cfg.velocity_limits)
+        return self._velocity_alerts
+
+    @property
+    def baseline(self) -> Dict[str, Optional[float]]:
+        if self._baseline is _UNSET:
+            self._baseline = baseline_store.features(self.t)
+        return self._baseline
+
+
+#(name, predicate builder, risk factor text builder)
+#predicate builders receive the settings so thresholds are bound once when the rules are compiled
+#amount bands are compared in the thresholds' currency: an unknown currency is never a small purchase, nor a large one
+RULES = [
+    (
+        "high_risk_country",
+        lambda cfg, hrc: lambda t, s: (
+            t.payment_method.country_of_issue.upper() in hrc or t.customer.country.upper() in hrc
+            or s.ip_country in hrc
+        ),
+        lambda t, s: f"High-risk country involved ({t.customer.country}/{t.payment_method.country_of_issue}/IP {s.ip_country or '?'})",
+    ),
+    (
+        "geographic_mismatch",
+        lambda cfg, hrc: lambda t, s: t.customer.country.upper() != t.payment_method.country_of_issue.upper(),
+        lambda t, s: f"Customer country ({t.customer.country}) differs from card country ({t.payment_method.country_of_issue})",
+    ),
+    (
+        "ip_country_mismatch",
+        lambda cfg, hrc: lambda t, s: s.ip_country not in (None, t.customer.country.upper()),
+        lambda t, s: f"IP address located in {s.ip_country}, customer country is {t.customer.country}",
+    ),
+    (
+        "above_allow_amount",
+        lambda cfg, hrc: lambda t, s: s.amount is None or s.amount > cfg.prescreen_allow_max_amount,
+        lambda t, s: f"Amount {t.amount:.2f} {t.currency} above the small purchase band",
+    ),
+    (
+        "high_amount",
+        lambda cfg, hrc: lambda t, s: s.amount is not None and s.amount >= cfg.prescreen_high_amount,
+        lambda t, s: f"Unusually large transaction amount ({t.amount:.2f} {t.currency})",
+    ),
+    (
+        "high_velocity",
+        lambda cfg, hrc: lambda t, s: cfg.features_enabled and bool(s.velocity_alerts),
+        lambda t, s: "High velocity: " + ", ".join(s.velocity_alerts),
+    ),
+    (
+        "amount_anomaly",
+        lambda cfg, hrc: lambda t, s: cfg.baselines_enabled and (s.baseline["amount_z"] or 0.0) >= cfg.baseline_z_threshold,
+        lambda t, s: "Transaction amount significantly higher than customer average "
+                     f"({t.amount:.2f} vs {s.baseline['customer_mean']:.2f} {t.currency})",
+    ),
+]
+
+CompiledRule = Tuple[str, Callable[[Transaction, Signals], bool], float, Callable[[Transaction, Signals], str]]
+
+
+def compile_rules(cfg=settings) -> List[CompiledRule]:
+    """
+    Bind thresholds and weights from the settings into a flat list of rules.
+    Rules with a weight of 0 are dropped so they cost nothing at evaluation time.
+    """
+    hrc = frozenset(c.upper() for c in cfg.high_risk_countries)
+    compiled = []
+    for name, build_predicate, describe in RULES:
+        weight = cfg.prescreen_rule_weights.get(name, 0.0)
+        if weight > 0:
+            compiled.append((name, build_predicate(cfg, hrc), weight, describe))
+    return compiled
+
+
+class RuleEngine:
+    """
+    Scores a transaction with the compiled rules.
+    Returns a RiskAnalysis when the outcome is obvious, otherwise None so the LLM decides.
+    """
+    def __init__(self, cfg=settings):
+        self.cfg = cfg
+        self.rules = compile_rules(cfg)
+        self.rates = {currency.upper(): rate for currency, rate in cfg.prescreen_currency_rates.items()}
+        self.allow_score = cfg.prescreen_allow_score
+        self.block_min_score = cfg.prescreen_block_min_score
+
+    def evaluate(self, transaction: Transaction) -> Tuple[float, List[str]]:
+        signals = Signals(transaction, self.cfg, self.rates)
+        score = 0.0
+        fired = []
+        for name, predicate, weight, describe in self.rules:
+            if predicate(transaction, signals):
+                score += weight
+                fired.append(describe(transaction, signals))
+        return min(score, 1.0), fired
+
+    def prescreen(self, transaction: Transaction) -> Optional[RiskAnalysis]:
+        score, factors = self.evaluate(transaction)
+        if not factors:
+            return RiskAnalysis(
+                risk_score=self.allow_score,
+                risk_factors=[],
+                reasoning="Pre-screen: domestic small purchase with no risk rules triggered",
+                recommended_action="allow",
+            )
+        if score >= self.block_min_score:
+            return RiskAnalysis(
+                risk_score=score,
+                risk_factors=factors,
+                reasoning="Pre-screen: multiple hard risk rules triggered",
+                recommended_action="block",
+            )
+        return None
+
+
+rule_engine = RuleEngine()
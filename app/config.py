@@ -1,18 +1,23 @@
 # #config.py is used for storing the configuration of the application from .env and the LLM selection 
 
+from typing import Dict, List, Optional, Set
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
+#setting holding each provider's API key, only the providers this deployment can call need one
+PROVIDER_API_KEYS = {"openai": "openai_api_key", "claude": "anthropic_api_key", "groq": "groq_api_key"}
+
 class Settings(BaseSettings):
     # OpenAI API settings
-    openai_api_key: str 
+    openai_api_key: Optional[str] = None
     openai_api_url: str = "https://api.openai.com/v1/chat/completions"
     
     #Anthropic API settings
-    anthropic_api_key: str 
+    anthropic_api_key: Optional[str] = None
     anthropic_api_url: str = "https://api.anthropic.com/v1/messages"
 
     # Groq API settings
-    groq_api_key: str
+    groq_api_key: Optional[str] = None
     groq_api_url: str = "https://api.groq.com/openai/v1/chat/completions"
     
     # Default LLM provider
@@ -26,7 +31,175 @@ class Settings(BaseSettings):
 
     auth_username: str = "Testuser"
     auth_password: str = "Random321"
+    max_body_bytes: int = 64 * 1024  # POST /webhook/transaction bodies above this are refused with 413 before parsing
 
     notifyadmin_api_url: str = "https://api.notifyadmin.com/v1/notify"
 
+    # Shared HTTP connection pools (one per provider + the notifier)
+    http2: bool = True  # only used when the optional h2 package is installed
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 30.0
+    http_write_timeout: float = 10.0
+    http_pool_timeout: float = 5.0
+
+    # Rule pre-screen in front of the LLM (see app/business_logic/rules.py)
+    prescreen_enabled: bool = True
+    high_risk_countries: List[str] = ["RU", "IR", "KP", "VE", "MM"]
+    prescreen_allow_max_amount: float = 250.0  # domestic purchases up to this amount are allowed without the LLM
+    prescreen_high_amount: float = 1000.0
+    # Value of one unit of each currency in the currency of the amounts above (USD), for the amount bands.
+    # Transactions in a currency missing here are never treated as small purchases
+    prescreen_currency_rates: Dict[str, float] = {
+        "USD": 1.0, "EUR": 1.08, "GBP": 1.27, "CHF": 1.12, "CAD": 0.73, "AUD": 0.66, "NZD": 0.60,
+        "JPY": 0.0067, "CNY": 0.14, "HKD": 0.13, "SGD": 0.74, "INR": 0.012, "KRW": 0.00073,
+        "SEK": 0.095, "NOK": 0.094, "DKK": 0.145, "PLN": 0.25, "MXN": 0.055, "BRL": 0.18, "ZAR": 0.055,
+    }
+    prescreen_allow_score: float = 0.05
+    prescreen_block_min_score: float = 0.9  # summed rule weights at or above this are blocked without the LLM
+    prescreen_rule_weights: Dict[str, float] = {
+        "high_risk_country": 0.5,
+        "geographic_mismatch": 0.2,
+        "above_allow_amount": 0.1,
+        "high_amount": 0.3,
+        "high_velocity": 0.3,
+        "amount_anomaly": 0.2,
+        "ip_country_mismatch": 0.2,
+    }
+    geoip_db_path: Optional[str] = None  # IP range index built with `python -m app.utils.geoip build` (see app/utils/geoip.py)
+
+    # Velocity features per customer, card and IP (see app/business_logic/feature_store.py)
+    features_enabled: bool = True
+    feature_max_keys: int = 100000  # per key kind, least recently used keys are evicted beyond this
+    feature_idle_seconds: float = 86400.0
+    velocity_limits: Dict[str, int] = {"customer_1h": 10, "card_1m": 3, "ip_1h": 20}  # <kind>_<window>: transaction count
+
+    # Amount baselines: EWMA per customer, quantile sketch per merchant category + currency (see app/business_logic/baselines.py)
+    baselines_enabled: bool = True
+    baseline_ewma_alpha: float = 0.1
+    baseline_min_samples: int = 5  # history needed before z-scores/percentiles are reported
+    baseline_max_customers: int = 100000
+    baseline_max_sketches: int = 1000
+    baseline_sketch_accuracy: float = 0.02  # relative error of the quantile sketches
+    baseline_z_threshold: float = 3.0  # amount_anomaly rule fires at or above this z-score
+    baseline_snapshot_path: Optional[str] = None  # set to a file path to keep baselines across restarts
+    baseline_snapshot_interval: float = 300.0
+
+    # Analysis result cache (see app/business_logic/analysis_cache.py)
+    cache_enabled: bool = True
+    cache_ttl_seconds: float = 300.0
+    cache_max_entries: int = 10000
+    cache_amount_bucket: float = 10.0  # amounts are bucketed to this width when building the cache key
+    cache_key_fields: List[str] = [
+        "customer.id", "customer.country", "customer.ip_address", "payment_method.type", "payment_method.last_four",
+        "payment_method.country_of_issue", "merchant.id", "merchant.category", "currency", "amount",
+    ]
+    cache_db_path: Optional[str] = None  # set to a file path to keep cached results across restarts
+
+    # State shared by all worker processes (see app/utils/shared_state.py): "memory" (per process),
+    # "sqlite:///path/to/state.db" (the workers of one host) or "redis://[:password@]host:6379/0"
+    # Without cache_db_path, the analysis cache uses it as its second tier
+    shared_state_url: str = "memory"
+    shared_state_prefix: str = "risk:"  # Redis key prefix
+
+    # Idempotent webhook handling (see app/business_logic/idempotency.py): a retried transaction_id joins the
+    # in-flight analysis or, within the window, gets the stored result without another LLM call or notification.
+    # With a non-memory shared_state_url this also holds across workers
+    idempotency_enabled: bool = True
+    idempotency_ttl_seconds: float = 600.0
+    idempotency_max_entries: int = 10000
+    idempotency_claim_seconds: float = 30.0  # how long other workers wait on a claimed transaction_id before analyzing it themselves
+
+    # Bulk webhook (POST /webhook/transactions)
+    bulk_max_items: int = 1000
+    bulk_max_body_bytes: int = 8 * 1024 * 1024
+    bulk_max_concurrency: int = 8  # transactions of one batch analysed at the same time
+
+    # Send the static prompt prefix separately so providers can cache it (Anthropic cache_control, OpenAI automatic prefix caching).
+    # Off by default: providers only cache prefixes of 1024+ tokens and the default instructions are about 350
+    prompt_caching_enabled: bool = False
+
+    # Stream completions (SSE) and close the connection once the JSON answer is complete (see app/llm/streaming.py)
+    streaming_enabled: bool = False
+
+    # Micro-batching of concurrent LLM calls into one prompt (see app/llm/batcher.py)
+    batching_enabled: bool = False
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 20.0
+
+    # Notification outbox (see app/business_logic/notification_outbox.py)
+    notify_async: bool = True  # deliver admin notifications from a background worker instead of inside the webhook
+    notifyadmin_batch_url: Optional[str] = None  # if set, batches are posted here as one JSON array
+    outbox_max_size: int = 10000
+    outbox_batch_size: int = 20
+    outbox_flush_interval: float = 0.5
+    outbox_max_retries: int = 5
+    outbox_backoff_base: float = 0.5
+    outbox_spool_path: Optional[str] = None  # NDJSON file for notifications that could not be queued or delivered
+
+    # Hedged requests: if the primary provider is slower than its observed latency percentile,
+    # also ask hedge_provider and take whichever valid answer arrives first
+    hedge_enabled: bool = False
+    hedge_provider: Optional[str] = None
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20  # observed calls needed before the percentile is trusted
+    hedge_default_delay: float = 2.0  # seconds, used until enough samples were observed
+    hedge_min_delay: float = 0.1
+    hedge_max_delay: float = 10.0
+
+    # Provider failover with circuit breakers (see app/business_logic/provider_router.py)
+    routing_enabled: bool = False
+    routing_weights: Dict[str, float] = {}  # e.g. {"groq": 3, "openai": 1}, the requested provider defaults to 1
+    breaker_error_rate: float = 0.5  # open when the EWMA error rate reaches this
+    breaker_latency_threshold: float = 15.0  # seconds, open when the EWMA latency goes above this
+    breaker_min_requests: int = 5
+    breaker_open_seconds: float = 30.0  # cooldown before a half-open probe
+    breaker_ewma_alpha: float = 0.2
+
+    # Per-provider rate limiting (see app/llm/rate_limiter.py)
+    rate_limits: Dict[str, float] = {"openai": 50.0, "claude": 50.0, "groq": 30.0}  # requests per second
+    rate_limit_default: float = 20.0
+    rate_limit_burst: float = 10.0
+    concurrency_initial: int = 8
+    concurrency_min: int = 1
+    concurrency_max: int = 64
+    rate_limit_default_backoff: float = 1.0  # seconds after a 429 without Retry-After, doubled on each further 429
+    rate_limit_max_backoff: float = 60.0
+    rate_limit_max_attempts: int = 3
+
+    # "Accept now, decide later" webhook mode (see app/business_logic/jobs.py)
+    async_mode_default: bool = False  # otherwise opt in per request with ?mode=async or "Prefer: respond-async"
+    async_workers: int = 4
+    async_queue_max: int = 1000
+    job_store_max: int = 10000
+    callback_allowed_hosts: List[str] = []  # hosts job callbacks may be POSTed to, empty refuses every callback URL
+
+    # Structured JSON logging through a background writer thread (see app/utils/log.py)
+    log_level: str = "INFO"
+    log_levels: Dict[str, str] = {"httpx": "WARNING", "httpcore": "WARNING"}  # per-logger overrides
+    log_sample_rate: float = 1.0  # share of transactions whose INFO/DEBUG lines are kept, WARNING and above always are
+    log_queue_max: int = 10000  # records waiting for the writer thread, further records are dropped (and counted)
+
+    def configured_providers(self) -> Set[str]:
+        """
+        Providers this deployment can call: the default one, the hedge provider and the weighted routing targets.
+        """
+        providers = {self.llm_provider.lower()}
+        if self.hedge_enabled and self.hedge_provider:
+            providers.add(self.hedge_provider.lower())
+        if self.routing_enabled:
+            providers.update(name.lower() for name, weight in self.routing_weights.items() if weight > 0)
+        return providers
+
+    @model_validator(mode="after")
+    def require_configured_keys(self):
+        #fail at boot for a configured provider without a key, unused providers need none
+        missing = sorted(PROVIDER_API_KEYS[name] for name in self.configured_providers()
+                         if name in PROVIDER_API_KEYS and not getattr(self, PROVIDER_API_KEYS[name]))
+        if missing:
+            raise ValueError(f"Missing API key for the configured LLM providers: {', '.join(missing)}")
+        return self
+
 settings = Settings()
\ No newline at end of file
@@ -1,14 +1,194 @@
+import httpx
+import json
+import time
 from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
 from app.models import Transaction, RiskAnalysis
+from app.utils.http_clients import http_clients
+from app.llm.rate_limiter import rate_limiters
+from app.llm.prompts import build_batch_prompt, split_prompt
+from app.llm.streaming import IncrementalJSONParser, iter_sse, record_stream
+from app.llm.response_parser import parse_analysis, parse_json, to_analysis
+from app.utils.metrics import llm_rate_limited, llm_retries, time_stage
+from app.config import settings
+
+import logging
+logger = logging.getLogger(__name__)
 
 #implementation of the LLM base class so that all LLMs can be used interchangeably
 class LLM(ABC):
     """
     Abstract base class for all LLMs.
     """
+    name: str = ""  # provider name, also used to pick the shared connection pool
+    batch_tokens_per_item: int = 300  # completion budget per transaction in a batched prompt
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self._client = client
+
+    def bind_client(self, client: httpx.AsyncClient):
+        """
+        Inject the long-lived client created by the app lifespan.
+        """
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        #fall back to the shared pool if nothing was injected (or the injected client was closed)
+        if self._client is None or self._client.is_closed:
+            return http_clients.get(self.name)
+        return self._client
+
+    async def _post(self, url: str, headers: dict, json: dict) -> httpx.Response:
+        """
+        One request through the provider's rate limiter (queues for a slot, then reports the response back).
+        """
+        limiter = rate_limiters.get(self.name)
+        await limiter.acquire()
+        try:
+            response = await self.client.post(url, headers=headers, json=json)
+        except BaseException:
+            limiter.release(None)
+            raise
+        limiter.release(response)
+        if response.status_code == 429:
+            llm_rate_limited.inc(self.name)
+        return response
+
+    async def _post_with_retry(self, url: str, headers: dict, json: dict) -> httpx.Response:
+        """
+        Like _post, but a 429 is retried after the limiter has paused the queue for the provider's Retry-After.
+        """
+        for attempt in range(settings.rate_limit_max_attempts):
+            response = await self._post(url, headers, json)
+            if response.status_code != 429:
+                return response
+            logger.warning(f"[Retry {attempt+1}] {self.name} rate limit hit, request re-queued")
+            llm_retries.inc(self.name)
+        return response
+
+    async def _stream_json(self, url: str, headers: dict, body: dict) -> str:
+        """
+        Stream the completion (SSE) and return the first JSON object in it, skipping <think> blocks.
+        The connection is closed as soon as the object is complete instead of waiting for the rest of the generation.
+        """
+        limiter = rate_limiters.get(self.name)
+        for attempt in range(settings.rate_limit_max_attempts):
+            await limiter.acquire()
+            response = None
+            parser = IncrementalJSONParser()
+            first_token = decision = None
+            ended = False
+            start = time.perf_counter()
+            try:
+                async with self.client.stream("POST", url, headers=headers, json=body) as response:
+                    if response.status_code != 429:
+                        if response.is_error:
+                            await response.aread()
+                            response.raise_for_status()
+                        async for event in iter_sse(response.aiter_lines()):
+                            text = self._stream_delta(event)
+                            if not text:
+                                continue
+                            if first_token is None:
+                                first_token = time.perf_counter() - start
+                            if parser.feed(text) is not None:
+                                decision = time.perf_counter() - start
+                                break
+                        else:
+                            ended = True
+            except BaseException:
+                limiter.release(response)
+                raise
+            limiter.release(response)
+            if response.status_code == 429:
+                logger.warning(f"[Retry {attempt+1}] {self.name} rate limit hit, request re-queued")
+                llm_rate_limited.inc(self.name)
+                llm_retries.inc(self.name)
+                continue
+
+            record_stream(self.name, first_token=first_token, decision=decision, total=time.perf_counter() - start,
+                          skipped_chars=parser.skipped_chars, closed_early=decision is not None and not ended)
+            if parser.result is None:
+                raise json.JSONDecodeError("No JSON object found in streamed response", "", 0)
+            logger.info("Streamed decision", extra={
+                "provider": self.name,
+                "decision_ms": round(decision * 1000, 1),
+                "first_token_ms": round(first_token * 1000, 1),
+                "reasoning_chars_skipped": parser.skipped_chars,
+            })
+            return parser.result
+        response.raise_for_status()
+
+    def _chat_messages(self, prompt: str) -> List[dict]:
+        """
+        OpenAI-compatible messages with the static instruction prefix first, as its own system message,
+        so the provider's automatic prefix caching can reuse it across transactions.
+        """
+        static, dynamic = split_prompt(self.name, prompt) if settings.prompt_caching_enabled else ("", prompt)
+        if not static:
+            return [{"role": "user", "content": prompt}]
+        return [{"role": "system", "content": static}, {"role": "user", "content": dynamic}]
+
+    @staticmethod
+    def _chat_usage(usage: dict) -> dict:
+        #usage block of an OpenAI-compatible response as record_tokens keywords
+        return {
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+        }
+
+    def _stream_delta(self, event: dict) -> Optional[str]:
+        """
+        Text carried by one streamed event (OpenAI-compatible chat.completion.chunk by default).
+        """
+        choices = event.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content")
+
+    def _parse_analysis(self, content: str) -> RiskAnalysis:
+        """
+        Parse a completion with the shared response parser, logging the raw reply if no JSON can be recovered.
+        """
+        try:
+            return parse_analysis(content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Error decoding JSON: {e}", extra={"provider": self.name, "response": content})
+            raise
+
     @abstractmethod
     async def analyze_transaction(self, transaction: Transaction) -> RiskAnalysis:
         """
         Analyze a transaction and return a risk analysis.
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def _complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        """
+        Send a prompt to the provider and return the raw completion text.
+        """
+        pass
+
+    async def analyze_batch(self, transactions: List[Transaction]) -> Dict[str, RiskAnalysis]:
+        """
+        Score several transactions with a single prompt.
+        Returns the analyses keyed by transaction_id, raises ValueError if the reply is malformed.
+        """
+        prompt = self._build_batch_prompt(transactions)
+        content = await self._complete(prompt, max_tokens=self.batch_tokens_per_item * len(transactions))
+        with time_stage("response_parse"):
+            return self._parse_batch(content)
+
+    def _build_batch_prompt(self, transactions: List[Transaction]) -> str:
+        return build_batch_prompt(transactions)
+
+    def _parse_batch(self, content: str) -> Dict[str, RiskAnalysis]:
+        try:
+            items = parse_json(content, "[")
+            return {
+                str(item["transaction_id"]): to_analysis({k: v for k, v in item.items() if k != "transaction_id"})
+                for item in items
+            }
+        except Exception as e:
+            raise ValueError(f"Malformed batch response: {e}") from e
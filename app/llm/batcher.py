@@ -0,0 +1,106 @@
+#Opt-in micro-batching: concurrent analyze_transaction calls that arrive within a small time/size window
+#are packed into one prompt so the identical instruction block is only sent once per batch.
+
+import asyncio
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+from app.llm.base import LLM
+from app.models import Transaction, RiskAnalysis
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects transactions for one LLM and flushes them as a batch when max_batch_size is reached
+    or max_wait seconds after the first pending item, whichever comes first.
+    Items missing from (or all items of) a malformed batch reply fall back to per-item calls.
+    """
+    def __init__(self, llm: LLM, max_batch_size: int = 8, max_wait: float = 0.02):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Transaction, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        #metrics
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self.batch_sizes = Counter()
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    async def analyze_transaction(self, transaction: Transaction) -> RiskAnalysis:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((transaction, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Transaction, asyncio.Future]]):
+        start = time.perf_counter()
+        leftovers = batch
+
+        if len(batch) > 1:
+            try:
+                results = await self.llm.analyze_batch([transaction for transaction, _ in batch])
+                leftovers = []
+                for transaction, future in batch:
+                    analysis = results.get(transaction.transaction_id)
+                    if analysis is None:
+                        leftovers.append((transaction, future))
+                    elif not future.done():
+                        future.set_result(analysis)
+            except Exception as e:
+                logger.warning(f"Batch of {len(batch)} failed, falling back to per-item calls: {e}")
+            if leftovers:
+                self.fallbacks += len(leftovers)
+
+        await asyncio.gather(*(self._single(transaction, future) for transaction, future in leftovers))
+
+        elapsed = time.perf_counter() - start
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes[len(batch)] += 1
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+
+    async def _single(self, transaction: Transaction, future: asyncio.Future):
+        try:
+            analysis = await self.llm.analyze_transaction(transaction)
+            if not future.done():
+                future.set_result(analysis)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "fallback_items": self.fallbacks,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "avg_latency_ms": round(self.latency_total / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_latency_ms": round(self.latency_max * 1000, 2),
+        }
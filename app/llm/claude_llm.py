@@ -4,26 +4,42 @@
 import httpx
 import json
 import time
+from typing import Optional
 from app.config import settings
 from app.llm.base import LLM
+from app.llm.prompts import build_prompt, record_tokens, split_prompt
 from app.models import Transaction, RiskAnalysis
+from app.utils.metrics import time_stage
+
+import logging
+logger = logging.getLogger(__name__)
 
 class ClaudeLLM(LLM):
+    name = "claude"
     model = "claude-3-opus-20240229"
 
     async def analyze_transaction(self, transaction: Transaction) -> RiskAnalysis:
+        prompt = self._build_prompt(transaction)
+        if settings.streaming_enabled:
+            headers, body = self._request(prompt)
+            content = await self._stream_json(settings.anthropic_api_url, headers, dict(body, stream=True))
+            record_tokens(self.name, prompt, model=self.model)
+        else:
+            content = await self._complete(prompt)
+        
+        with time_stage("response_parse"):
+            return self._parse_analysis(content)
+
+    def _request(self, prompt: str, max_tokens: Optional[int] = None):
         headers = {
             "x-api-key": settings.anthropic_api_key,
             "anthropic-version": "2023-06-01",  # Consider updating this to "2023-06-01" or latest
             "Content-Type": "application/json" 
         }
         
-        transaction_json = transaction.model_dump_json(indent=2)
-        prompt = self._build_prompt(transaction)
-        
         body = {
             "model": self.model,
-            "max_tokens": 1024,
+            "max_tokens": max_tokens or 1024,
             "temperature": 0.2,
             "messages": [
                 {"role": "user", "content": prompt}
@@ -31,51 +47,57 @@ class ClaudeLLM(LLM):
             "system": "You are a specialized financial risk analyst responding with valid JSON only."
         }
 
+        #move the static instructions into a cacheable system block, the user turn only carries the transaction
+        static, dynamic = split_prompt(self.name, prompt) if settings.prompt_caching_enabled else ("", prompt)
+        if static:
+            body["system"] = [
+                {"type": "text", "text": body["system"]},
+                {"type": "text", "text": static, "cache_control": {"type": "ephemeral"}},
+            ]
+            body["messages"] = [{"role": "user", "content": dynamic}]
+        return headers, body
+
+    async def _complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        headers, body = self._request(prompt, max_tokens)
+
         start_time = time.time()
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    "https://api.anthropic.com/v1/messages", 
-                    headers=headers, 
-                    json=body,
-                    timeout=30.0  # Adding explicit timeout (Added by AI)
-                )
-                response.raise_for_status()
-                
-                duration = time.time() - start_time
-                print(f"Claude Response Time: {duration:.2f}s")
-                
-                content = response.json()["content"][0]["text"]
-                
-                try:
-                    result = json.loads(content)
-                except json.JSONDecodeError as e:
-                    print(f"Raw response: {content}")
-                    raise ValueError(f"Failed to parse Claude response: {content}") from e
-                
-                return RiskAnalysis(**result)
+        try:
+            response = await self._post_with_retry(
+                settings.anthropic_api_url, 
+                headers, 
+                body
+            )
+            response.raise_for_status()
             
-            #ai generated (to figure out why the api wasnt working)    
-            except httpx.HTTPStatusError as e:
-                error_detail = None
-                try:
-                    error_detail = e.response.json()
-                    print(f"API Error Details: {json.dumps(error_detail, indent=2)}")
-                except:
-                    print(f"Status code: {e.response.status_code}, Response text: {e.response.text}")
-                raise e
-
-    def _build_prompt(self, transaction: Transaction) -> str:
-        transaction_json = transaction.model_dump_json(indent=2)
-        return f""" (Update prompt)
-Analyze this financial transaction and respond ONLY with a valid JSON object containing:
-- risk_score: number between 0.0 and 1.0
-- risk_factors: array of strings
-- reasoning: brief string explanation
-- recommended_action: string ("allow", "review", or "block")
+            duration = time.time() - start_time
+            logger.info("Provider response", extra={
+                "provider": self.name, "model": self.model, "duration_ms": round(duration * 1000, 1),
+            })
+            
+            response_data = response.json()
+            usage = response_data.get("usage", {})
+            cache_read = usage.get("cache_read_input_tokens") or 0
+            cache_write = usage.get("cache_creation_input_tokens") or 0
+            #input_tokens only counts the uncached part of the prompt
+            prompt_tokens = usage["input_tokens"] + cache_read + cache_write if "input_tokens" in usage else None
+            record_tokens(self.name, prompt, prompt_tokens, usage.get("output_tokens"), cache_read, cache_write, model=self.model)
+            return response_data["content"][0]["text"]
+        
+        #ai generated (to figure out why the api wasnt working)    
+        except httpx.HTTPStatusError as e:
+            error_detail = None
+            try:
+                error_detail = e.response.json()
+                logger.error(f"API Error Details: {json.dumps(error_detail)}")
+            except:
+                logger.error(f"Status code: {e.response.status_code}, Response text: {e.response.text}")
+            raise e
 
-Transaction data:
-{transaction_json}
+    def _stream_delta(self, event: dict) -> Optional[str]:
+        #Anthropic streams text as content_block_delta events
+        if event.get("type") == "content_block_delta":
+            return (event.get("delta") or {}).get("text")
+        return None
 
-Your response must be valid JSON without any additional text, explanation, or markdown.
-"""
\ No newline at end of file
+    def _build_prompt(self, transaction: Transaction) -> str:
+        return build_prompt(self.name, transaction)
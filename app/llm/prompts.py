@@ -0,0 +1,209 @@
+#Shared prompt builder for all providers.
+#Transactions are encoded as one compact row under a single field legend instead of indented JSON,
+#and the instruction text is compiled once per provider, so a prompt is just static prefix + row.
+
+import re
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import Transaction
+from app.business_logic.feature_store import feature_store
+from app.business_logic.baselines import baseline_store
+from app.utils.geoip import geoip
+from app.utils.metrics import stage_duration, llm_tokens
+
+FIELD_LEGEND = (
+    "tx|time|amount currency|customer id,country,ip,ip country (- = unknown)|payment type,last4,issuer country"
+    "|velocity customer;card;ip as count 1m,1h,24h/amount 1m,1h,24h"
+    "|amount z-score vs customer average,percentile in merchant category (- = no history)|merchant id,category,name"
+)
+
+INSTRUCTIONS = """Assess risk using:
+• Geographic mismatch (customer ↔ card ↔ IP country, high-risk countries {high_risk_countries})
+• Pattern anomalies (amount, time-of-day, velocity vs the customer/card/IP history)
+• Payment-method risk
+• Merchant reputation / category
+Several risk factors together and higher amounts raise the score; ordinary cross-border shopping alone does not.
+0.0-0.3 → allow 0.3-0.7 → review 0.7-1.0 → block
+"""
+
+SCHEMA = '{"risk_score":0.0-1.0,"risk_factors":["short strings"],"reasoning":"≤40 words","recommended_action":"allow"|"review"|"block"}'
+
+
+def _clean(value) -> str:
+    #the row separators must not appear inside values
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def encode_velocity(transaction: Transaction) -> str:
+    #"1,3,5/130,410,980" per key kind, "-" when the feature store is off
+    if not settings.features_enabled:
+        return "-"
+    parts = []
+    for windows in feature_store.features(transaction).values():
+        counts = ",".join(str(count) for count, _ in windows.values())
+        amounts = ",".join(f"{amount:.0f}" for _, amount in windows.values())
+        parts.append(f"{counts}/{amounts}")
+    return ";".join(parts)
+
+
+def encode_baseline(transaction: Transaction) -> str:
+    #"2.4,97" or "-,-" without enough history
+    if not settings.baselines_enabled:
+        return "-,-"
+    features = baseline_store.features(transaction)
+    z, percentile = features["amount_z"], features["category_percentile"]
+    return f"{'-' if z is None else f'{z:.1f}'},{'-' if percentile is None else f'{percentile:.0f}'}"
+
+
+def encode_transaction(transaction: Transaction) -> str:
+    """
+    One-line encoding of a transaction in FIELD_LEGEND order (merchant name last so commas in it stay unambiguous).
+    """
+    c, p, m = transaction.customer, transaction.payment_method, transaction.merchant
+    return (
+        f"{_clean(transaction.transaction_id)}|{_clean(transaction.timestamp)}|{transaction.amount:.2f} {_clean(transaction.currency)}"
+        f"|{_clean(c.id)},{_clean(c.country)},{_clean(c.ip_address)},{geoip.country(c.ip_address) or '-'}"
+        f"|{_clean(p.type)},{_clean(p.last_four)},{_clean(p.country_of_issue)}"
+        f"|{encode_velocity(transaction)}"
+        f"|{encode_baseline(transaction)}"
+        f"|{_clean(m.id)},{_clean(m.category)},{_clean(m.name)}"
+    )
+
+
+class PromptTemplate:
+    """
+    Precompiled prompt: a static instruction block shared by every request and the per-transaction rows.
+    """
+    def __init__(self, header: str, footer: str = ""):
+        #the same high-risk list as the pre-screen rules, so the two never disagree
+        instructions = INSTRUCTIONS.format(high_risk_countries=" ".join(c.upper() for c in settings.high_risk_countries))
+        self.static = f"You are a financial-fraud analyst.\n{header}{instructions}Transactions ({FIELD_LEGEND}):\n"
+        self.footer = footer
+
+    def dynamic(self, transactions: List[Transaction]) -> str:
+        return "\n".join(encode_transaction(t) for t in transactions) + "\n" + self.footer
+
+    def render(self, transaction: Transaction) -> str:
+        return self.static + self.dynamic([transaction])
+
+    def render_batch(self, transactions: List[Transaction]) -> str:
+        return self.static + self.dynamic(transactions)
+
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    "openai": PromptTemplate(f"Return **only** this JSON, no markdown, no extra keys:\n{SCHEMA}\n"),
+    "claude": PromptTemplate(
+        f"Respond ONLY with a valid JSON object:\n{SCHEMA}\n",
+        "Your response must be valid JSON without any additional text, explanation, or markdown.\n",
+    ),
+    "groq": PromptTemplate(
+        f"Return **only** this JSON, no markdown, no extra keys:\n{SCHEMA}\n"
+        "Also dont include <think> or <reasoning> in your response.\n"
+    ),
+}
+
+BATCH_TEMPLATE = PromptTemplate(
+    "Return **only** a JSON array with one object per transaction, no markdown, no extra keys:\n"
+    f'[{{"transaction_id":"copied from tx",{SCHEMA[1:]}]\n'
+    "Assess each transaction independently.\n"
+)
+
+
+def build_prompt(provider: str, transaction: Transaction) -> str:
+    start = perf_counter()
+    prompt = TEMPLATES[provider].render(transaction)
+    stage_duration.observe(perf_counter() - start, "prompt_build")
+    return prompt
+
+
+def build_batch_prompt(transactions: List[Transaction]) -> str:
+    start = perf_counter()
+    prompt = BATCH_TEMPLATE.render_batch(transactions)
+    stage_duration.observe(perf_counter() - start, "prompt_build")
+    return prompt
+
+
+def split_prompt(provider: str, prompt: str) -> Tuple[str, str]:
+    """
+    (cacheable prefix, per-request suffix) of a prompt built from one of the templates.
+    The prefix is byte-identical on every request, so providers can serve it from their prompt cache.
+    Prompts that weren't built from a template come back as ("", prompt).
+    """
+    for template in (TEMPLATES.get(provider), BATCH_TEMPLATE):
+        if template is not None and prompt.startswith(template.static):
+            return template.static, prompt[len(template.static):]
+    return "", prompt
+
+
+_TOKEN_PIECE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local approximation of a BPE token count: words are ~4 characters per token, digits go in groups of 3,
+    every other symbol is a token of its own. Close enough to compare prompts without a tokenizer.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECE.findall(text):
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+class TokenStats:
+    """
+    Per-provider token accounting: the local estimate for every prompt, and the provider's own counts when reported.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.estimated_prompt_tokens = 0
+        self.reported = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0  # prompt tokens served from the provider's prompt cache
+        self.cache_write_tokens = 0  # prompt tokens written to the cache (Anthropic bills these separately)
+
+    def record(self, estimated: int, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+               cached_tokens: Optional[int] = None, cache_write_tokens: Optional[int] = None):
+        self.requests += 1
+        self.estimated_prompt_tokens += estimated
+        if prompt_tokens is not None:
+            self.reported += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens or 0
+            self.cached_tokens += cached_tokens or 0
+            self.cache_write_tokens += cache_write_tokens or 0
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            "avg_estimated_prompt_tokens": round(self.estimated_prompt_tokens / self.requests, 1) if self.requests else 0.0,
+            "reported_requests": self.reported,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.reported, 1) if self.reported else 0.0,
+            "avg_completion_tokens": round(self.completion_tokens / self.reported, 1) if self.reported else 0.0,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+
+
+token_stats: Dict[str, TokenStats] = {}
+
+
+def record_tokens(provider: str, prompt: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                  cached_tokens: Optional[int] = None, cache_write_tokens: Optional[int] = None, model: str = ""):
+    estimated = estimate_tokens(prompt)
+    token_stats.setdefault(provider, TokenStats()).record(
+        estimated, prompt_tokens, completion_tokens, cached_tokens, cache_write_tokens
+    )
+    llm_tokens.inc(provider, model, "in", amount=estimated if prompt_tokens is None else prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc(provider, model, "out", amount=completion_tokens)
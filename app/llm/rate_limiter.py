@@ -0,0 +1,211 @@
+#Per-provider rate limiting: a token bucket for requests/second plus an AIMD concurrency limit.
+#Requests wait in FIFO order instead of running into the provider limits and retrying blindly,
+#and Retry-After / x-ratelimit-* response headers pause the queue until the provider is ready again.
+
+import asyncio
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from app.config import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset(value) -> Optional[float]:
+    """
+    Seconds until a limit resets, from "1.5" / "20ms" / "6m0s" (OpenAI, Groq)
+    or an RFC 3339 timestamp (Anthropic). Returns None if the value can't be read.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+        return sum(float(number) * scale[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except ValueError:
+        return None
+
+
+def _header(headers, *names) -> Optional[str]:
+    if headers is None:
+        return None
+    for name in names:
+        value = headers.get(name)
+        if isinstance(value, str):
+            return value
+    return None
+
+
+class RateLimiter:
+    """
+    Admits requests in FIFO order when a concurrency slot and a token are available
+    and the provider has not asked us to back off.
+    The concurrency limit grows by ~1 per window of successful calls and is halved on a 429 or 5xx (AIMD).
+    """
+    def __init__(self, rate: float, burst: float, initial_concurrency: int = 8, min_concurrency: int = 1,
+                 max_concurrency: int = 64, default_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.rate = rate
+        self.burst = burst
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.default_backoff = default_backoff
+        self.max_backoff = max_backoff
+
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.consecutive_429 = 0
+        self._loop = None
+        self._admission: Optional[asyncio.Lock] = None
+        self._slot_freed: Optional[asyncio.Event] = None
+
+        #metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.rate_limited = 0
+
+    def _ensure_primitives(self):
+        #asyncio primitives belong to one event loop, recreate them if we are running in a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._admission = asyncio.Lock()  # asyncio.Lock wakes waiters in FIFO order
+            self._slot_freed = asyncio.Event()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        self._ensure_primitives()
+        start = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            async with self._admission:
+                #concurrency slot (only the admission holder can start requests, so this only shrinks)
+                while self.in_flight >= max(int(self.limit), 1):
+                    self._slot_freed.clear()
+                    await self._slot_freed.wait()
+
+                #provider asked us to back off (Retry-After / exhausted x-ratelimit-remaining)
+                delay = self.blocked_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.blocked_until = 0.0
+
+                #token bucket
+                self._refill()
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    self.tokens = 1.0
+                    self.last_refill = time.monotonic()
+                self.tokens -= 1
+                self.in_flight += 1
+        finally:
+            self.queue_depth -= 1
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def release(self, response=None):
+        """
+        Free the slot and adapt to the response (None if the request failed without one).
+        """
+        self.in_flight = max(self.in_flight - 1, 0)
+        if response is not None:
+            self._observe(response)
+        if self._slot_freed is not None:
+            self._slot_freed.set()
+
+    def _observe(self, response):
+        headers = getattr(response, "headers", None)
+        now = time.monotonic()
+
+        if response.status_code == 429:
+            self.rate_limited += 1
+            self.consecutive_429 += 1
+            self.limit = max(self.min_concurrency, self.limit / 2)
+            wait = parse_reset(_header(headers, "retry-after"))
+            if wait is None:
+                wait = parse_reset(_header(headers, "x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset"))
+            if wait is None:
+                wait = self.default_backoff * (2 ** (self.consecutive_429 - 1))
+            wait = min(wait, self.max_backoff)
+            self.blocked_until = max(self.blocked_until, now + wait)
+            logger.warning(f"Rate limited, pausing queue for {wait:.2f}s (concurrency limit {self.limit:.1f})")
+            return
+
+        self.consecutive_429 = 0
+        if response.status_code >= 500:
+            #overloaded (529) or failing: fewer requests in flight, but no pause since there is no reset to wait for
+            self.limit = max(self.min_concurrency, self.limit / 2)
+        elif 200 <= response.status_code < 300:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+        #the provider tells us how many requests are left before the window resets
+        remaining = _header(headers, "x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+        if remaining is not None and remaining.strip() == "0":
+            wait = parse_reset(_header(headers, "x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset"))
+            if wait:
+                self.blocked_until = max(self.blocked_until, now + min(wait, self.max_backoff))
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "avg_wait_ms": round(self.wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+            "rate_limited": self.rate_limited,
+        }
+
+
+class RateLimiterRegistry:
+    def __init__(self):
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def get(self, name: str) -> RateLimiter:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = RateLimiter(
+                rate=settings.rate_limits.get(name, settings.rate_limit_default),
+                burst=settings.rate_limit_burst,
+                initial_concurrency=settings.concurrency_initial,
+                min_concurrency=settings.concurrency_min,
+                max_concurrency=settings.concurrency_max,
+                default_backoff=settings.rate_limit_default_backoff,
+                max_backoff=settings.rate_limit_max_backoff,
+            )
+            self._limiters[name] = limiter
+        return limiter
+
+    def reset(self):
+        self._limiters.clear()
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+rate_limiters = RateLimiterRegistry()
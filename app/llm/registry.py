@@ -0,0 +1,67 @@
+#Lazy LLM provider registry.
+#A provider's module is imported and its class constructed the first time it is called, so a worker only pays for
+#the providers it actually uses and only their API keys have to be set (see Settings.configured_providers).
+
+import importlib
+from collections.abc import Mapping
+from typing import Dict, Iterator, Tuple
+from app.config import settings, PROVIDER_API_KEYS
+from app.llm.base import LLM
+
+#provider name -> (module, class)
+PROVIDERS: Dict[str, Tuple[str, str]] = {
+    "openai": ("app.llm.openai_llm", "OpenAILLM"),
+    "claude": ("app.llm.claude_llm", "ClaudeLLM"),
+    "groq": ("app.llm.groq_llm", "GroqLLM"),
+}
+
+
+class ProviderRegistry(Mapping):
+    """
+    Read-only mapping of provider name -> LLM instance.
+    Membership tests and iterating the names never import anything; registry[name] constructs the provider on first use
+    (ValueError if its API key is not set). loaded() returns only the providers constructed so far.
+    """
+    def __init__(self, providers: Dict[str, Tuple[str, str]] = PROVIDERS):
+        self._providers = dict(providers)
+        self._instances: Dict[str, LLM] = {}
+        self._clients = None
+
+    def __getitem__(self, name: str) -> LLM:
+        llm = self._instances.get(name)
+        if llm is None:
+            llm = self._instances[name] = self._create(name)
+        return llm
+
+    def __contains__(self, name) -> bool:
+        return name in self._providers
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._providers)
+
+    def __len__(self) -> int:
+        return len(self._providers)
+
+    def _create(self, name: str) -> LLM:
+        module, cls = self._providers[name]
+        key = PROVIDER_API_KEYS.get(name)
+        if key and not getattr(settings, key):
+            raise ValueError(f"LLM provider '{name}' is not configured: set {key} in .env")
+        llm = getattr(importlib.import_module(module), cls)()
+        if self._clients is not None:
+            llm.bind_client(self._clients.get(name))
+        return llm
+
+    def bind_clients(self, clients):
+        """
+        Inject the shared connection pools (app/utils/http_clients.py), into the loaded providers and any loaded later.
+        """
+        self._clients = clients
+        for name, llm in self._instances.items():
+            llm.bind_client(clients.get(name))
+
+    def loaded(self) -> Dict[str, LLM]:
+        return dict(self._instances)
+
+
+llm_providers = ProviderRegistry()
@@ -0,0 +1,209 @@
+#One parser for the replies of every provider (plain, streamed and batched completions).
+#extract_json scans the completion once: <think>/<reasoning> blocks and any text or markdown fence around the answer
+#are skipped, the first balanced top-level object (or array) is cut out, and the near-JSON mistakes models make are
+#repaired on the way: trailing commas, single-quoted strings, //, /* */ and # comments (copied from the prompt template)
+#and Python's True/False/None. Anything else (a missing comma, a truncated object) still raises json.JSONDecodeError.
+#to_analysis then clamps risk_score into 0-1 and maps recommended_action onto allow/review/block, so a reply that is
+#only slightly off no longer fails validation and costs a second provider call (hedge or fallback).
+
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional
+from app.models import RiskAnalysis
+from app.utils.metrics import llm_response_repairs
+
+VALID_ACTIONS = ("allow", "review", "block")
+
+ACTION_ALIASES = {
+    "approve": "allow", "approved": "allow", "accept": "allow", "accepted": "allow", "allowed": "allow", "pass": "allow",
+    "manual review": "review", "flag": "review", "flagged": "review", "hold": "review", "investigate": "review",
+    "escalate": "review",
+    "reject": "block", "rejected": "block", "decline": "block", "declined": "block", "deny": "block", "denied": "block",
+    "blocked": "block",
+}
+
+SKIP_TAGS = ("<think>", "<reasoning>")
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+#characters the scanner has to look at, everything else (numbers, whitespace, colons) is copied as is
+_SPECIAL = re.compile(r"[\"'{}\[\],/#A-Za-z_]")
+_DOUBLE_QUOTED = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SINGLE_QUOTED = re.compile(r"[^'\\]*(?:\\.[^'\\]*)*'", re.DOTALL)
+_UNESCAPED_QUOTE = re.compile(r'(?<!\\)"')
+_WORD = re.compile(r"[A-Za-z_]+")
+_decoder = json.JSONDecoder()
+
+
+def _find_start(text: str, opener: str) -> int:
+    #position of the first opener outside a <think>/<reasoning> block
+    i, lowered = 0, None
+    while True:
+        start = text.find(opener, i)
+        tag = text.find("<", i, start if start != -1 else len(text))
+        if tag == -1:
+            if start == -1:
+                raise json.JSONDecodeError("No JSON object found in response", text, len(text))
+            return start
+        if lowered is None:
+            lowered = text.lower()
+        opened = next((t for t in SKIP_TAGS if lowered.startswith(t, tag)), None)
+        if opened is None:
+            i = tag + 1
+            continue
+        end = lowered.find("</" + opened[1:], tag)
+        i = end + len(opened) + 1 if end != -1 else tag + len(opened)  # an unclosed block is read as plain text
+
+
+def extract_json(text: str, opener: str = "{", repairs: Optional[List[str]] = None) -> str:
+    """
+    The first top-level JSON object (opener "{") or array ("[") in a completion, repaired into strict JSON.
+    The kind of every repair made is appended to repairs.
+    """
+    if repairs is None:
+        repairs = []
+    closer = "}" if opener == "{" else "]"
+    start = _find_start(text, opener)
+    parts: List[str] = []
+    seg = start  # start of the text not yet copied into parts
+    depth = 0
+    comma = False  # a comma was seen and held back until we know it isn't trailing
+    i, n = start, len(text)
+    while True:
+        match = _SPECIAL.search(text, i)
+        if match is None:
+            raise json.JSONDecodeError(f"Unterminated JSON {'object' if opener == '{' else 'array'}", text, n)
+        j, c = match.start(), match.group()
+
+        if c in "/#":
+            if comma and text[seg:j].strip():
+                parts.append(",")
+                comma = False
+            if c == "#" or text.startswith("//", j):
+                end = text.find("\n", j)
+                end = n if end == -1 else end
+            elif text.startswith("/*", j):
+                end = text.find("*/", j)
+                end = n if end == -1 else end + 2
+            else:
+                i = j + 1
+                continue
+            parts.append(text[seg:j])
+            seg = i = end
+            repairs.append("comment")
+            continue
+
+        if comma:
+            if c in "}]" and not text[seg:j].strip():
+                repairs.append("trailing_comma")
+            else:
+                parts.append(",")
+            comma = False
+
+        if c == '"':
+            string = _DOUBLE_QUOTED.match(text, j + 1)
+            if string is None:
+                raise json.JSONDecodeError("Unterminated string", text, j)
+            i = string.end()
+        elif c == "'":
+            string = _SINGLE_QUOTED.match(text, j + 1)
+            if string is None:
+                raise json.JSONDecodeError("Unterminated string", text, j)
+            body = _UNESCAPED_QUOTE.sub('\\\\"', string.group()[:-1].replace("\\'", "'"))
+            parts.append(text[seg:j])
+            parts.append(f'"{body}"')
+            seg = i = string.end()
+            repairs.append("single_quote")
+        elif c == ",":
+            parts.append(text[seg:j])
+            seg = i = j + 1
+            comma = True
+        elif c in "{[":
+            depth += 1
+            i = j + 1
+        elif c in "}]":
+            depth -= 1
+            i = j + 1
+            if depth == 0:
+                if c != closer:
+                    raise json.JSONDecodeError(f"Expecting '{closer}'", text, j)
+                parts.append(text[seg:i])
+                return "".join(parts)
+        else:
+            word = _WORD.match(text, j)
+            i = word.end()
+            literal = _LITERALS.get(word.group())
+            if literal is not None:
+                parts.append(text[seg:j])
+                parts.append(literal)
+                seg = i
+                repairs.append("literal")
+
+
+def parse_json(text: str, opener: str = "{") -> Any:
+    """
+    extract_json + json.loads. Raises json.JSONDecodeError when there is no (repairable) JSON in the text.
+    """
+    #strict JSON (the usual case) is decoded in place, the repairing scan only runs when that fails
+    start = _find_start(text, opener)
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    repairs: List[str] = []
+    extracted = extract_json(text, opener, repairs)
+    for kind in repairs:
+        llm_response_repairs.inc(kind)
+    try:
+        return json.loads(extracted)
+    except json.JSONDecodeError as e:
+        raise json.JSONDecodeError(f"Error decoding JSON: {e.msg}", e.doc, e.pos) from e
+
+
+def normalize_action(action: Any) -> Any:
+    """
+    Map a recommended_action onto allow/review/block ("Approve", "BLOCK.", "manual review", "review manually").
+    Values that can't be mapped are returned unchanged.
+    """
+    if not isinstance(action, str):
+        return action
+    key = action.strip().strip(".!\"'").lower().replace("_", " ")
+    if key in VALID_ACTIONS:
+        return key
+    if key in ACTION_ALIASES:
+        return ACTION_ALIASES[key]
+    first = key.split(" ", 1)[0]
+    return first if first in VALID_ACTIONS else ACTION_ALIASES.get(first, action)
+
+
+def to_analysis(data: Dict[str, Any]) -> RiskAnalysis:
+    """
+    Build a RiskAnalysis from the parsed reply, clamping risk_score into 0-1 and normalizing recommended_action.
+    Raises ValueError (pydantic's ValidationError) if the reply still doesn't fit the model or risk_score is NaN.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    data = dict(data)
+    score = data.get("risk_score")
+    if (isinstance(score, (int, float)) and not isinstance(score, bool)
+            and not math.isnan(score) and not 0.0 <= score <= 1.0):
+        data["risk_score"] = min(max(float(score), 0.0), 1.0)
+        llm_response_repairs.inc("score_clamped")
+    action = data.get("recommended_action")
+    normalized = normalize_action(action)
+    if normalized != action:
+        data["recommended_action"] = normalized
+        llm_response_repairs.inc("action_normalized")
+    analysis = RiskAnalysis(**data)
+    #NaN passes every comparison against the action thresholds, there is no safe score to map it to
+    if not math.isfinite(analysis.risk_score):
+        raise ValueError(f"risk_score is not a finite number: {score!r}")
+    return analysis
+
+
+def parse_analysis(text: str) -> RiskAnalysis:
+    """
+    A completion as a RiskAnalysis: json.JSONDecodeError if no JSON can be recovered, ValueError if it doesn't fit the model.
+    """
+    return to_analysis(parse_json(text))
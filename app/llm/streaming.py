@@ -0,0 +1,176 @@
+#Streaming (SSE) support for the LLM providers.
+#The reply is parsed as tokens arrive: <think>/<reasoning> blocks and any text around the answer are skipped,
+#and the JSON object is handed back as soon as its closing brace arrives so the connection can be closed early.
+
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+SKIP_TAGS = ("think", "reasoning")
+
+
+class IncrementalJSONParser:
+    """
+    Feed completion text in arbitrary chunks; feed() returns the first complete top-level
+    JSON object once it has been assembled (None until then).
+    Text inside skipped tags is never scanned character by character, tags split across chunks are handled.
+    """
+    def __init__(self, skip_tags=SKIP_TAGS):
+        self._open_tags = [f"<{tag}>" for tag in skip_tags]
+        self._closing: Optional[str] = None  # closing tag of the block being skipped
+        self._pending = ""  # tail that may be the start of a tag
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.skipped_chars = 0
+        self.result: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.result is not None:
+            return self.result
+        text = self._pending + chunk
+        self._pending = ""
+        i, n = 0, len(text)
+        while i < n:
+            if self._closing is not None:
+                end = text.lower().find(self._closing, i)
+                if end == -1:
+                    #keep a possible partial closing tag for the next chunk
+                    keep = min(len(self._closing) - 1, n - i)
+                    self.skipped_chars += n - i - keep
+                    self._pending = text[n - keep:] if keep else ""
+                    return None
+                self.skipped_chars += end + len(self._closing) - i
+                i = end + len(self._closing)
+                self._closing = None
+            elif self._depth == 0:
+                brace, tag = text.find("{", i), text.find("<", i)
+                if brace == -1 and tag == -1:
+                    return None
+                if tag != -1 and (brace == -1 or tag < brace):
+                    head = text[tag:tag + 12].lower()
+                    opened = next((t for t in self._open_tags if head.startswith(t)), None)
+                    if opened:
+                        self._closing = "</" + opened[1:]
+                        i = tag + len(opened)
+                    elif any(t.startswith(head) for t in self._open_tags) and n - tag < len(max(self._open_tags, key=len)):
+                        self._pending = text[tag:]
+                        return None
+                    else:
+                        i = tag + 1
+                    continue
+                i = self._scan_object(text, brace)
+                if self.result is not None:
+                    return self.result
+            else:
+                i = self._scan_object(text, i)
+                if self.result is not None:
+                    return self.result
+        return None
+
+    def _scan_object(self, text: str, start: int) -> int:
+        #string-aware brace matching from start, appends the consumed text to the object
+        depth, in_string, escape = self._depth, self._in_string, self._escape
+        i = start
+        for i in range(start, len(text)):
+            c = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif c == "\\":
+                    escape = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    self._parts.append(text[start:i + 1])
+                    self.result = "".join(self._parts)
+                    self._depth, self._in_string, self._escape = 0, False, False
+                    return i + 1
+        self._parts.append(text[start:])
+        self._depth, self._in_string, self._escape = depth, in_string, escape
+        return len(text)
+
+
+async def iter_sse(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    """
+    Decode a server-sent event stream into the JSON payloads of its data fields.
+    Stops at the OpenAI-style "[DONE]" sentinel, non-JSON payloads are ignored.
+    """
+    data: List[str] = []
+    async for line in lines:
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+            continue
+        if line or not data:
+            continue  # event/id/comment lines
+        payload, data = "\n".join(data), []
+        if payload == "[DONE]":
+            return
+        try:
+            yield json.loads(payload)
+        except json.JSONDecodeError:
+            continue
+    if data and data != ["[DONE]"]:
+        try:
+            yield json.loads("\n".join(data))
+        except json.JSONDecodeError:
+            pass
+
+
+class StreamStats:
+    """
+    Per-provider streaming counters.
+    time_to_decision is measured up to the closing brace of the answer, total up to the end of the stream,
+    so the two only differ when the stream runs on after the answer.
+    """
+    def __init__(self):
+        self.streams = 0
+        self.early_closes = 0
+        self.incomplete = 0
+        self.skipped_chars = 0
+        self.first_token_total = 0.0
+        self.decision_total = 0.0
+        self.generation_total = 0.0
+
+    def record(self, first_token: Optional[float], decision: Optional[float], total: float,
+               skipped_chars: int, closed_early: bool):
+        self.streams += 1
+        self.skipped_chars += skipped_chars
+        self.generation_total += total
+        if first_token is not None:
+            self.first_token_total += first_token
+        if decision is None:
+            self.incomplete += 1
+        else:
+            self.decision_total += decision
+        if closed_early:
+            self.early_closes += 1
+
+    def stats(self) -> dict:
+        decided = self.streams - self.incomplete
+        return {
+            "streams": self.streams,
+            "early_closes": self.early_closes,
+            "incomplete": self.incomplete,
+            "skipped_reasoning_chars": self.skipped_chars,
+            "avg_time_to_first_token_ms": round(self.first_token_total / self.streams * 1000, 2) if self.streams else 0.0,
+            "avg_time_to_decision_ms": round(self.decision_total / decided * 1000, 2) if decided else 0.0,
+            "avg_total_generation_ms": round(self.generation_total / self.streams * 1000, 2) if self.streams else 0.0,
+        }
+
+
+stream_stats: Dict[str, StreamStats] = {}
+
+
+def record_stream(provider: str, **timings):
+    stream_stats.setdefault(provider, StreamStats()).record(**timings)
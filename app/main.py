@@ -1,62 +1,348 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
 from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel, ValidationError
 from app.config import settings
 from app.models import Transaction, RiskAnalysis
-from app.business_logic.risk_analyzer import analyze_transaction
-from app.business_logic.api_notifier import notify_api
+from app.business_logic import risk_analyzer, api_notifier
+from app.business_logic.analysis_cache import analysis_cache
+from app.business_logic.feature_store import feature_store
+from app.business_logic.baselines import baseline_store
+from app.business_logic.notification_outbox import notification_outbox
+from app.business_logic.idempotency import idempotency_store
+from app.business_logic.jobs import worker_pool, job_store, public_job, JobStoreFull
 from app.utils.auth import verify_credentials
+from app.utils.http_clients import http_clients
+from app.utils.geoip import geoip
+from app.utils.metrics import registry, time_stage, MetricsMiddleware, CONTENT_TYPE
+from app.utils.log import setup_logging, stop_logging, log_context
+from app.utils.responses import ModelJSONResponse
+from app.utils.shared_state import shared_state
+from app.llm.rate_limiter import rate_limiters
+from app.llm.streaming import stream_stats
+from app.llm.prompts import token_stats
 
 
-#Addded logging for console outputs and testing 
-#import logging #(havent implemented the logging yet)
+import logging
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #JSON logs written by a background thread (app/utils/log.py), set up here rather than on import
+    setup_logging()
+    #one long-lived connection pool per provider, injected into the LLM instances as they are loaded
+    risk_analyzer.llm_provider.bind_clients(http_clients)
+    http_clients.get("notifier")
+    if settings.notify_async:
+        await notification_outbox.start()
+    await baseline_store.start()
+    await worker_pool.start(process_transaction)
+    yield
+    await worker_pool.stop()
+    await baseline_store.stop()
+    #drain pending notifications before the connection pools are closed
+    await notification_outbox.stop()
+    await http_clients.aclose()
+    await shared_state.aclose()
+    stop_logging()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 security = HTTPBasic()
 
-@app.post("/webhook/transaction")
-async def transaction_webhook(
-    request: Request,
-    credentials: HTTPBasicCredentials = Depends(security)
-):
+def check_credentials(credentials: HTTPBasicCredentials):
     if not verify_credentials(credentials):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Basic"},
         )
+
+@app.post("/webhook/transaction")
+async def transaction_webhook(
+    request: Request,
+    credentials: HTTPBasicCredentials = Depends(security)
+):
+    check_credentials(credentials)
     
+    #raw bytes are validated straight into the model, no intermediate dict
+    with time_stage("parse"):
+        body = await read_body(request, settings.max_body_bytes)
     try:
-        data = await request.json()
-        transaction = Transaction(**data)
+        with time_stage("validate"):
+            transaction = Transaction.model_validate_json(body)
     except ValidationError as e:
+        if any(error["type"] == "json_invalid" for error in e.errors()):
+            logger.warning(f"Error parsing request: {e}")
+            raise HTTPException(status_code=400, detail="Invalid request format")
         raise HTTPException(status_code=400, detail=e.errors())
-    except Exception as e:
-        print(f"Error parsing request: {e}")
-        raise HTTPException(status_code=400, detail="Invalid request format")
 
-    #Analyze risk using selected LLM
-    try:
-        analysis: RiskAnalysis = await analyze_transaction(transaction, settings.llm_provider)
-    except Exception as e:
-        print(f"LLM analysis failed: {e}")
-        raise HTTPException(status_code=500, detail="LLM analysis failed: " + str(e))
-    
-    #Nofifies admin api if theres a high risk score
-    if analysis.risk_score >= 0.7:
+    #async mode: answer 202 with a job id now, the analysis runs on the worker pool
+    if wants_async(request):
+        if not worker_pool.running:
+            raise HTTPException(status_code=503, detail="Async mode is not available")
+        callback_url = request.headers.get("x-callback-url") or request.query_params.get("callback_url")
+        if callback_url and not callback_allowed(callback_url):
+            raise HTTPException(status_code=400, detail="Callback URL not allowed")
+        try:
+            job = worker_pool.submit(transaction, callback_url)
+        except JobStoreFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": job["job_id"], "transaction_id": transaction.transaction_id, "status": job["status"]},
+            headers={"Location": f"/analysis/{transaction.transaction_id}"},
+        )
+
+    analysis = await process_transaction(transaction)
+
+    return ModelJSONResponse(analysis)
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """
+    The request body, refused with 413 before it is parsed (and, with a Content-Length, before it is read) when over limit bytes.
+    """
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail=f"Request body too large (max {limit} bytes)")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Request body too large (max {limit} bytes)")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+async def process_transaction(transaction: Transaction) -> RiskAnalysis:
+    #a retried transaction_id shares the in-flight analysis or gets the stored one, so the LLM and the admin API are called once
+    return await idempotency_store.run(transaction, analyze_and_notify)
+
+async def analyze_and_notify(transaction: Transaction) -> RiskAnalysis:
+    #every log line of the analysis and the notification carries the transaction_id
+    with log_context(transaction.transaction_id):
+        #Analyze risk using selected LLM
         try:
-            await notify_api(transaction, analysis)
+            analysis: RiskAnalysis = await risk_analyzer.analyze_transaction(transaction, settings.llm_provider)
         except Exception as e:
-            print(f"Error notifying admin API: {e}")
-            raise HTTPException(status_code=500, detail="Notification failed: " + str(e))
+            logger.error(f"LLM analysis failed: {e}")
+            raise HTTPException(status_code=500, detail="LLM analysis failed: " + str(e))
+    
+        #Nofifies admin api if theres a high risk score
+        #(queued for the background outbox worker when it is running, so the response does not wait for the admin API)
+        if analysis.risk_score >= 0.7 and notification_outbox.running:
+            notification_outbox.enqueue(api_notifier.build_notification(transaction, analysis))
+        elif analysis.risk_score >= 0.7:
+            try:
+                await api_notifier.notify_api(transaction, analysis)
+            except Exception as e:
+                logger.error(f"Error notifying admin API: {e}")
+                raise HTTPException(status_code=500, detail="Notification failed: " + str(e))
+
+        #add email notification to admin code here
+
+        return analysis
+
+def wants_async(request: Request) -> bool:
+    mode = request.query_params.get("mode")
+    if mode is not None:
+        return mode.lower() == "async"
+    if "respond-async" in request.headers.get("prefer", "").lower():
+        return True
+    return settings.async_mode_default
+
+def callback_allowed(url: str) -> bool:
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    #deny by default: an open callback would let any caller make the service POST to internal hosts
+    return parsed.hostname.lower() in {host.lower() for host in settings.callback_allowed_hosts}
+
+#Status and result of an async analysis job
+@app.get("/analysis/{transaction_id}")
+async def analysis_status(transaction_id: str, credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    job = job_store.get(transaction_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown transaction_id")
+    return public_job(job)
+
+def parse_bulk_body(body: bytes, content_type: str) -> list:
+    """
+    Split a bulk body into raw items. A JSON array must parse as a whole,
+    NDJSON lines are parsed one by one so a bad line only fails that item.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"Invalid JSON line: {e}"))
+            except UnicodeDecodeError as e:
+                items.append(ValueError(f"Invalid UTF-8 line: {e}"))
+        return items
+
+    data = json.loads(body)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of transactions")
+    return data
+
+@app.post("/webhook/transactions")
+async def bulk_transaction_webhook(
+    request: Request,
+    credentials: HTTPBasicCredentials = Depends(security)
+):
+    check_credentials(credentials)
+
+    body = await read_body(request, settings.bulk_max_body_bytes)
+    try:
+        items = parse_bulk_body(body, request.headers.get("content-type", ""))
+    except Exception as e:
+        logger.warning(f"Error parsing bulk request: {e}")
+        raise HTTPException(status_code=400, detail="Invalid request format")
+
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(status_code=413, detail=f"Too many transactions (max {settings.bulk_max_items})")
+
+    #validate every item in one pass, invalid items are reported without failing the batch
+    results = []
+    transactions = []
+    for index, item in enumerate(items):
+        transaction_id = item.get("transaction_id") if isinstance(item, dict) else None
+        result = {"index": index, "transaction_id": transaction_id}
+        if isinstance(item, Exception):
+            result.update(status="error", error=str(item))
+        else:
+            try:
+                transactions.append((result, Transaction.model_validate(item)))
+            except ValidationError as e:
+                result.update(status="error", error=e.errors(include_url=False))
+        results.append(result)
+
+    #fan out the analysis with bounded concurrency
+    semaphore = asyncio.Semaphore(settings.bulk_max_concurrency)
+
+    async def run(result: dict, transaction: Transaction):
+        async with semaphore:
+            try:
+                analysis = await process_transaction(transaction)
+                result.update(status="ok", analysis=analysis.model_dump())
+            except HTTPException as e:
+                result.update(status="error", error=e.detail)
+            except Exception as e:
+                #anything unexpected still only fails this item
+                logger.error(f"Bulk item {transaction.transaction_id} failed: {e}")
+                result.update(status="error", error=f"Analysis failed: {e}")
+
+    await asyncio.gather(*(run(result, transaction) for result, transaction in transactions))
+
+    failed = sum(1 for result in results if result["status"] == "error")
+    return {
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
+
+#Prometheus metrics: request counts, stage latencies, tokens, retries, cache hits and risk scores
+@app.get("/metrics")
+async def metrics(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+#Connection reuse stats for the shared HTTP pools
+@app.get("/stats/connections")
+async def connection_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return http_clients.stats()
+
+#Hit/miss/eviction counters for the analysis cache
+@app.get("/stats/cache")
+async def cache_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return analysis_cache.stats()
+
+#In-flight, stored, coalesced and replayed counts of the webhook idempotency store
+@app.get("/stats/idempotency")
+async def idempotency_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return idempotency_store.stats()
+
+#Batch size and latency metrics of the LLM micro-batchers
+@app.get("/stats/batching")
+async def batching_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return {name: batcher.stats() for name, batcher in risk_analyzer.batchers.items()}
+
+#Queue depth and delivery counters of the notification outbox
+@app.get("/stats/notifications")
+async def notification_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return notification_outbox.stats()
+
+#Worker pool and job store counters of the async webhook mode
+@app.get("/stats/jobs")
+async def job_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return worker_pool.stats()
+
+#Key counts, evictions and memory of the velocity feature store
+@app.get("/stats/features")
+async def feature_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return feature_store.stats()
+
+#Customer EWMA and merchant category amount baselines
+@app.get("/stats/baselines")
+async def baseline_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return baseline_store.stats()
+
+#Range counts and lookup cache of the IP geolocation index
+@app.get("/stats/geoip")
+async def geoip_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return geoip.stats()
+
+#Circuit breaker state, health and failovers per provider
+@app.get("/stats/providers")
+async def provider_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return risk_analyzer.provider_router.stats()
+
+#Queue depth, wait time and concurrency limit of the per-provider rate limiters
+@app.get("/stats/rate-limits")
+async def rate_limit_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return rate_limiters.stats()
+
+#Estimated and provider-reported token usage per provider
+@app.get("/stats/tokens")
+async def token_usage_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return {name: stats.stats() for name, stats in token_stats.items()}
 
-    #add email notification to admin code here
+#Time-to-decision vs total generation time of streamed completions
+@app.get("/stats/streaming")
+async def streaming_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
+    return {name: stats.stats() for name, stats in stream_stats.items()}
 
+#Per-provider latency histograms and hedging counters
+@app.get("/stats/latency")
+async def latency_stats(credentials: HTTPBasicCredentials = Depends(security)):
+    check_credentials(credentials)
     return {
-        "risk_score": analysis.risk_score,
-        "risk_factors": analysis.risk_factors,
-        "reasoning": analysis.reasoning, 
-        "recommended_action": analysis.recommended_action
+        "providers": {name: histogram.stats() for name, histogram in risk_analyzer.latency_histograms.items()},
+        "hedging": dict(risk_analyzer.hedge_stats, delays_ms={
+            name: round(risk_analyzer.hedge_delay(name) * 1000, 2) for name in risk_analyzer.latency_histograms
+        }),
     }
 
 
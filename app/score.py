@@ -0,0 +1,246 @@
+#Offline bulk scoring of historical transactions from an NDJSON file (one transaction per line).
+#Lines are validated and analysed with bounded concurrency, and each result is appended to the output
+#as soon as it is ready (in completion order, keyed by input line number). A checkpoint records how far
+#the input is fully done, so rerunning the same command after a crash continues where it stopped.
+#Backfills only score, they never notify the admin API, and velocity features use the transactions' timestamps.
+#
+#  python -m app.score transactions.ndjson scores.ndjson [--provider groq] [--concurrency 8]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set, TextIO
+from pydantic import ValidationError
+from app.config import settings
+from app.models import Transaction
+from app.business_logic import risk_analyzer
+from app.business_logic.baselines import baseline_store
+from app.business_logic.feature_store import feature_store
+from app.utils.http_clients import http_clients
+from app.utils.log import setup_logging, log_context
+
+
+class Checkpoint:
+    """
+    Every input line before `line` has a result in the output, and so do the lines in `ahead`.
+    `offset` is the input byte offset of `line`, `output_size` the number of output bytes flushed at the time.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.line = 0
+        self.offset = 0
+        self.output_size = 0
+        self.ahead: List[int] = []
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.line, self.offset, self.output_size = data["line"], data["offset"], data["output_size"]
+        self.ahead = data.get("ahead", [])
+        return True
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"line": self.line, "offset": self.offset, "output_size": self.output_size, "ahead": self.ahead}, f)
+        os.replace(tmp, self.path)  # a crash never leaves a half-written checkpoint
+
+    def reset(self):
+        self.line = self.offset = self.output_size = 0
+        self.ahead = []
+
+
+class BulkScorer:
+    """
+    Streams an NDJSON file through Transaction validation and risk_analyzer.analyze_transaction.
+    At most `concurrency` lines are in flight, so memory stays flat whatever the size of the input.
+    """
+    def __init__(self, input_path: str, output_path: str, provider: str = settings.llm_provider,
+                 concurrency: int = settings.bulk_max_concurrency, checkpoint_path: Optional[str] = None,
+                 checkpoint_every: int = 100, progress_interval: float = 5.0, progress: Optional[TextIO] = None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.provider = provider
+        self.concurrency = concurrency
+        self.checkpoint = Checkpoint(checkpoint_path or f"{output_path}.checkpoint")
+        self.checkpoint_every = checkpoint_every
+        self.progress_interval = progress_interval
+        self.progress = progress or sys.stderr
+        self.scored = 0
+        self.failed = 0
+        self.skipped = 0  # lines already scored by an earlier run
+        self._finished: Dict[int, int] = {}  # completed lines past the checkpoint -> input offset after them
+        self._since_checkpoint = 0
+        self._started = 0.0
+
+    def _recover(self) -> Set[int]:
+        """
+        Line numbers already in the output past the checkpoint. A partially written last line is cut off.
+        """
+        done = set()
+        with open(self.output_path, "r+b") as f:
+            f.seek(self.checkpoint.output_size)
+            tail = f.read()
+            complete = tail[:tail.rfind(b"\n") + 1]
+            f.truncate(self.checkpoint.output_size + len(complete))
+        for line in complete.splitlines():
+            try:
+                done.add(json.loads(line)["line"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        return done
+
+    async def run(self) -> dict:
+        done: Set[int] = set()
+        if (self.checkpoint.load() and os.path.exists(self.output_path)
+                and os.path.getsize(self.output_path) >= self.checkpoint.output_size):
+            done = set(self.checkpoint.ahead) | self._recover()
+            mode = "ab"
+            self.progress.write(f"resuming at line {self.checkpoint.line} ({len(done)} later lines already scored)\n")
+        else:
+            self.checkpoint.reset()
+            mode = "wb"
+
+        self._started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pending: Set[asyncio.Task] = set()
+        reporter = asyncio.create_task(self._report())
+        try:
+            with open(self.input_path, "rb") as src, open(self.output_path, mode) as dst:
+                src.seek(self.checkpoint.offset)
+                lineno, offset = self.checkpoint.line, self.checkpoint.offset
+                for raw in src:
+                    offset += len(raw)
+                    if lineno in done or not raw.strip():
+                        self.skipped += lineno in done
+                        self._complete(lineno, offset)
+                    else:
+                        await semaphore.acquire()
+                        task = asyncio.create_task(self._score(dst, semaphore, lineno, offset, raw))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+                    lineno += 1
+                if pending:
+                    await asyncio.gather(*pending)
+                self._save(dst)
+        finally:
+            reporter.cancel()
+        summary = self.summary()
+        self.progress.write(f"done: {self._format(summary)}\n")
+        return summary
+
+    async def _score(self, dst, semaphore: asyncio.Semaphore, lineno: int, end_offset: int, raw: bytes):
+        try:
+            result = {"line": lineno, "transaction_id": None}
+            try:
+                data = json.loads(raw)
+                if isinstance(data, dict):
+                    result["transaction_id"] = data.get("transaction_id")
+                transaction = Transaction.model_validate(data)
+            except json.JSONDecodeError as e:
+                result.update(status="error", error=f"Invalid JSON line: {e}")
+            except UnicodeDecodeError as e:
+                result.update(status="error", error=f"Invalid UTF-8 line: {e}")
+            except ValidationError as e:
+                result.update(status="error", error=e.errors(include_url=False))
+            else:
+                try:
+                    with log_context(transaction.transaction_id):
+                        analysis = await risk_analyzer.analyze_transaction(transaction, self.provider)
+                    result.update(status="ok", analysis=analysis.model_dump())
+                except Exception as e:
+                    result.update(status="error", error=f"LLM analysis failed: {e}")
+            self._write(dst, result, end_offset)
+        finally:
+            semaphore.release()
+
+    def _write(self, dst, result: dict, end_offset: int):
+        #one write call per result on the event loop thread, so lines never interleave
+        dst.write(json.dumps(result, default=str).encode("utf-8") + b"\n")
+        self.scored += 1
+        self.failed += result["status"] == "error"
+        self._complete(result["line"], end_offset)
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._save(dst)
+
+    def _complete(self, lineno: int, end_offset: int):
+        #advance the checkpoint over the contiguous run of completed lines
+        self._finished[lineno] = end_offset
+        while self.checkpoint.line in self._finished:
+            self.checkpoint.offset = self._finished.pop(self.checkpoint.line)
+            self.checkpoint.line += 1
+
+    def _save(self, dst):
+        #the output must be on disk before a checkpoint that points past it
+        dst.flush()
+        os.fsync(dst.fileno())
+        self.checkpoint.output_size = dst.tell()
+        self.checkpoint.ahead = sorted(self._finished)
+        self.checkpoint.save()
+        self._since_checkpoint = 0
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.progress.write(f"{self._format(self.summary())}\n")
+            self.progress.flush()
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "scored": self.scored,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "checkpoint_line": self.checkpoint.line,
+            "elapsed_s": round(elapsed, 2),
+            "per_second": round(self.scored / elapsed, 2) if elapsed else 0.0,
+        }
+
+    @staticmethod
+    def _format(summary: dict) -> str:
+        return (f"{summary['scored']} scored ({summary['failed']} failed, {summary['skipped']} skipped) "
+                f"in {summary['elapsed_s']}s, {summary['per_second']}/s, checkpoint at line {summary['checkpoint_line']}")
+
+
+async def score_file(scorer: BulkScorer) -> dict:
+    #same setup as the app lifespan: shared connection pools and the persisted baselines
+    risk_analyzer.llm_provider.bind_clients(http_clients)
+    #velocity windows follow the historical timestamps, not the seconds the backfill takes to read them
+    feature_store.event_time = True
+    await baseline_store.start()
+    try:
+        return await scorer.run()
+    finally:
+        feature_store.event_time = False
+        await baseline_store.stop()
+        await http_clients.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.score", description="Score an NDJSON file of transactions.")
+    parser.add_argument("input", help="NDJSON file, one transaction per line")
+    parser.add_argument("output", help="NDJSON results file, one line per input line")
+    parser.add_argument("--provider", default=settings.llm_provider, choices=list(risk_analyzer.llm_provider))
+    parser.add_argument("--concurrency", type=int, default=settings.bulk_max_concurrency)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="results between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between throughput reports")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    scorer = BulkScorer(args.input, args.output, args.provider, max(args.concurrency, 1), args.checkpoint,
+                        max(args.checkpoint_every, 1), args.progress_interval)
+    if args.restart and os.path.exists(scorer.checkpoint.path):
+        os.remove(scorer.checkpoint.path)
+    asyncio.run(score_file(scorer))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import pytest
+from app.business_logic.analysis_cache import analysis_cache
+from app.business_logic import risk_analyzer
+from app.llm.rate_limiter import rate_limiters
+from app.business_logic.idempotency import idempotency_store
+from app.business_logic.jobs import job_store
+from app.business_logic.feature_store import feature_store
+from app.business_logic.baselines import baseline_store
+from app.utils.metrics import registry
+
+#Shared in-process state must not leak between tests
+@pytest.fixture(autouse=True)
+def reset_shared_state():
+    analysis_cache.clear()
+    risk_analyzer.provider_router.reset()
+    rate_limiters.reset()
+    job_store.clear()
+    idempotency_store.clear()
+    feature_store.clear()
+    baseline_store.clear()
+    registry.clear()
+    yield
+    analysis_cache.clear()
+    risk_analyzer.provider_router.reset()
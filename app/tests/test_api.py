@@ -145,5 +145,43 @@ class TestAPIEndpoints:
             assert isinstance(data["reasoning"], str)
             assert isinstance(data["recommended_action"], str)
 
+    def test_oversized_body_is_rejected(self):
+        """Test that bodies over max_body_bytes get 413 without being parsed"""
+        with patch.object(settings, "max_body_bytes", 256), \
+             patch("app.main.Transaction.model_validate_json") as mock_validate:
+            response = client.post(
+                "/webhook/transaction",
+                headers=get_auth_header(),
+                json={**VALID_TRANSACTION, "padding": "x" * 512}
+            )
+
+            assert response.status_code == 413
+            mock_validate.assert_not_called()
+
+    def test_non_object_json(self):
+        """Test that valid JSON which is not a transaction object is a validation error"""
+        response = client.post(
+            "/webhook/transaction",
+            headers=get_auth_header(),
+            content="[1, 2, 3]"
+        )
+
+        assert response.status_code == 400
+        assert response.json()["detail"][0]["type"] == "model_type"
+
+    def test_response_is_serialized_analysis(self):
+        """Test that the response body is the analysis model serialized as JSON"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = RiskAnalysis(**SAMPLE_RISK_ANALYSIS)
+
+            response = client.post(
+                "/webhook/transaction",
+                headers=get_auth_header(),
+                json=VALID_TRANSACTION
+            )
+
+            assert response.headers["content-type"] == "application/json"
+            assert response.json() == SAMPLE_RISK_ANALYSIS
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,170 @@
+"""
+Tests for the "accept now, decide later" webhook mode (app/business_logic/jobs.py and GET /analysis/{transaction_id}).
+"""
+import pytest
+import time
+import httpx
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from base64 import b64encode
+
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.business_logic.jobs import JobStore, JobStoreFull, AnalysisWorkerPool, DONE, FAILED
+from app.main import app
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+def make_transaction(transaction_id="tx_async_01"):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": "2025-05-07T14:30:45Z",
+        "amount": 129.99,
+        "currency": "USD",
+        "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+    }
+
+SAMPLE_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.2,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Minor geographic mismatch",
+    recommended_action="allow"
+)
+
+def wait_for_job(client, transaction_id, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/analysis/{transaction_id}", headers=get_auth_header()).json()
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+class TestJobStore:
+    def test_evicts_oldest_finished_job(self):
+        """Test that the store stays bounded by evicting finished jobs first"""
+        store = JobStore(max_jobs=2)
+        store.create("tx_1", None)["status"] = DONE
+        store.create("tx_2", None)
+        store.create("tx_3", None)
+
+        assert store.get("tx_1") is None
+        assert store.get("tx_2") is not None and store.get("tx_3") is not None
+        assert store.evicted == 1
+
+    def test_rerun_replaces_its_own_job(self):
+        """Test that recreating a transaction's job does not evict another one"""
+        store = JobStore(max_jobs=2)
+        store.create("tx_1", None)["status"] = DONE
+        store.create("tx_2", None)["status"] = DONE
+        store.create("tx_1", None)
+
+        assert store.get("tx_2") is not None
+        assert store.get("tx_1")["status"] != DONE
+        assert store.evicted == 0
+
+    def test_refuses_when_only_pending_jobs(self):
+        """Test that pending jobs are never evicted"""
+        store = JobStore(max_jobs=1)
+        store.create("tx_1", None)
+        with pytest.raises(JobStoreFull):
+            store.create("tx_2", None)
+
+
+class TestAsyncWebhook:
+    def test_accepts_and_exposes_result(self):
+        """Test 202 + job id, then the result through GET /analysis/{transaction_id}"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+            with TestClient(app) as client:
+                response = client.post("/webhook/transaction?mode=async", headers=get_auth_header(), json=make_transaction())
+                assert response.status_code == 202
+                assert response.json()["job_id"]
+                assert response.headers["location"] == "/analysis/tx_async_01"
+
+                job = wait_for_job(client, "tx_async_01")
+
+        assert job["status"] == DONE
+        assert job["result"]["risk_score"] == 0.2
+
+    def test_prefer_header_and_failed_job(self):
+        """Test the Prefer: respond-async opt-in and that failures are reported on the job"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.side_effect = Exception("provider unavailable")
+            with TestClient(app) as client:
+                response = client.post(
+                    "/webhook/transaction",
+                    headers={**get_auth_header(), "Prefer": "respond-async"},
+                    json=make_transaction("tx_async_fail")
+                )
+                assert response.status_code == 202
+                job = wait_for_job(client, "tx_async_fail")
+
+        assert job["status"] == FAILED
+        assert "provider unavailable" in job["error"]
+
+    def test_unknown_transaction(self):
+        """Test 404 for a transaction that was never submitted"""
+        with TestClient(app) as client:
+            response = client.get("/analysis/tx_unknown", headers=get_auth_header())
+        assert response.status_code == 404
+
+    def test_sync_mode_is_still_default(self):
+        """Test that requests without the opt-in still get the analysis inline"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+            with TestClient(app) as client:
+                response = client.post("/webhook/transaction", headers=get_auth_header(), json=make_transaction())
+        assert response.status_code == 200
+        assert response.json()["risk_score"] == 0.2
+
+    def test_disallowed_callback_host(self):
+        """Test that callbacks are limited to callback_allowed_hosts when configured"""
+        with patch.object(settings, "callback_allowed_hosts", ["hooks.example.com"]), TestClient(app) as client:
+            response = client.post(
+                "/webhook/transaction?mode=async&callback_url=http://169.254.169.254/latest",
+                headers=get_auth_header(),
+                json=make_transaction()
+            )
+        assert response.status_code == 400
+
+    def test_callbacks_are_refused_without_allowlist(self):
+        """Test that no callback host is accepted until callback_allowed_hosts is configured"""
+        with patch.object(settings, "callback_allowed_hosts", []), TestClient(app) as client:
+            for url in ("http://127.0.0.1:8080/admin", "https://hooks.example.com/risk"):
+                response = client.post(f"/webhook/transaction?mode=async&callback_url={url}",
+                                       headers=get_auth_header(), json=make_transaction())
+                assert response.status_code == 400
+
+
+class TestCallbacks:
+    @pytest.mark.asyncio
+    async def test_result_is_posted_to_callback(self):
+        """Test that the finished job is pushed to the callback URL"""
+        received = []
+
+        def handler(request: httpx.Request):
+            received.append(request)
+            return httpx.Response(200)
+
+        pool = AnalysisWorkerPool(JobStore(), workers=1)
+        callback_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch("app.business_logic.jobs.http_clients.get", return_value=callback_client):
+            await pool.start(AsyncMock(return_value=SAMPLE_RISK_ANALYSIS))
+            pool.submit(Transaction(**make_transaction()), "https://hooks.example.com/risk")
+            await pool.stop()
+        await callback_client.aclose()
+
+        assert len(received) == 1
+        assert str(received[0].url) == "https://hooks.example.com/risk"
+        assert b'"status":"done"' in received[0].content
+        assert pool.store.get("tx_async_01")["callback_status"] == 200
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,173 @@
+"""
+Unit tests for the amount baselines (app/business_logic/baselines.py) and their use in the rules, prompt and analyzer.
+"""
+import asyncio
+import pytest
+import random
+from unittest.mock import patch, AsyncMock
+
+from app.config import Settings
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.llm.prompts import encode_baseline
+from app.business_logic.baselines import EWMATable, QuantileSketch, BaselineStore, baseline_store
+from app.business_logic.rules import rule_engine
+from app.business_logic.risk_analyzer import analyze_transaction
+
+def make_transaction(amount=49.99, customer_id="cust_98765zyxwv", category="electronics", card_country="US"):
+    return Transaction(
+        transaction_id="tx_baseline_01",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency="USD",
+        customer={"id": customer_id, "country": "US", "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": card_country},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": category},
+    )
+
+
+class TestEWMA:
+    def test_mean_and_variance_follow_the_stream(self):
+        """Test that the EWMA converges to the recent level and spread"""
+        table = EWMATable(alpha=0.1, max_keys=10)
+        rng = random.Random(1)
+        for _ in range(500):
+            table.update("k", rng.gauss(100.0, 10.0))
+        mean, var, count = table.get("k")
+        assert count == 500
+        assert mean == pytest.approx(100.0, abs=5.0)
+        assert var ** 0.5 == pytest.approx(10.0, abs=4.0)
+
+    def test_bounded_keys(self):
+        """Test LRU eviction and slot reuse"""
+        table = EWMATable(alpha=0.1, max_keys=2)
+        for key in ("a", "b", "a", "c"):
+            table.update(key, 1.0)
+        assert table.get("b") is None
+        assert table.get("a")[2] == 2 and table.get("c")[2] == 1
+        assert len(table.mean) == 2
+
+
+class TestQuantileSketch:
+    def test_quantiles_within_relative_accuracy(self):
+        """Test quantile and rank estimates on a known distribution"""
+        sketch = QuantileSketch(accuracy=0.02)
+        for value in range(1, 10001):
+            sketch.add(float(value))
+        for q in (0.5, 0.9, 0.99):
+            assert sketch.quantile(q) == pytest.approx(q * 10000, rel=0.03)
+        assert sketch.rank(5000.0) == pytest.approx(0.5, abs=0.02)
+        assert sketch.rank(0.0) == 0.0
+
+    def test_merge(self):
+        """Test that merged sketches equal one sketch over both streams"""
+        a, b, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1, 1000):
+            (a if value % 2 else b).add(float(value))
+            both.add(float(value))
+        a.merge(b)
+        assert a.count == both.count
+        assert list(a.counts) == list(both.counts)
+        with pytest.raises(ValueError):
+            a.merge(QuantileSketch(accuracy=0.05))
+
+
+class TestBaselineStore:
+    def test_features_need_history(self):
+        """Test that z-score and percentile are only reported after baseline_min_samples"""
+        store = BaselineStore(Settings(baseline_min_samples=5))
+        for _ in range(4):
+            store.observe(make_transaction(amount=50.0))
+        assert store.features(make_transaction())["amount_z"] is None
+        store.observe(make_transaction(amount=50.0))
+
+        features = store.features(make_transaction(amount=500.0))
+        assert features["amount_z"] > 3
+        assert features["category_percentile"] == 100.0
+        assert store.features(make_transaction(amount=500.0, category="grocery"))["category_percentile"] is None
+
+    def test_snapshot_round_trip(self, tmp_path):
+        """Test that a snapshot restores customers and sketches"""
+        path = str(tmp_path / "baselines.json")
+        store = BaselineStore()
+        for amount in (10.0, 20.0, 30.0, 40.0, 50.0):
+            store.observe(make_transaction(amount=amount))
+        store.snapshot(path)
+
+        restored = BaselineStore()
+        assert restored.load(path)
+        assert restored.customers.get("cust_98765zyxwv") == store.customers.get("cust_98765zyxwv")
+        assert restored.features(make_transaction(amount=45.0)) == store.features(make_transaction(amount=45.0))
+
+    @pytest.mark.asyncio
+    async def test_snapshot_on_stop(self, tmp_path):
+        """Test that the store loads on start and writes a final snapshot on stop"""
+        path = str(tmp_path / "baselines.json")
+        store = BaselineStore(Settings(baseline_snapshot_path=path, baseline_snapshot_interval=60))
+        await store.start()
+        store.observe(make_transaction())
+        await store.stop()
+
+        restored = BaselineStore(Settings(baseline_snapshot_path=path))
+        await restored.start()
+        assert restored.customers.get("cust_98765zyxwv") is not None
+        await restored.stop()
+
+    @pytest.mark.asyncio
+    async def test_periodic_snapshot_survives_errors(self, tmp_path):
+        """Test that a failed snapshot is logged and the periodic task keeps running"""
+        path = str(tmp_path / "baselines.json")
+        store = BaselineStore(Settings(baseline_snapshot_path=path, baseline_snapshot_interval=0.01))
+        store.observe(make_transaction())
+        real_dump = store.dump
+        failures = [RuntimeError("OrderedDict mutated during iteration")]
+
+        def dump():
+            if failures:
+                raise failures.pop()
+            return real_dump()
+
+        with patch.object(store, "dump", side_effect=dump):
+            await store.start()
+            await asyncio.sleep(0.1)
+            assert not store._task.done()
+            assert store.snapshots >= 1
+        await store.stop()
+
+    def test_corrupt_snapshot(self, tmp_path):
+        """Test that an unreadable snapshot starts empty instead of failing"""
+        path = tmp_path / "baselines.json"
+        path.write_text("{not json")
+        assert BaselineStore().load(str(path)) is False
+
+
+class TestBaselineUse:
+    def test_amount_anomaly_rule_and_prompt(self):
+        """Test that an outlier amount fires the rule and is encoded in the prompt row"""
+        for _ in range(5):
+            baseline_store.observe(make_transaction(amount=50.0))
+
+        score, factors = rule_engine.evaluate(make_transaction(amount=900.0))
+        assert any("significantly higher than customer average" in factor for factor in factors)
+        assert encode_baseline(make_transaction(amount=900.0)) == "170.0,100"
+        assert encode_baseline(make_transaction(amount=50.0, customer_id="cust_new")) == "-,50"
+
+    @pytest.mark.asyncio
+    async def test_analyzer_learns_after_scoring(self):
+        """Test that the transaction is added to the baselines only after its verdict"""
+        seen = []
+
+        async def analyze(transaction):
+            seen.append(baseline_store.observed)
+            return RiskAnalysis(risk_score=0.4, risk_factors=[], reasoning="ok", recommended_action="review")
+
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.side_effect = analyze
+            await analyze_transaction(make_transaction(amount=600.0, card_country="CA"), "openai")
+
+        assert seen == [0]
+        assert baseline_store.observed == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,136 @@
+"""
+Unit tests for the LLM micro-batcher (app/llm/batcher.py) and the batched prompt/reply handling in app/llm/base.py.
+"""
+import pytest
+import json
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.llm.groq_llm import GroqLLM
+from app.llm.batcher import MicroBatcher
+
+def make_transaction(transaction_id):
+    return Transaction(
+        transaction_id=transaction_id,
+        timestamp="2025-05-07T14:30:45Z",
+        amount=129.99,
+        currency="USD",
+        customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+def make_item(transaction_id, score=0.4):
+    return {
+        "transaction_id": transaction_id,
+        "risk_score": score,
+        "risk_factors": ["Cross-border transaction"],
+        "reasoning": "Geographic mismatch",
+        "recommended_action": "review"
+    }
+
+SINGLE_ANALYSIS = RiskAnalysis(risk_score=0.1, risk_factors=[], reasoning="single", recommended_action="allow")
+
+
+class TestBatchPrompt:
+    def test_batch_prompt_contains_all_transactions(self):
+        """Test that the batch prompt includes every transaction and asks for an array"""
+        prompt = OpenAILLM()._build_batch_prompt([make_transaction("tx_1"), make_transaction("tx_2")])
+        assert "tx_1" in prompt and "tx_2" in prompt
+        assert "JSON array" in prompt
+        assert "transaction_id" in prompt
+
+    def test_parse_batch_reply(self):
+        """Test that a batch reply is keyed by transaction_id, even after <think> text"""
+        content = "<think>two items [reasoning]</think>" + json.dumps([make_item("tx_1"), make_item("tx_2", 0.8)])
+        results = GroqLLM()._parse_batch(content)
+        assert set(results) == {"tx_1", "tx_2"}
+        assert results["tx_2"].risk_score == 0.8
+
+    def test_parse_batch_rejects_malformed_reply(self):
+        """Test that a malformed reply raises ValueError"""
+        with pytest.raises(ValueError):
+            OpenAILLM()._parse_batch('[{"transaction_id": "tx_1", "risk_score": "high"}]')
+        with pytest.raises(ValueError):
+            OpenAILLM()._parse_batch("no array here")
+
+
+class TestMicroBatcher:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_prompt(self):
+        """Test that concurrent calls are packed into one batch and demultiplexed"""
+        llm = OpenAILLM()
+        batcher = MicroBatcher(llm, max_batch_size=3, max_wait=1.0)
+        reply = json.dumps([make_item("tx_3", 0.3), make_item("tx_1", 0.1), make_item("tx_2", 0.2)])
+
+        with patch.object(OpenAILLM, "_complete", new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = reply
+            results = await asyncio.gather(*(batcher.analyze_transaction(make_transaction(f"tx_{i}")) for i in (1, 2, 3)))
+
+        assert mock_complete.call_count == 1
+        assert [r.risk_score for r in results] == [0.1, 0.2, 0.3]
+        assert batcher.stats()["batch_sizes"] == {3: 1}
+
+    @pytest.mark.asyncio
+    async def test_time_window_flushes_partial_batch(self):
+        """Test that a partial batch is sent once the wait window expires"""
+        batcher = MicroBatcher(OpenAILLM(), max_batch_size=10, max_wait=0.01)
+        reply = json.dumps([make_item("tx_1"), make_item("tx_2")])
+
+        with patch.object(OpenAILLM, "_complete", new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = reply
+            results = await asyncio.gather(batcher.analyze_transaction(make_transaction("tx_1")),
+                                           batcher.analyze_transaction(make_transaction("tx_2")))
+
+        assert len(results) == 2
+        assert batcher.stats()["batches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_malformed_batch_falls_back_to_single_calls(self):
+        """Test that every item is retried on its own when the batch reply is unusable"""
+        batcher = MicroBatcher(OpenAILLM(), max_batch_size=2, max_wait=1.0)
+
+        with patch.object(OpenAILLM, "_complete", new_callable=AsyncMock) as mock_complete, \
+             patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_complete.return_value = "Sorry, I cannot help with that."
+            mock_analyze.return_value = SINGLE_ANALYSIS
+            results = await asyncio.gather(batcher.analyze_transaction(make_transaction("tx_1")),
+                                           batcher.analyze_transaction(make_transaction("tx_2")))
+
+        assert mock_analyze.call_count == 2
+        assert all(r.reasoning == "single" for r in results)
+        assert batcher.stats()["fallback_items"] == 2
+
+    @pytest.mark.asyncio
+    async def test_missing_items_fall_back(self):
+        """Test that only the items missing from the reply are retried"""
+        batcher = MicroBatcher(OpenAILLM(), max_batch_size=2, max_wait=1.0)
+
+        with patch.object(OpenAILLM, "_complete", new_callable=AsyncMock) as mock_complete, \
+             patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_complete.return_value = json.dumps([make_item("tx_1", 0.4)])
+            mock_analyze.return_value = SINGLE_ANALYSIS
+            first, second = await asyncio.gather(batcher.analyze_transaction(make_transaction("tx_1")),
+                                                 batcher.analyze_transaction(make_transaction("tx_2")))
+
+        assert first.risk_score == 0.4
+        assert second.reasoning == "single"
+        assert mock_analyze.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_the_caller(self):
+        """Test that a failing per-item call raises in the waiting caller"""
+        batcher = MicroBatcher(OpenAILLM(), max_batch_size=1, max_wait=1.0)
+
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.side_effect = Exception("provider unavailable")
+            with pytest.raises(Exception) as excinfo:
+                await batcher.analyze_transaction(make_transaction("tx_1"))
+
+        assert "provider unavailable" in str(excinfo.value)
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,155 @@
+"""
+Tests for the bulk webhook endpoint (POST /webhook/transactions).
+"""
+import pytest
+import json
+import asyncio
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from base64 import b64encode
+
+from app.config import settings
+from app.models import RiskAnalysis
+from app.main import app
+
+client = TestClient(app)
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+def make_transaction(transaction_id):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": "2025-05-07T14:30:45Z",
+        "amount": 129.99,
+        "currency": "USD",
+        "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+    }
+
+SAMPLE_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.2,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Minor geographic mismatch",
+    recommended_action="allow"
+)
+
+
+class TestBulkWebhook:
+    def test_requires_auth(self):
+        """Test that the bulk endpoint uses the same basic auth"""
+        response = client.post("/webhook/transactions", json=[])
+        assert response.status_code == 401
+
+    def test_json_array(self):
+        """Test that every item of a JSON array is analysed"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+            response = client.post(
+                "/webhook/transactions",
+                headers=get_auth_header(),
+                json=[make_transaction("tx_1"), make_transaction("tx_2"), make_transaction("tx_3")]
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3 and data["succeeded"] == 3 and data["failed"] == 0
+        assert [r["transaction_id"] for r in data["results"]] == ["tx_1", "tx_2", "tx_3"]
+        assert data["results"][0]["analysis"]["risk_score"] == 0.2
+        assert mock_analyze.call_count == 3
+
+    def test_ndjson_with_partial_failures(self):
+        """Test that invalid lines and failed analyses only fail their own item"""
+        async def analyze(transaction, llm_name):
+            if transaction.transaction_id == "tx_fail":
+                raise Exception("provider unavailable")
+            return SAMPLE_RISK_ANALYSIS
+
+        body = "\n".join([
+            json.dumps(make_transaction("tx_ok")),
+            "{bad json",
+            json.dumps({"transaction_id": "tx_incomplete"}),
+            json.dumps(make_transaction("tx_fail")),
+        ])
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", side_effect=analyze):
+            response = client.post(
+                "/webhook/transactions",
+                headers={**get_auth_header(), "Content-Type": "application/x-ndjson"},
+                content=body
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 4 and data["succeeded"] == 1 and data["failed"] == 3
+        statuses = {r["index"]: r["status"] for r in data["results"]}
+        assert statuses == {0: "ok", 1: "error", 2: "error", 3: "error"}
+        assert data["results"][2]["transaction_id"] == "tx_incomplete"
+        assert "LLM analysis failed" in data["results"][3]["error"]
+
+    def test_undecodable_line_and_unexpected_error_fail_one_item(self):
+        """Test that bad UTF-8 and errors other than HTTPException are reported per line"""
+        async def process(transaction):
+            if transaction.transaction_id == "tx_boom":
+                raise RuntimeError("unexpected")
+            return SAMPLE_RISK_ANALYSIS
+
+        body = b"\n".join([
+            json.dumps(make_transaction("tx_ok")).encode(),
+            b'{"transaction_id": "\xff\xfe"}',
+            json.dumps(make_transaction("tx_boom")).encode(),
+        ])
+        with patch("app.main.analyze_and_notify", side_effect=process):
+            response = client.post(
+                "/webhook/transactions",
+                headers={**get_auth_header(), "Content-Type": "application/x-ndjson"},
+                content=body
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["status"] for r in data["results"]] == ["ok", "error", "error"]
+        assert "UTF-8" in data["results"][1]["error"]
+        assert "unexpected" in data["results"][2]["error"]
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than bulk_max_concurrency analyses run at once"""
+        running = 0
+        peak = 0
+
+        async def analyze(transaction, llm_name):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return SAMPLE_RISK_ANALYSIS
+
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", side_effect=analyze), \
+             patch.object(settings, "bulk_max_concurrency", 2):
+            response = client.post(
+                "/webhook/transactions",
+                headers=get_auth_header(),
+                json=[make_transaction(f"tx_{i}") for i in range(6)]
+            )
+
+        assert response.json()["succeeded"] == 6
+        assert peak == 2
+
+    def test_rejects_non_array_and_oversized_batches(self):
+        """Test request level errors"""
+        response = client.post("/webhook/transactions", headers=get_auth_header(), json=make_transaction("tx_1"))
+        assert response.status_code == 400
+
+        with patch.object(settings, "bulk_max_items", 2):
+            response = client.post(
+                "/webhook/transactions",
+                headers=get_auth_header(),
+                json=[make_transaction(f"tx_{i}") for i in range(3)]
+            )
+        assert response.status_code == 413
+
+
+if __name__ == "__main__":
+    pytest.main()
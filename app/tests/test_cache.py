@@ -0,0 +1,126 @@
+"""
+Unit tests for the two-tier analysis cache (app/business_logic/analysis_cache.py).
+"""
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.business_logic.analysis_cache import AnalysisCache, DiskTier, make_key_builder, analysis_cache
+from app.business_logic.risk_analyzer import analyze_transaction
+
+KEY_FIELDS = ["customer.id", "payment_method.last_four", "merchant.id", "amount"]
+
+ANALYSIS = RiskAnalysis(
+    risk_score=0.5,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Geographic mismatch",
+    recommended_action="review"
+)
+
+def make_transaction(transaction_id="tx_cache_01", amount=129.99, customer_id="cust_98765zyxwv", ip_address="192.168.1.1"):
+    return Transaction(
+        transaction_id=transaction_id,
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency="USD",
+        customer={"id": customer_id, "country": "US", "ip_address": ip_address},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+def make_cache(ttl=60.0, max_entries=100, disk=None):
+    return AnalysisCache(ttl=ttl, max_entries=max_entries, key_builder=make_key_builder(KEY_FIELDS, 10.0), disk=disk)
+
+
+class TestCacheKey:
+    def test_amount_bucket_and_transaction_id_are_normalized(self):
+        """Test that near-identical transactions share a key"""
+        build = make_key_builder(KEY_FIELDS, 10.0)
+        assert build(make_transaction("tx_a", 121.0), "openai") == build(make_transaction("tx_b", 129.99), "openai")
+        assert build(make_transaction(amount=121.0), "openai") != build(make_transaction(amount=131.0), "openai")
+
+    def test_provider_is_part_of_the_key(self):
+        """Test that verdicts from different providers are cached separately"""
+        build = make_key_builder(KEY_FIELDS, 10.0)
+        assert build(make_transaction(), "openai") != build(make_transaction(), "groq")
+
+
+class TestAnalysisCache:
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_counters(self):
+        """Test hit/miss counting"""
+        cache = make_cache()
+        assert await cache.get(make_transaction(), "openai") is None
+        await cache.set(make_transaction(), "openai", ANALYSIS)
+        result = await cache.get(make_transaction("tx_retry"), "openai")
+
+        assert result == ANALYSIS
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full"""
+        cache = make_cache(max_entries=2)
+        await cache.set(make_transaction(customer_id="a"), "openai", ANALYSIS)
+        await cache.set(make_transaction(customer_id="b"), "openai", ANALYSIS)
+        await cache.get(make_transaction(customer_id="a"), "openai")
+        await cache.set(make_transaction(customer_id="c"), "openai", ANALYSIS)
+
+        assert cache.stats()["evictions"] == 1
+        assert await cache.get(make_transaction(customer_id="a"), "openai") is not None
+        assert await cache.get(make_transaction(customer_id="b"), "openai") is None
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        """Test that expired entries are not returned"""
+        cache = make_cache(ttl=10.0)
+        with patch("app.business_logic.analysis_cache.time.time", return_value=1000.0):
+            await cache.set(make_transaction(), "openai", ANALYSIS)
+        with patch("app.business_logic.analysis_cache.time.time", return_value=1011.0):
+            assert await cache.get(make_transaction(), "openai") is None
+        assert cache.stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_restart(self, tmp_path):
+        """Test that a new cache instance finds entries written by a previous one"""
+        path = str(tmp_path / "cache.sqlite3")
+        first = make_cache(disk=DiskTier(path))
+        await first.set(make_transaction(), "openai", ANALYSIS)
+        first.disk.close()
+
+        second = make_cache(disk=DiskTier(path))
+        result = await second.get(make_transaction(), "openai")
+        assert result == ANALYSIS
+        assert second.stats()["disk_hits"] == 1
+        second.disk.close()
+
+
+class TestCacheStage:
+    @pytest.mark.asyncio
+    async def test_repeat_does_not_call_llm_again(self):
+        """Test that a retried webhook is answered from the cache"""
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = ANALYSIS
+            await analyze_transaction(make_transaction(), "openai")
+            result = await analyze_transaction(make_transaction("tx_cache_retry"), "openai")
+
+            assert mock_analyze.call_count == 1
+            assert result.risk_score == 0.5
+            assert analysis_cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_same_customer_from_another_ip_is_analyzed(self):
+        """Test that a verdict is not replayed for the same customer and amount coming from another IP"""
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = ANALYSIS
+            await analyze_transaction(make_transaction(ip_address="8.8.8.8"), "openai")
+            await analyze_transaction(make_transaction("tx_cache_ru", ip_address="77.88.55.60"), "openai")
+
+            assert mock_analyze.call_count == 2
+            assert analysis_cache.stats()["hits"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,131 @@
+"""
+Unit tests for the velocity feature store (app/business_logic/feature_store.py) and its use in the rules, prompt and analyzer.
+"""
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.llm.prompts import encode_transaction
+from app.business_logic.feature_store import FeatureStore, VelocityTable, feature_store
+from app.business_logic.rules import rule_engine
+from app.business_logic.risk_analyzer import analyze_transaction
+
+def make_transaction(amount=49.99, customer_id="cust_98765zyxwv", last_four="4242", ip="192.168.1.1", card_country="US"):
+    return Transaction(
+        transaction_id="tx_features_01",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency="USD",
+        customer={"id": customer_id, "country": "US", "ip_address": ip},
+        payment_method={"type": "credit_card", "last_four": last_four, "country_of_issue": card_country},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+
+class TestVelocityTable:
+    def test_windows_slide(self):
+        """Test counts and sums per window as time moves on"""
+        table = VelocityTable(max_keys=10)
+        for now, amount in ((0, 10.0), (30, 20.0), (70, 5.0)):
+            table.add("k", amount, now)
+
+        velocity = table.get("k", 70)
+        assert velocity["1m"] == (2, 25.0)
+        assert velocity["1h"] == (3, 35.0)
+        assert velocity["24h"] == (3, 35.0)
+
+        velocity = table.get("k", 3 * 3600)
+        assert velocity["1m"] == (0, 0.0) and velocity["1h"] == (0, 0.0)
+        assert velocity["24h"] == (3, 35.0)
+        assert table.get("k", 26 * 3600)["24h"] == (0, 0.0)
+
+    def test_unknown_key(self):
+        """Test that unseen keys read as zero"""
+        assert VelocityTable(max_keys=10).get("missing", 0)["24h"] == (0, 0.0)
+
+    def test_memory_bound_evicts_least_recently_used(self):
+        """Test that the table never grows past max_keys and reuses evicted slots"""
+        table = VelocityTable(max_keys=2)
+        table.add("a", 1.0, 0)
+        table.add("b", 1.0, 1)
+        table.add("a", 1.0, 2)
+        table.add("c", 1.0, 3)
+
+        assert set(table.slots) == {"a", "c"}
+        assert table.evicted == 1
+        assert len(table.last_seen) == 2
+        assert table.get("c", 3)["1m"] == (1, 1.0)
+
+    def test_idle_keys_expire(self):
+        """Test that keys idle for longer than idle_seconds are dropped when new keys arrive"""
+        table = VelocityTable(max_keys=10, idle_seconds=100)
+        table.add("old", 1.0, 0)
+        table.add("new", 1.0, 500)
+        assert set(table.slots) == {"new"}
+        assert table.expired == 1
+
+
+class TestFeatureStore:
+    def test_tracks_customer_card_and_ip(self):
+        """Test that each key kind is counted independently"""
+        store = FeatureStore(max_keys=100)
+        store.observe(make_transaction(amount=10.0), now=0)
+        store.observe(make_transaction(amount=20.0, customer_id="cust_other"), now=1)
+        store.observe(make_transaction(amount=30.0, last_four="1111", ip="10.0.0.1"), now=2)
+
+        features = store.features(make_transaction(), now=2)
+        assert features["customer"]["1m"] == (2, 40.0)
+        assert features["card"]["1m"] == (2, 30.0)
+        assert features["ip"]["1m"] == (2, 30.0)
+
+    def test_limits(self):
+        """Test that limits report the windows at or above their count"""
+        store = FeatureStore(max_keys=100)
+        for now in range(3):
+            store.observe(make_transaction(), now=now)
+        alerts = store.exceeded(make_transaction(), {"card_1m": 3, "customer_1h": 10}, now=3)
+        assert alerts == ["3 transactions per card in the last 1m"]
+
+    def test_event_time_follows_transaction_timestamps(self):
+        """Test that with event_time the windows use the transactions' timestamps, not the wall clock"""
+        store = FeatureStore(max_keys=100, event_time=True)
+        for hour in range(5):
+            store.observe(make_transaction().model_copy(update={"timestamp": f"2025-05-07T1{hour}:00:00Z"}))
+
+        latest = make_transaction().model_copy(update={"timestamp": "2025-05-07T14:00:00Z"})
+        features = store.features(latest)
+        assert features["customer"]["1h"][0] == 1
+        assert features["customer"]["24h"][0] == 5
+        assert store.exceeded(latest, {"card_1m": 3}) == []
+
+
+class TestFeatureUse:
+    def test_velocity_rule_and_prompt(self):
+        """Test that a card burst fires the velocity rule and shows up in the prompt row"""
+        for _ in range(3):
+            feature_store.observe(make_transaction())
+
+        score, factors = rule_engine.evaluate(make_transaction())
+        assert any("High velocity" in factor for factor in factors)
+        assert rule_engine.prescreen(make_transaction()) is None
+        assert "|3,3,3/150,150,150;3,3,3/150,150,150;3,3,3/150,150,150|-,-|" in encode_transaction(make_transaction())
+
+    @pytest.mark.asyncio
+    async def test_velocity_burst_bypasses_cache(self):
+        """Test that the analyzer counts each transaction and re-asks the LLM once a limit is hit"""
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            mock_analyze.return_value = RiskAnalysis(
+                risk_score=0.4, risk_factors=["Cross-border"], reasoning="mismatch", recommended_action="review"
+            )
+            transaction = make_transaction(amount=600.0, card_country="CA")
+            for _ in range(3):
+                await analyze_transaction(transaction, "openai")
+
+        #first call, then a cache hit, then a fresh call at card_1m == 3
+        assert mock_analyze.call_count == 2
+        assert feature_store.observed == 3
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for the memory-mapped IP geolocation index (app/utils/geoip.py) and its use in the rules and prompt.
+"""
+import pytest
+from unittest.mock import patch
+
+from app.config import settings
+from app.models import Transaction
+from app.utils.geoip import GeoIP, GeoIPIndex, build_from_csv, build_index, parse_ip, parse_row, geoip
+from app.business_logic.rules import rule_engine
+from app.llm.prompts import encode_transaction
+
+RANGES_CSV = """# first_ip,last_ip,country,asn  or  cidr,country,asn
+1.0.0.0,1.0.0.255,AU,13335
+8.8.8.0/24,US,AS15169
+81.2.69.0/24,GB,20712
+5.255.255.0,5.255.255.255,RU,13238
+2001:4860::/32,US,15169
+2a02:6b8::/32,RU,13238
+"""
+
+@pytest.fixture
+def index_path(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(RANGES_CSV)
+    path = str(tmp_path / "geoip.idx")
+    assert build_from_csv(str(csv_path), path) == (4, 2)
+    return path
+
+@pytest.fixture
+def loaded_geoip(index_path):
+    geoip.open(index_path)
+    yield geoip
+    geoip.close()
+
+def make_transaction(ip, country="US", card_country="US", amount=49.99):
+    return Transaction(
+        transaction_id="tx_geoip_01",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency="USD",
+        customer={"id": "cust_98765zyxwv", "country": country, "ip_address": ip},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": card_country},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+
+class TestIndex:
+    def test_ipv4_lookups(self, index_path):
+        """Test hits, range boundaries and misses"""
+        index = GeoIPIndex(index_path)
+        assert index.lookup("8.8.8.8") == ("US", 15169)
+        assert index.country("1.0.0.0") == "AU"
+        assert index.country("1.0.0.255") == "AU"
+        assert index.country("1.0.1.0") is None
+        assert index.country("0.0.0.1") is None
+        assert index.country("255.255.255.255") is None
+        index.close()
+
+    def test_ipv6_and_mapped_lookups(self, index_path):
+        """Test IPv6 ranges and IPv4-mapped IPv6 addresses"""
+        index = GeoIPIndex(index_path)
+        assert index.lookup("2001:4860:4860::8888") == ("US", 15169)
+        assert index.country("2a02:6b8:a::a") == "RU"
+        assert index.country("2a03::1") is None
+        assert index.country("::ffff:81.2.69.160") == "GB"
+        index.close()
+
+    def test_invalid_addresses(self, index_path):
+        """Test that malformed addresses are unknown rather than errors"""
+        index = GeoIPIndex(index_path)
+        for ip in ("", "not-an-ip", "300.1.1.1", "1.2.3", "gggg::1"):
+            assert index.country(ip) is None
+        index.close()
+
+    def test_parse(self):
+        """Test address and row parsing"""
+        assert parse_ip("0.0.0.1") == (4, 1)
+        assert parse_ip("::ffff:0.0.0.2") == (4, 2)
+        assert parse_ip("2001:db8::1") == (6, 0x20010DB800000000)
+        assert parse_row(["10.0.0.0/8", "us", "AS1"]) == (4, 0x0A000000, 0x0AFFFFFF, "US", 1)
+        with pytest.raises(ValueError):
+            parse_row(["10.0.0.9", "10.0.0.1", "US", "1"])
+
+    def test_overlapping_ranges_rejected(self, tmp_path):
+        """Test that the builder refuses ambiguous input"""
+        with pytest.raises(ValueError):
+            build_index([(4, 0, 10, "US", 1), (4, 5, 20, "CA", 2)], str(tmp_path / "bad.idx"))
+
+    def test_not_an_index(self, tmp_path):
+        """Test that other files are rejected, and that GeoIP degrades to unknown"""
+        path = tmp_path / "other.idx"
+        path.write_bytes(b"x" * 64)
+        with pytest.raises(ValueError):
+            GeoIPIndex(str(path))
+        assert GeoIP(str(path)).country("8.8.8.8") is None
+
+    def test_lazy_load_from_settings(self, index_path):
+        """Test that the index is opened from geoip_db_path on first use"""
+        with patch.object(settings, "geoip_db_path", index_path):
+            lookup = GeoIP()
+            assert lookup.stats()["ipv4_ranges"] == 4
+            assert lookup.country("81.2.69.1") == "GB"
+            lookup.close()
+        assert GeoIP().stats() == {"loaded": False}
+
+
+class TestGeoIPUse:
+    def test_ip_country_mismatch_rule(self, loaded_geoip):
+        """Test that an IP located elsewhere fires the mismatch rule and keeps the transaction from being auto-allowed"""
+        score, factors = rule_engine.evaluate(make_transaction("81.2.69.10"))
+        assert any("IP address located in GB" in factor for factor in factors)
+        assert rule_engine.prescreen(make_transaction("81.2.69.10")) is None
+        assert rule_engine.prescreen(make_transaction("8.8.8.8")).recommended_action == "allow"
+
+    def test_high_risk_ip_country(self, loaded_geoip):
+        """Test that an IP in a high-risk country counts as a high-risk country"""
+        score, factors = rule_engine.evaluate(make_transaction("5.255.255.1"))
+        assert any("IP RU" in factor for factor in factors)
+
+    def test_ip_country_in_prompt(self, loaded_geoip):
+        """Test that the resolved IP country is part of the prompt row"""
+        assert "|cust_98765zyxwv,US,2a02:6b8::1,RU|" in encode_transaction(make_transaction("2a02:6b8::1"))
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,158 @@
+"""
+Unit tests for hedged requests across LLM providers (app/business_logic/risk_analyzer.py)
+and the latency histograms they are tuned from (app/business_logic/latency.py).
+"""
+import pytest
+import asyncio
+from unittest.mock import patch
+
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.llm.groq_llm import GroqLLM
+from app.business_logic import risk_analyzer
+from app.business_logic.latency import LatencyHistogram
+
+TRANSACTION = Transaction(
+    transaction_id="tx_hedge_01",
+    timestamp="2025-05-07T14:30:45Z",
+    amount=129.99,
+    currency="USD",
+    customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+)
+
+def analysis(reasoning, score=0.4, action="review"):
+    return RiskAnalysis(risk_score=score, risk_factors=[], reasoning=reasoning, recommended_action=action)
+
+def provider(delay, result=None, error=None, calls=None):
+    async def analyze(self, transaction):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append("cancelled")
+            raise
+        if error:
+            raise error
+        return result
+    return analyze
+
+@pytest.fixture
+def hedging():
+    with patch.object(settings, "hedge_enabled", True), \
+         patch.object(settings, "hedge_provider", "groq"), \
+         patch.object(settings, "hedge_default_delay", 0.05), \
+         patch.object(settings, "hedge_min_delay", 0.01):
+        yield
+
+
+class TestLatencyHistogram:
+    def test_percentiles(self):
+        """Test that percentiles land in the right bucket"""
+        histogram = LatencyHistogram()
+        for _ in range(90):
+            histogram.observe(0.1)
+        for _ in range(10):
+            histogram.observe(2.0)
+
+        assert 0.1 <= histogram.percentile(0.5) < 0.13
+        assert 2.0 <= histogram.percentile(0.95) < 2.5
+        assert histogram.stats()["count"] == 100
+
+    def test_empty_histogram(self):
+        """Test that an empty histogram has no percentile"""
+        assert LatencyHistogram().percentile(0.95) is None
+
+    def test_hedge_delay_adapts_to_observed_latency(self):
+        """Test that the hedge delay follows the histogram once enough samples exist"""
+        with patch.dict(risk_analyzer.latency_histograms, {"openai": LatencyHistogram()}), \
+             patch.object(settings, "hedge_min_samples", 10):
+            assert risk_analyzer.hedge_delay("openai") == settings.hedge_default_delay
+            for _ in range(10):
+                risk_analyzer.latency_histograms["openai"].observe(0.3)
+            assert 0.3 <= risk_analyzer.hedge_delay("openai") < 0.4
+
+
+class TestHedgedCall:
+    @pytest.mark.asyncio
+    async def test_fast_primary_does_not_fire_hedge(self, hedging):
+        """Test that a fast primary answers alone"""
+        with patch.object(OpenAILLM, "analyze_transaction", provider(0, analysis("primary"))), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, analysis("secondary"))):
+            before = dict(risk_analyzer.hedge_stats)
+            result = await risk_analyzer.hedged_call(TRANSACTION, "openai", "groq")
+
+        assert result.reasoning == "primary"
+        assert risk_analyzer.hedge_stats["hedges_fired"] == before["hedges_fired"]
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_loses_to_hedge(self, hedging):
+        """Test that the secondary wins when the primary is slow and the primary is cancelled"""
+        calls = []
+        with patch.object(OpenAILLM, "analyze_transaction", provider(1.0, analysis("primary"), calls=calls)), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, analysis("secondary"))):
+            result = await risk_analyzer.hedged_call(TRANSACTION, "openai", "groq")
+            await asyncio.sleep(0)
+
+        assert result.reasoning == "secondary"
+        assert calls == ["cancelled"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_cancels_provider_calls(self, hedging):
+        """Test that cancelling the caller, before or after the hedge fired, cancels every provider call"""
+        for wait in (0.01, 0.1):
+            calls = []
+            with patch.object(OpenAILLM, "analyze_transaction", provider(1.0, analysis("primary"), calls=calls)), \
+                 patch.object(GroqLLM, "analyze_transaction", provider(1.0, analysis("secondary"), calls=calls)):
+                call = asyncio.create_task(risk_analyzer.hedged_call(TRANSACTION, "openai", "groq"))
+                await asyncio.sleep(wait)
+                call.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await call
+                await asyncio.sleep(0)
+
+            assert calls == ["cancelled"] * (1 if wait < 0.05 else 2)
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_fires_hedge_immediately(self, hedging):
+        """Test that a failing primary does not wait for the hedge delay"""
+        with patch.object(OpenAILLM, "analyze_transaction", provider(0, error=Exception("boom"))), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, analysis("secondary"))), \
+             patch.object(settings, "hedge_default_delay", 5.0):
+            result = await asyncio.wait_for(risk_analyzer.hedged_call(TRANSACTION, "openai", "groq"), 1.0)
+
+        assert result.reasoning == "secondary"
+
+    @pytest.mark.asyncio
+    async def test_invalid_answer_does_not_win(self, hedging):
+        """Test that an out-of-range analysis is ignored in favour of a valid one"""
+        with patch.object(OpenAILLM, "analyze_transaction", provider(0.1, analysis("primary"))), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, analysis("bad", score=7.0))):
+            result = await risk_analyzer.hedged_call(TRANSACTION, "openai", "groq")
+
+        assert result.reasoning == "primary"
+
+    @pytest.mark.asyncio
+    async def test_both_failing_raises(self, hedging):
+        """Test that an error is raised when neither provider answers"""
+        with patch.object(OpenAILLM, "analyze_transaction", provider(0, error=Exception("primary down"))), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, error=Exception("secondary down"))):
+            with pytest.raises(Exception) as excinfo:
+                await risk_analyzer.hedged_call(TRANSACTION, "openai", "groq")
+
+        assert "primary down" in str(excinfo.value)
+
+    @pytest.mark.asyncio
+    async def test_analyzer_uses_hedging_when_enabled(self, hedging):
+        """Test that analyze_transaction goes through the hedge when configured"""
+        with patch.object(OpenAILLM, "analyze_transaction", provider(1.0, analysis("primary"))), \
+             patch.object(GroqLLM, "analyze_transaction", provider(0, analysis("secondary"))):
+            result = await risk_analyzer.analyze_transaction(TRANSACTION, "openai")
+
+        assert result.reasoning == "secondary"
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,110 @@
+"""
+Tests for the shared HTTP connection pools (app/utils/http_clients.py) and their injection into the LLMs.
+"""
+import pytest
+import json
+import httpx
+from fastapi.testclient import TestClient
+from base64 import b64encode
+
+from app.config import settings
+from app.models import Transaction
+from app.llm.openai_llm import OpenAILLM
+from app.utils.http_clients import HTTPClientPool, ConnectionStats, http_clients
+from app.business_logic import risk_analyzer
+from app.main import app
+
+VALID_TRANSACTION = {
+    "transaction_id": "tx_12345abcde",
+    "timestamp": "2025-05-07T14:30:45Z",
+    "amount": 129.99,
+    "currency": "USD",
+    "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+}
+
+CLEAN_RESPONSE = {
+    "risk_score": 0.25,
+    "risk_factors": ["Cross-border transaction"],
+    "reasoning": "Minor geographic mismatch",
+    "recommended_action": "allow"
+}
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+
+class TestHTTPClientPool:
+    @pytest.mark.asyncio
+    async def test_same_client_is_reused(self):
+        """Test that the pool hands out one long-lived client per provider"""
+        pool = HTTPClientPool()
+        assert pool.get("openai") is pool.get("openai")
+        assert pool.get("openai") is not pool.get("groq")
+        await pool.aclose()
+
+    @pytest.mark.asyncio
+    async def test_closed_client_is_recreated(self):
+        """Test that a new client is created after the pool was closed"""
+        pool = HTTPClientPool()
+        first = pool.get("openai")
+        await pool.aclose()
+        assert first.is_closed
+        assert pool.get("openai") is not first
+        await pool.aclose()
+
+    @pytest.mark.asyncio
+    async def test_connection_stats(self):
+        """Test that reused connections are requests that did not open a new connection"""
+        stats = ConnectionStats()
+        for _ in range(3):
+            await stats.on_request(httpx.Request("GET", "http://test"))
+        await stats._trace("connection.connect_tcp.complete", {})
+
+        result = stats.as_dict()
+        assert result["requests"] == 3
+        assert result["new_connections"] == 1
+        assert result["reused_connections"] == 2
+
+
+class TestClientInjection:
+    @pytest.mark.asyncio
+    async def test_llm_uses_injected_client(self):
+        """Test that an injected client is used for every retry instead of a new one"""
+        calls = []
+
+        def handler(request: httpx.Request):
+            calls.append(request)
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": json.dumps(CLEAN_RESPONSE)}}],
+                "usage": {"total_tokens": 150}
+            })
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            llm = OpenAILLM(client=client)
+            result = await llm.analyze_transaction(Transaction(**VALID_TRANSACTION))
+
+        assert len(calls) == 1
+        assert result.risk_score == 0.25
+
+    def test_lifespan_binds_and_closes_clients(self):
+        """Test that the app lifespan injects the shared clients and closes them on shutdown"""
+        with TestClient(app) as client:
+            for name, llm in risk_analyzer.llm_provider.items():
+                assert llm.client is http_clients.get(name)
+            response = client.get("/stats/connections", headers=get_auth_header())
+            assert response.status_code == 200
+
+        for llm in risk_analyzer.llm_provider.values():
+            assert llm._client.is_closed
+
+    def test_stats_require_auth(self):
+        """Test that connection stats are not public"""
+        response = TestClient(app).get("/stats/connections", headers=get_auth_header("wrong", "credentials"))
+        assert response.status_code == 401
+
+
+if __name__ == "__main__":
+    pytest.main()
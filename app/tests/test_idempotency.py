@@ -0,0 +1,228 @@
+"""
+Tests for idempotent webhook handling (app/business_logic/idempotency.py): single-flight coalescing of concurrent
+requests for one transaction_id and replay of the stored analysis within the window.
+"""
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch, AsyncMock
+from base64 import b64encode
+
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.business_logic.idempotency import IdempotencyStore
+from app.utils.shared_state import MemoryState, RedisState
+from app.main import app
+from app.utils import metrics
+
+TRANSACTION = {
+    "transaction_id": "tx_idem_01",
+    "timestamp": "2025-05-07T14:30:45Z",
+    "amount": 129.99,
+    "currency": "USD",
+    "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+}
+
+HIGH_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.9,
+    risk_factors=["Cross-border transaction", "New device"],
+    reasoning="Several risk indicators",
+    recommended_action="block"
+)
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+
+class SlowProcess:
+    """Stand-in for analyze_and_notify that holds the analysis open until released"""
+    def __init__(self, result=HIGH_RISK_ANALYSIS, error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self, transaction):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class TestIdempotencyStore:
+    async def test_concurrent_requests_share_one_analysis(self):
+        """Test that concurrent callers for one transaction_id run process once and all get the result"""
+        store = IdempotencyStore(ttl=60, max_entries=10)
+        process = SlowProcess()
+        transaction = Transaction(**TRANSACTION)
+
+        waiters = [asyncio.create_task(store.run(transaction, process)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert store.stats()["in_flight"] == 1
+        process.release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert process.calls == 1
+        assert all(result == HIGH_RISK_ANALYSIS for result in results)
+        assert store.coalesced == 4
+        assert metrics.webhook_coalesced.value() == 4
+        assert store.stats()["in_flight"] == 0
+
+    async def test_repeat_within_window_is_replayed(self):
+        """Test that a repeat gets the stored result until the window has passed"""
+        store = IdempotencyStore(ttl=0.05, max_entries=10)
+        process = SlowProcess()
+        process.release.set()
+        transaction = Transaction(**TRANSACTION)
+
+        first = await store.run(transaction, process)
+        replay = await store.run(transaction, process)
+        assert replay == first and replay is not first
+        assert process.calls == 1
+        assert metrics.webhook_replayed.value() == 1
+
+        await asyncio.sleep(0.1)
+        await store.run(transaction, process)
+        assert process.calls == 2
+        assert store.expirations == 1
+
+    async def test_reused_id_with_different_payload_is_analyzed(self):
+        """Test that only an identical payload is coalesced or replayed"""
+        store = IdempotencyStore(ttl=60, max_entries=10)
+        process = SlowProcess()
+        process.release.set()
+
+        await store.run(Transaction(**TRANSACTION), process)
+        await store.run(Transaction(**{**TRANSACTION, "amount": 5000.0}), process)
+        assert process.calls == 2
+        assert store.replayed == 0
+
+    async def test_failures_are_not_stored(self):
+        """Test that waiters all see the failure and the next request tries again"""
+        store = IdempotencyStore(ttl=60, max_entries=10)
+        process = SlowProcess(error=RuntimeError("provider down"))
+        transaction = Transaction(**TRANSACTION)
+
+        waiters = [asyncio.create_task(store.run(transaction, process)) for _ in range(3)]
+        await asyncio.sleep(0)
+        process.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        process.error = None
+        assert await store.run(transaction, process) == HIGH_RISK_ANALYSIS
+        assert process.calls == 2
+
+    async def test_disconnected_caller_does_not_cancel_the_analysis(self):
+        """Test that cancelling the first caller leaves the shared analysis running for the others"""
+        store = IdempotencyStore(ttl=60, max_entries=10)
+        process = SlowProcess()
+        transaction = Transaction(**TRANSACTION)
+
+        first = asyncio.create_task(store.run(transaction, process))
+        second = asyncio.create_task(store.run(transaction, process))
+        await asyncio.sleep(0)
+        first.cancel()
+        process.release.set()
+        assert await second == HIGH_RISK_ANALYSIS
+        assert process.calls == 1
+
+    async def test_store_is_bounded(self):
+        """Test that the oldest finished entries are evicted past max_entries"""
+        store = IdempotencyStore(ttl=60, max_entries=2)
+        process = SlowProcess()
+        process.release.set()
+        for index in range(3):
+            await store.run(Transaction(**{**TRANSACTION, "transaction_id": f"tx_idem_{index}"}), process)
+
+        assert store.stats()["stored"] == 2
+        assert store.evictions == 1
+        await store.run(Transaction(**{**TRANSACTION, "transaction_id": "tx_idem_0"}), process)
+        assert process.calls == 4
+
+
+class TestAcrossWorkers:
+    """Two stores over one SharedState stand in for two worker processes"""
+    def make_workers(self, shared):
+        return [IdempotencyStore(ttl=60, max_entries=10, shared=shared, claim_seconds=5) for _ in range(2)]
+
+    async def test_retry_on_another_worker_waits_for_the_claim(self):
+        """Test that a concurrent retry on a second worker gets the first worker's analysis"""
+        worker_1, worker_2 = self.make_workers(MemoryState())
+        process = SlowProcess()
+        transaction = Transaction(**TRANSACTION)
+
+        first = asyncio.create_task(worker_1.run(transaction, process))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(worker_2.run(transaction, process))
+        await asyncio.sleep(0.1)
+        process.release.set()
+
+        assert await first == await second == HIGH_RISK_ANALYSIS
+        assert process.calls == 1
+        assert worker_2.coalesced == 1 and worker_2.executed == 0
+
+    async def test_later_retry_on_another_worker_is_replayed(self):
+        """Test that a finished analysis is replayed by the other worker"""
+        worker_1, worker_2 = self.make_workers(MemoryState())
+        process = SlowProcess()
+        process.release.set()
+        transaction = Transaction(**TRANSACTION)
+
+        await worker_1.run(transaction, process)
+        assert await worker_2.run(transaction, process) == HIGH_RISK_ANALYSIS
+        assert process.calls == 1
+        assert worker_2.replayed == 1
+        await worker_2.run(transaction, process)
+        assert worker_2.replayed == 2  # now from its own LRU
+
+    async def test_failure_releases_the_claim(self):
+        """Test that after a failed analysis the other worker does not wait for the claim to expire"""
+        worker_1, worker_2 = self.make_workers(MemoryState())
+        transaction = Transaction(**TRANSACTION)
+        failing = SlowProcess(error=RuntimeError("provider down"))
+        failing.release.set()
+        with pytest.raises(RuntimeError):
+            await worker_1.run(transaction, failing)
+
+        process = SlowProcess()
+        process.release.set()
+        assert await asyncio.wait_for(worker_2.run(transaction, process), 1.0) == HIGH_RISK_ANALYSIS
+        assert process.calls == 1
+
+    async def test_unavailable_tier_does_not_fail_the_request(self):
+        """Test that a shared tier that can't be reached falls back to per-process handling"""
+        store = IdempotencyStore(ttl=60, max_entries=10, shared=RedisState("127.0.0.1", 1, timeout=0.5))
+        process = SlowProcess()
+        process.release.set()
+        assert await store.run(Transaction(**TRANSACTION), process) == HIGH_RISK_ANALYSIS
+        assert process.calls == 1
+
+
+class TestIdempotentWebhook:
+    @patch("app.business_logic.api_notifier.notify_api", new_callable=AsyncMock)
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_retries_call_the_llm_and_notify_once(self, mock_analyze, mock_notify):
+        """Test that concurrent and later retries of a high risk transaction cost one analysis and one notification"""
+        async def slow_analysis(transaction, llm_name):
+            await asyncio.sleep(0.05)
+            return HIGH_RISK_ANALYSIS
+        mock_analyze.side_effect = slow_analysis
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/webhook/transaction", headers=get_auth_header(), json=TRANSACTION) for _ in range(3)
+            ))
+            retry = await client.post("/webhook/transaction", headers=get_auth_header(), json=TRANSACTION)
+            stats = (await client.get("/stats/idempotency", headers=get_auth_header())).json()
+
+        assert all(response.status_code == 200 for response in responses + [retry])
+        assert all(response.json() == HIGH_RISK_ANALYSIS.model_dump() for response in responses + [retry])
+        assert mock_analyze.await_count == 1
+        assert mock_notify.await_count == 1
+        assert (stats["coalesced"], stats["replayed"]) == (2, 1)
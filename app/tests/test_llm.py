@@ -10,6 +10,7 @@ from app.models import Transaction, RiskAnalysis
 from app.llm.openai_llm import OpenAILLM
 from app.llm.claude_llm import ClaudeLLM
 from app.llm.groq_llm import GroqLLM
+from app.llm.base import LLM
 
 # Sample valid transaction data for testing
 VALID_TRANSACTION = {
@@ -223,14 +224,14 @@ class TestClaudeLLM:
         )
         
         with patch("httpx.AsyncClient.post", new_callable=AsyncMock) as mock_post, \
-             patch("builtins.print") as mock_print, \
+             patch("app.llm.claude_llm.logger") as mock_logger, \
              pytest.raises(httpx.HTTPStatusError):
             
             mock_post.return_value = mock_response
             await llm.analyze_transaction(transaction)
             
-            assert mock_print.called
-            assert "API Error Details" in mock_print.call_args[0][0]
+        assert mock_logger.error.called
+        assert "API Error Details" in mock_logger.error.call_args[0][0]
 
 
 class TestGroqLLM:
@@ -345,5 +346,17 @@ class TestGroqLLM:
             llm._extract_json(MALFORMED_RESPONSE)
 
 
+class TestLLMBase:
+    def test_provider_without_complete_fails_on_creation(self):
+        """Test that a provider missing _complete can't be instantiated, instead of failing on its first request"""
+        class Incomplete(LLM):
+            async def analyze_transaction(self, transaction):
+                pass
+
+        with pytest.raises(TypeError) as excinfo:
+            Incomplete()
+        assert "_complete" in str(excinfo.value)
+
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Tests for the queue-based structured JSON logging (app/utils/log.py).
+"""
+import io
+import json
+import logging
+import queue
+import pytest
+from types import SimpleNamespace
+
+from app.utils import log
+from app.utils.log import setup_logging, stop_logging, log_context, NonBlockingQueueHandler
+
+logger = logging.getLogger("app.tests.logging")
+
+def make_config(**overrides):
+    values = dict(log_level="INFO", log_levels={}, log_sample_rate=1.0, log_queue_max=1000)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+@pytest.fixture
+def capture():
+    """
+    Reconfigure logging to write into a buffer; read() flushes the writer thread and returns the JSON lines.
+    """
+    stream = io.StringIO()
+
+    def configure(**overrides):
+        setup_logging(make_config(**overrides), stream=stream)
+
+    def read():
+        stop_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    configure.read = read
+    yield configure
+    stop_logging()
+
+
+class TestStructuredLogging:
+    def test_records_are_json_with_extras(self, capture):
+        capture()
+        logger.info("Provider response", extra={"provider": "groq", "duration_ms": 812.5})
+
+        entry = capture.read()[-1]
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "app.tests.logging"
+        assert entry["message"] == "Provider response"
+        assert entry["provider"] == "groq" and entry["duration_ms"] == 812.5
+        assert "transaction_id" not in entry
+
+    def test_transaction_id_from_context(self, capture):
+        capture()
+        with log_context("tx_corr_01"):
+            logger.warning("inside")
+        logger.warning("outside")
+
+        inside, outside = capture.read()[-2:]
+        assert inside["transaction_id"] == "tx_corr_01"
+        assert "transaction_id" not in outside
+
+    def test_exception_is_included(self, capture):
+        capture()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+
+        entry = capture.read()[-1]
+        assert entry["level"] == "ERROR"
+        assert "ValueError: boom" in entry["exception"]
+
+    def test_levels_are_configurable(self, capture):
+        capture(log_level="WARNING", log_levels={"app.tests.logging.verbose": "DEBUG"})
+        logger.info("dropped")
+        logging.getLogger("app.tests.logging.verbose").debug("kept")
+
+        messages = [entry["message"] for entry in capture.read()]
+        assert "dropped" not in messages
+        assert "kept" in messages
+
+    def test_sampling_keeps_or_drops_whole_transactions(self, capture):
+        capture(log_sample_rate=0.5)
+        for i in range(200):
+            with log_context(f"tx_{i}"):
+                logger.info("first")
+                logger.info("second")
+                logger.error("always")
+
+        entries = capture.read()
+        by_transaction = {}
+        for entry in entries:
+            by_transaction.setdefault(entry["transaction_id"], []).append(entry["message"])
+        assert len(by_transaction) == 200  # every error survives
+        kept = [messages for messages in by_transaction.values() if "first" in messages]
+        assert 50 < len(kept) < 150
+        assert all("second" in messages for messages in kept)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = NonBlockingQueueHandler(queue.SimpleQueue(), max_size=1)
+        before = log.log_records_dropped.value()
+        for _ in range(3):
+            handler.emit(logging.makeLogRecord({"msg": "x"}))
+        assert log.log_records_dropped.value() - before == 2
+
+    def test_app_configures_logging_in_lifespan(self):
+        """Test that the writer thread runs for the app's lifetime only, not from import"""
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        stop_logging()
+        assert log._listener is None
+        with TestClient(app):
+            assert log._listener is not None
+            assert any(isinstance(h, NonBlockingQueueHandler) for h in logging.getLogger().handlers)
+        assert log._listener is None
+        assert not any(isinstance(h, NonBlockingQueueHandler) for h in logging.getLogger().handlers)
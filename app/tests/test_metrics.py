@@ -0,0 +1,133 @@
+"""
+Tests for the Prometheus metrics (app/utils/metrics.py) and the /metrics endpoint.
+"""
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from base64 import b64encode
+
+from app.config import settings
+from app.models import RiskAnalysis
+from app.main import app
+from app.utils import metrics
+from app.utils.metrics import Registry, time_stage
+
+client = TestClient(app)
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+SAMPLE_TRANSACTION = {
+    "transaction_id": "tx_metrics_01",
+    "timestamp": "2025-05-07T14:30:45Z",
+    "amount": 129.99,
+    "currency": "USD",
+    "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+}
+
+SAMPLE_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.45,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Minor geographic mismatch",
+    recommended_action="review"
+)
+
+
+class TestMetricTypes:
+    def test_counter_renders_labels(self):
+        registry = Registry()
+        counter = registry.counter("test_total", "Test counter", ("provider",))
+        counter.inc("groq")
+        counter.inc("groq", amount=2)
+        counter.inc('we"ird')
+
+        text = registry.render()
+        assert "# TYPE test_total counter" in text
+        assert 'test_total{provider="groq"} 3' in text
+        assert 'test_total{provider="we\\"ird"} 1' in text
+
+    def test_unlabelled_counter_renders_zero(self):
+        registry = Registry()
+        registry.counter("idle_total", "Never incremented")
+        assert "idle_total 0" in registry.render()
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Test histogram", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, "parse")
+
+        text = registry.render()
+        assert 'latency_seconds_bucket{stage="parse",le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{stage="parse",le="1"} 3' in text
+        assert 'latency_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+        assert 'latency_seconds_sum{stage="parse"} 2.65' in text
+        assert 'latency_seconds_count{stage="parse"} 4' in text
+        assert histogram.count("parse") == 4
+
+    def test_time_stage_records_duration(self):
+        with time_stage("validate"):
+            pass
+        assert metrics.stage_duration.count("validate") == 1
+
+
+class TestMetricsEndpoint:
+    def test_requires_authentication(self):
+        response = client.get("/metrics")
+        assert response.status_code == 401
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    def test_webhook_request_is_counted(self, mock_analyze):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        client.post("/webhook/transaction", json=SAMPLE_TRANSACTION, headers=get_auth_header())
+
+        response = client.get("/metrics", headers=get_auth_header())
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'risk_http_requests_total{route="/webhook/transaction",method="POST",status="200"} 1' in response.text
+        assert 'risk_stage_duration_seconds_count{stage="parse"} 1' in response.text
+        assert 'risk_stage_duration_seconds_count{stage="validate"} 1' in response.text
+
+    def test_route_template_is_used_as_label(self):
+        client.get("/analysis/tx_unknown_1", headers=get_auth_header())
+        client.get("/analysis/tx_unknown_2", headers=get_auth_header())
+        assert metrics.http_requests.value("/analysis/{transaction_id}", "GET", "404") == 2
+
+
+class TestPipelineMetrics:
+    @patch("app.llm.openai_llm.OpenAILLM._post", new_callable=AsyncMock)
+    async def test_provider_call_records_tokens_and_decision(self, mock_post):
+        from app.business_logic import risk_analyzer
+        from app.models import Transaction
+
+        mock_post.return_value = AsyncMock(status_code=200)
+        mock_post.return_value.raise_for_status = lambda: None
+        mock_post.return_value.json = lambda: {
+            "choices": [{"message": {"content": SAMPLE_RISK_ANALYSIS.model_dump_json()}}],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150},
+        }
+        with patch.object(settings, "prescreen_enabled", False), patch.object(settings, "streaming_enabled", False):
+            await risk_analyzer.analyze_transaction(Transaction(**SAMPLE_TRANSACTION), "openai")
+
+        assert metrics.llm_tokens.value("openai", "gpt-3.5-turbo", "in") == 120
+        assert metrics.llm_tokens.value("openai", "gpt-3.5-turbo", "out") == 30
+        assert metrics.decisions.value("llm", "review") == 1
+        assert metrics.cache_lookups.value("miss") == 1
+        assert metrics.provider_duration.count("openai") == 1
+        assert metrics.stage_duration.count("prompt_build") == 1
+        assert metrics.stage_duration.count("response_parse") == 1
+        assert 'risk_score_bucket{source="llm",le="0.5"} 1' in metrics.registry.render()
+
+    @patch("app.llm.groq_llm.GroqLLM._post", new_callable=AsyncMock)
+    async def test_rate_limit_retries_are_counted(self, mock_post):
+        from app.llm.groq_llm import GroqLLM
+
+        rate_limited = AsyncMock(status_code=429)
+        mock_post.return_value = rate_limited
+        with patch.object(settings, "rate_limit_max_attempts", 2):
+            await GroqLLM()._post_with_retry("http://groq.test", {}, {})
+
+        assert metrics.llm_retries.value("groq") == 2
@@ -0,0 +1,171 @@
+"""
+Unit tests for the notification outbox (app/business_logic/notification_outbox.py).
+"""
+import pytest
+import json
+import asyncio
+import httpx
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from base64 import b64encode
+
+from app.config import settings
+from app.models import RiskAnalysis
+from app.business_logic.notification_outbox import NotificationOutbox
+from app.main import app
+
+def get_auth_header(username=settings.auth_username, password=settings.auth_password):
+    credentials = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    return {"Authorization": f"Basic {credentials}"}
+
+HIGH_RISK_TRANSACTION = {
+    "transaction_id": "tx_67890fghij",
+    "timestamp": "2025-05-07T02:12:33Z",
+    "amount": 4999.99,
+    "currency": "USD",
+    "customer": {"id": "cust_12345abcde", "country": "US", "ip_address": "203.0.113.195"},
+    "payment_method": {"type": "credit_card", "last_four": "9876", "country_of_issue": "RU"},
+    "merchant": {"id": "merch_67890fghij", "name": "Luxury Goods", "category": "jewelry"}
+}
+
+HIGH_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.85,
+    risk_factors=["High-risk country involved (RU)"],
+    reasoning="High-risk card country",
+    recommended_action="block"
+)
+
+
+class TestNotificationOutbox:
+    @pytest.mark.asyncio
+    async def test_messages_are_delivered_in_batches(self):
+        """Test that queued messages are grouped into one delivery"""
+        outbox = NotificationOutbox(batch_size=5, flush_interval=0.05)
+        with patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            await outbox.start()
+            for i in range(3):
+                assert outbox.enqueue({"transaction_id": f"tx_{i}"})
+            await outbox.stop()
+
+        assert mock_send.call_count == 1
+        assert len(mock_send.call_args[0][0]) == 3
+        assert outbox.stats()["delivered"] == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_delivery_is_retried(self):
+        """Test retry with backoff after a failed delivery"""
+        outbox = NotificationOutbox(flush_interval=0.01, backoff_base=0.001)
+        with patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            mock_send.side_effect = [Exception("admin API down"), None]
+            await outbox.start()
+            outbox.enqueue({"transaction_id": "tx_1"})
+            await outbox.stop()
+
+        assert mock_send.call_count == 2
+        assert outbox.stats()["retries"] == 1
+        assert outbox.stats()["delivered"] == 1
+
+    @pytest.mark.asyncio
+    async def test_undeliverable_messages_are_spooled_and_replayed(self, tmp_path):
+        """Test that messages that could not be delivered survive a restart through the spool file"""
+        spool = str(tmp_path / "outbox.ndjson")
+        outbox = NotificationOutbox(flush_interval=0.01, max_retries=1, backoff_base=0.001, spool_path=spool)
+        with patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            mock_send.side_effect = Exception("admin API down")
+            await outbox.start()
+            outbox.enqueue({"transaction_id": "tx_1"})
+            await outbox.stop()
+        assert outbox.stats()["spooled"] == 1
+
+        restarted = NotificationOutbox(flush_interval=0.01, spool_path=spool)
+        with patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            await restarted.start()
+            await restarted.stop()
+
+        assert mock_send.call_args[0][0] == [{"transaction_id": "tx_1"}]
+        assert restarted.stats()["delivered"] == 1
+
+    @pytest.mark.asyncio
+    async def test_full_queue_is_bounded(self, tmp_path):
+        """Test that a full queue spills to the spool instead of growing"""
+        spool = tmp_path / "outbox.ndjson"
+        outbox = NotificationOutbox(max_size=1, flush_interval=0.01, spool_path=str(spool))
+        send_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_send(messages):
+            send_started.set()
+            await release.wait()
+
+        with patch("app.business_logic.api_notifier.send_notifications", side_effect=slow_send):
+            await outbox.start()
+            outbox.enqueue({"transaction_id": "tx_1"})
+            await send_started.wait()
+            assert outbox.enqueue({"transaction_id": "tx_2"})
+            assert not outbox.enqueue({"transaction_id": "tx_3"})
+            release.set()
+            await outbox.stop()
+
+        assert [json.loads(line)["transaction_id"] for line in spool.read_text().splitlines()] == ["tx_3"]
+
+    @pytest.mark.asyncio
+    async def test_only_failed_messages_are_retried(self):
+        """Test that a retry after a partly failed batch does not resend the messages that went out"""
+        posted = []
+
+        def handler(request):
+            transaction_id = json.loads(request.content)["transaction_id"]
+            posted.append(transaction_id)
+            return httpx.Response(503 if posted.count("tx_2") == 1 and transaction_id == "tx_2" else 200)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        outbox = NotificationOutbox(batch_size=3, flush_interval=0.05, backoff_base=0.001)
+        with patch.object(settings, "notifyadmin_batch_url", None), \
+             patch.object(settings, "notifyadmin_api_url", "http://admin.test/notify"), \
+             patch("app.business_logic.api_notifier.http_clients.get", return_value=client):
+            await outbox.start()
+            for i in range(1, 4):
+                outbox.enqueue({"transaction_id": f"tx_{i}"})
+            await outbox.stop()
+        await client.aclose()
+
+        assert sorted(posted[:3]) == ["tx_1", "tx_2", "tx_3"]
+        assert posted[3:] == ["tx_2"]
+        assert outbox.stats()["delivered"] == 3
+        assert outbox.stats()["retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_being_collected_is_spooled_on_shutdown(self, tmp_path):
+        """Test that messages taken off the queue but not yet sent survive a stop"""
+        spool = tmp_path / "outbox.ndjson"
+        outbox = NotificationOutbox(batch_size=10, flush_interval=5.0, spool_path=str(spool))
+        with patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            await outbox.start()
+            outbox.enqueue({"transaction_id": "tx_1"})
+            outbox.enqueue({"transaction_id": "tx_2"})
+            await asyncio.sleep(0.01)
+            await outbox.stop(timeout=0.05)
+
+        assert mock_send.call_count == 0
+        assert [json.loads(line)["transaction_id"] for line in spool.read_text().splitlines()] == ["tx_1", "tx_2"]
+
+
+class TestWebhookUsesOutbox:
+    def test_high_risk_webhook_does_not_wait_for_admin_api(self):
+        """Test that the webhook enqueues the notification and the outbox delivers it"""
+        with patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock) as mock_analyze, \
+             patch("app.business_logic.api_notifier.notify_api", new_callable=AsyncMock) as mock_notify, \
+             patch("app.business_logic.api_notifier.send_notifications", new_callable=AsyncMock) as mock_send:
+            mock_analyze.return_value = HIGH_RISK_ANALYSIS
+            with TestClient(app) as client:
+                response = client.post("/webhook/transaction", headers=get_auth_header(), json=HIGH_RISK_TRANSACTION)
+                assert response.status_code == 200
+                assert not mock_notify.called
+
+        #the lifespan shutdown drained the outbox
+        assert mock_send.called
+        assert mock_send.call_args[0][0][0]["transaction_id"] == "tx_67890fghij"
+
+
+if __name__ == "__main__":
+    pytest.main()
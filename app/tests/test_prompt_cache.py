@@ -0,0 +1,159 @@
+"""
+Tests for the static/dynamic prompt split and provider prompt caching (app/llm/prompts.py and the provider request bodies),
+run against a local stand-in server that caches prompt prefixes the way the providers do.
+"""
+import pytest
+import json
+import httpx
+from unittest.mock import patch
+
+from app.config import settings
+from app.models import Transaction
+from app.llm.prompts import TEMPLATES, BATCH_TEMPLATE, split_prompt, token_stats
+from app.llm.openai_llm import OpenAILLM
+from app.llm.claude_llm import ClaudeLLM
+from app.llm.groq_llm import GroqLLM
+
+ANSWER = json.dumps({
+    "risk_score": 0.2,
+    "risk_factors": ["Cross-border transaction"],
+    "reasoning": "Minor geographic mismatch",
+    "recommended_action": "allow"
+})
+
+def make_transaction(transaction_id):
+    return Transaction(
+        transaction_id=transaction_id,
+        timestamp="2025-05-07T14:30:45Z",
+        amount=129.99,
+        currency="USD",
+        customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+
+class FakeProvider:
+    """
+    Stand-in for the provider APIs: remembers the cacheable prefix of each request and reports
+    the tokens of a repeated prefix as cached, in the provider's own usage format.
+    """
+    def __init__(self, anthropic=False):
+        self.anthropic = anthropic
+        self.seen = set()
+        self.requests = []
+
+    def __call__(self, request: httpx.Request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        if self.anthropic:
+            blocks = body["system"] if isinstance(body["system"], list) else []
+            prefix = "".join(b["text"] for b in blocks if "cache_control" in b)
+        else:
+            messages = body["messages"]
+            prefix = messages[0]["content"] if messages[0]["role"] == "system" else ""
+        prefix_tokens = len(prefix) // 4
+        cached = prefix_tokens if prefix and prefix in self.seen else 0
+        self.seen.add(prefix)
+
+        if self.anthropic:
+            return httpx.Response(200, json={
+                "content": [{"type": "text", "text": ANSWER}],
+                "usage": {"input_tokens": 40, "output_tokens": 30,
+                          "cache_read_input_tokens": cached, "cache_creation_input_tokens": prefix_tokens - cached}
+            })
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": ANSWER}}],
+            "usage": {"prompt_tokens": prefix_tokens + 40, "completion_tokens": 30, "total_tokens": prefix_tokens + 70,
+                      "prompt_tokens_details": {"cached_tokens": cached}}
+        })
+
+
+class TestPromptSplit:
+    def test_split_matches_template(self):
+        """Test that a built prompt splits into the provider's static prefix and the transaction row"""
+        prompt = GroqLLM()._build_prompt(make_transaction("tx_1"))
+        static, dynamic = split_prompt("groq", prompt)
+        assert static == TEMPLATES["groq"].static
+        assert static + dynamic == prompt
+        assert "tx_1" in dynamic and "tx_1" not in static
+
+    def test_batch_and_foreign_prompts(self):
+        """Test that batch prompts split on the batch prefix and other prompts are left whole"""
+        batch = OpenAILLM()._build_batch_prompt([make_transaction("tx_1"), make_transaction("tx_2")])
+        assert split_prompt("openai", batch)[0] == BATCH_TEMPLATE.static
+        assert split_prompt("openai", "free-form prompt") == ("", "free-form prompt")
+
+
+class TestProviderCaching:
+    @pytest.fixture(autouse=True)
+    def caching(self):
+        with patch.object(settings, "prompt_caching_enabled", True):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_claude_marks_static_prefix_cacheable(self):
+        """Test the cache_control system block and that cache reads/writes are surfaced"""
+        token_stats.clear()
+        provider = FakeProvider(anthropic=True)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+            llm = ClaudeLLM(client=client)
+            for transaction_id in ("tx_1", "tx_2"):
+                result = await llm.analyze_transaction(make_transaction(transaction_id))
+                assert result.risk_score == 0.2
+
+        first, second = provider.requests
+        assert first["system"] == second["system"]
+        assert first["system"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert "tx_2" in second["messages"][0]["content"]
+        assert "Assess risk" not in second["messages"][0]["content"]
+
+        stats = token_stats["claude"].stats()
+        assert stats["cache_write_tokens"] > 0
+        assert stats["cached_tokens"] == stats["cache_write_tokens"]
+        assert stats["prompt_tokens"] == 80 + stats["cached_tokens"] + stats["cache_write_tokens"]
+
+    @pytest.mark.asyncio
+    async def test_openai_sends_prefix_first(self):
+        """Test that the static prefix leads as an identical system message and cached tokens are recorded"""
+        token_stats.clear()
+        provider = FakeProvider()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+            llm = OpenAILLM(client=client)
+            for transaction_id in ("tx_1", "tx_2"):
+                await llm.analyze_transaction(make_transaction(transaction_id))
+
+        first, second = provider.requests
+        assert first["messages"][0] == second["messages"][0]
+        assert first["messages"][0]["role"] == "system"
+        assert first["messages"][1] != second["messages"][1]
+
+        stats = token_stats["openai"].stats()
+        assert stats["cached_tokens"] == len(TEMPLATES["openai"].static) // 4
+        assert 0 < stats["cached_ratio"] < 1
+
+    @pytest.mark.asyncio
+    async def test_groq_keeps_instructions_in_the_user_turn(self):
+        """Test that the reasoning model gets the whole prompt as one user message"""
+        provider = FakeProvider()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+            await GroqLLM(client=client).analyze_transaction(make_transaction("tx_1"))
+
+        messages = provider.requests[0]["messages"]
+        assert [m["role"] for m in messages] == ["user"]
+        assert messages[0]["content"].startswith(TEMPLATES["groq"].static)
+
+    @pytest.mark.asyncio
+    async def test_caching_can_be_disabled(self):
+        """Test that prompt_caching_enabled=False (the default) sends the whole prompt as one user message"""
+        provider = FakeProvider()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+            with patch.object(settings, "prompt_caching_enabled", False):
+                await OpenAILLM(client=client).analyze_transaction(make_transaction("tx_1"))
+
+        messages = provider.requests[0]["messages"]
+        assert [m["role"] for m in messages] == ["user"]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -3,7 +3,11 @@ This module contains unit tests for the prompt templates used in the LLM impleme
 It ensures that prompts are correctly formatted and optimized.
 """
 import pytest
+import httpx
+from unittest.mock import patch
+from app.config import settings
 from app.models import Transaction, Customer, PaymentMethod, Merchant
+from app.llm.prompts import TEMPLATES, PromptTemplate, encode_transaction, build_batch_prompt, estimate_tokens, token_stats
 from app.llm.openai_llm import OpenAILLM
 from app.llm.claude_llm import ClaudeLLM
 from app.llm.groq_llm import GroqLLM
@@ -116,5 +120,60 @@ class TestPromptTemplates:
             assert "review" in prompt.lower() or "flag" in prompt.lower()
             assert "block" in prompt.lower()
 
+class TestCompactPrompts:
+    def test_transaction_is_one_compact_row(self):
+        """Test that the transaction is encoded as a single row instead of indented JSON"""
+        row = encode_transaction(SAMPLE_TRANSACTION)
+        assert row == "tx_12345abcde|2025-05-07T14:30:45Z|129.99 USD|cust_98765zyxwv,US,192.168.1.1,-|credit_card,4242,CA|0,0,0/0,0,0;0,0,0/0,0,0;0,0,0/0,0,0|-,-|merch_abcde12345,electronics,Example Store"
+        for llm_class in [OpenAILLM, ClaudeLLM, GroqLLM]:
+            prompt = llm_class()._build_prompt(SAMPLE_TRANSACTION)
+            assert row in prompt
+            assert '\n  "' not in prompt
+
+    def test_separator_in_values(self):
+        """Test that values can't break the row layout"""
+        transaction = SAMPLE_TRANSACTION.model_copy(update={"merchant": Merchant(id="m|1", name="A|B, Co\nLtd", category="retail")})
+        assert encode_transaction(transaction).endswith("|m/1,retail,A/B, Co Ltd")
+
+    def test_static_text_is_shared(self):
+        """Test that the instruction block is compiled once and batch prompts repeat only the rows"""
+        template = TEMPLATES["openai"]
+        assert template.render(SAMPLE_TRANSACTION).startswith(template.static)
+        single = build_batch_prompt([SAMPLE_TRANSACTION])
+        double = build_batch_prompt([SAMPLE_TRANSACTION, SAMPLE_TRANSACTION])
+        assert len(double) - len(single) == len(encode_transaction(SAMPLE_TRANSACTION)) + 1
+
+    def test_high_risk_countries_follow_the_setting(self):
+        """Test that the prompt lists the same high-risk countries as the pre-screen rules"""
+        assert "high-risk countries RU IR KP VE MM)" in TEMPLATES["openai"].static
+        with patch.object(settings, "high_risk_countries", ["ru", "by"]):
+            assert "high-risk countries RU BY)" in PromptTemplate("").static
+
+    def test_token_estimate(self):
+        """Test the local token estimator and that the compact prompt beats indented JSON"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("risk score 0.25") == 6
+        indented = SAMPLE_TRANSACTION.model_dump_json(indent=2)
+        assert estimate_tokens(encode_transaction(SAMPLE_TRANSACTION)) < estimate_tokens(indented) * 0.6
+
+    @pytest.mark.asyncio
+    async def test_tokens_recorded_per_provider(self):
+        """Test that estimated and provider-reported token counts are recorded"""
+        token_stats.clear()
+
+        def handler(request: httpx.Request):
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "{}"}}],
+                "usage": {"prompt_tokens": 300, "completion_tokens": 40, "total_tokens": 340}
+            })
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await OpenAILLM(client=client)._complete(OpenAILLM()._build_prompt(SAMPLE_TRANSACTION))
+
+        stats = token_stats["openai"].stats()
+        assert stats["requests"] == 1 and stats["reported_requests"] == 1
+        assert stats["prompt_tokens"] == 300 and stats["completion_tokens"] == 40
+        assert stats["estimated_prompt_tokens"] > 0
+
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
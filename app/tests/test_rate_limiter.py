@@ -0,0 +1,134 @@
+"""
+Unit tests for the per-provider rate limiter (app/llm/rate_limiter.py) and its use by the LLMs.
+"""
+import pytest
+import json
+import time
+import asyncio
+import httpx
+from unittest.mock import MagicMock
+
+from app.models import Transaction
+from app.llm.groq_llm import GroqLLM
+from app.llm.rate_limiter import RateLimiter, parse_reset, rate_limiters
+
+TRANSACTION = Transaction(
+    transaction_id="tx_limit_01",
+    timestamp="2025-05-07T14:30:45Z",
+    amount=129.99,
+    currency="USD",
+    customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+)
+
+CLEAN_RESPONSE = {
+    "risk_score": 0.25,
+    "risk_factors": ["Cross-border transaction"],
+    "reasoning": "Minor geographic mismatch",
+    "recommended_action": "allow"
+}
+
+
+class TestParseReset:
+    def test_formats(self):
+        """Test the reset formats used by OpenAI, Groq and Anthropic"""
+        assert parse_reset("2") == 2.0
+        assert parse_reset("20ms") == pytest.approx(0.02)
+        assert parse_reset("6m0s") == 360.0
+        assert parse_reset("1m30.5s") == 90.5
+        assert parse_reset("2099-01-01T00:00:00Z") > 0
+        assert parse_reset("soon") is None
+        assert parse_reset(None) is None
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_queues_fifo(self):
+        """Test that requests over the concurrency limit wait and are admitted in arrival order"""
+        limiter = RateLimiter(rate=1000, burst=1000, initial_concurrency=1)
+        order = []
+
+        async def request(i):
+            await limiter.acquire()
+            order.append(i)
+            await asyncio.sleep(0.001)
+            limiter.release(MagicMock(status_code=200, headers={}))
+
+        await asyncio.gather(*(request(i) for i in range(5)))
+        assert order == [0, 1, 2, 3, 4]
+        assert limiter.stats()["max_queue_depth"] >= 4
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_paces_requests(self):
+        """Test that the bucket limits requests per second once the burst is used"""
+        limiter = RateLimiter(rate=100, burst=1, initial_concurrency=10)
+        start = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+            limiter.release(None)
+        assert time.monotonic() - start >= 0.025
+
+    @pytest.mark.asyncio
+    async def test_429_halves_limit_and_honours_retry_after(self):
+        """Test the multiplicative decrease and the Retry-After pause"""
+        limiter = RateLimiter(rate=1000, burst=1000, initial_concurrency=8)
+        await limiter.acquire()
+        limiter.release(MagicMock(status_code=429, headers={"retry-after": "0.05"}))
+        assert limiter.limit == 4
+        assert limiter.stats()["rate_limited"] == 1
+
+        start = time.monotonic()
+        await limiter.acquire()
+        assert time.monotonic() - start >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_success_increases_limit(self):
+        """Test the additive increase after successful calls"""
+        limiter = RateLimiter(rate=1000, burst=1000, initial_concurrency=2, max_concurrency=3)
+        for _ in range(20):
+            await limiter.acquire()
+            limiter.release(MagicMock(status_code=200, headers={}))
+        assert limiter.limit == 3
+
+    @pytest.mark.asyncio
+    async def test_server_errors_do_not_increase_limit(self):
+        """Test that 5xx/529 replies decrease the limit and other errors leave it unchanged"""
+        limiter = RateLimiter(rate=1000, burst=1000, initial_concurrency=8)
+        for status_code, limit in ((529, 4), (503, 2), (400, 2)):
+            await limiter.acquire()
+            limiter.release(MagicMock(status_code=status_code, headers={}))
+            assert limiter.limit == limit
+        assert limiter.stats()["rate_limited"] == 0
+
+    @pytest.mark.asyncio
+    async def test_exhausted_remaining_pauses_queue(self):
+        """Test that x-ratelimit-remaining-requests: 0 pauses until the reset"""
+        limiter = RateLimiter(rate=1000, burst=1000)
+        await limiter.acquire()
+        limiter.release(MagicMock(status_code=200, headers={
+            "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "50ms"
+        }))
+        start = time.monotonic()
+        await limiter.acquire()
+        assert time.monotonic() - start >= 0.04
+
+
+class TestProviderThrottling:
+    @pytest.mark.asyncio
+    async def test_groq_retries_429_through_limiter(self):
+        """Test that Groq (which had no throttling) re-queues a 429 and records it"""
+        responses = iter([
+            httpx.Response(429, headers={"retry-after": "0"}, json={"error": {"message": "Rate limit exceeded"}}),
+            httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(CLEAN_RESPONSE)}}]}),
+        ])
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses))) as client:
+            result = await GroqLLM(client=client).analyze_transaction(TRANSACTION)
+
+        assert result.risk_score == 0.25
+        assert rate_limiters.stats()["groq"]["rate_limited"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
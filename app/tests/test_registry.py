@@ -0,0 +1,98 @@
+"""
+Tests for the lazy LLM provider registry (app/llm/registry.py) and the per-provider API key requirement in app/config.py.
+"""
+import os
+import subprocess
+import sys
+import pytest
+from pydantic import ValidationError
+from unittest.mock import patch, MagicMock
+
+from app.config import Settings, settings
+from app.llm.base import LLM
+from app.llm.registry import ProviderRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeLLM(LLM):
+    name = "groq"
+    created = 0
+
+    def __init__(self):
+        super().__init__()
+        FakeLLM.created += 1
+
+    async def analyze_transaction(self, transaction):
+        raise NotImplementedError
+
+    async def _complete(self, prompt, max_tokens=None):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def registry():
+    FakeLLM.created = 0
+    return ProviderRegistry({"groq": (__name__, "FakeLLM"), "claude": (__name__, "FakeLLM")})
+
+
+class TestProviderRegistry:
+    def test_construction_is_deferred_to_first_use(self, registry):
+        """Test that names can be listed and checked without constructing a provider"""
+        assert "groq" in registry and "openai" not in registry
+        assert list(registry) == ["groq", "claude"]
+        assert FakeLLM.created == 0
+
+        llm = registry["groq"]
+        assert registry["groq"] is llm
+        assert FakeLLM.created == 1
+        assert registry.loaded() == {"groq": llm}
+
+    def test_provider_without_key_is_refused(self, registry):
+        """Test that an unconfigured provider raises ValueError when it is used"""
+        with patch.object(settings, "anthropic_api_key", None), pytest.raises(ValueError) as excinfo:
+            registry["claude"]
+        assert "anthropic_api_key" in str(excinfo.value)
+        with pytest.raises(KeyError):
+            registry["nonexistent"]
+
+    def test_bound_clients_reach_providers_loaded_later(self, registry):
+        """Test that bind_clients injects the pools into loaded and later-loaded providers"""
+        clients = MagicMock()
+        clients.get.side_effect = lambda name: f"pool:{name}"
+        first = registry["groq"]
+        registry.bind_clients(clients)
+        assert first._client == "pool:groq"
+        assert registry["claude"]._client == "pool:claude"
+
+
+class TestRequiredKeys:
+    def test_only_configured_providers_need_a_key(self):
+        """Test that the default provider's key is enough to boot"""
+        config = Settings(_env_file=None, llm_provider="groq", groq_api_key="gsk_test",
+                          openai_api_key=None, anthropic_api_key=None)
+        assert config.configured_providers() == {"groq"}
+
+    def test_missing_key_fails_at_boot(self):
+        """Test that a configured provider without a key is a settings error"""
+        with pytest.raises(ValidationError) as excinfo:
+            Settings(_env_file=None, llm_provider="claude", anthropic_api_key=None)
+        assert "anthropic_api_key" in str(excinfo.value)
+
+    def test_hedge_and_routing_providers_need_keys(self):
+        """Test that hedge and routing targets count as configured providers"""
+        with pytest.raises(ValidationError):
+            Settings(_env_file=None, groq_api_key="gsk_test", openai_api_key=None,
+                     hedge_enabled=True, hedge_provider="openai")
+        with pytest.raises(ValidationError):
+            Settings(_env_file=None, groq_api_key="gsk_test", anthropic_api_key=None,
+                     routing_enabled=True, routing_weights={"claude": 1})
+
+    def test_app_imports_with_one_key_and_loads_no_provider(self, tmp_path):
+        """Test that the app boots with only the groq key and imports no provider module at startup"""
+        env = {k: v for k, v in os.environ.items() if not k.upper().endswith("_API_KEY")}
+        env.update(GROQ_API_KEY="gsk_test", PYTHONPATH=ROOT, LOG_LEVEL="WARNING")
+        code = "import sys, app.main; print(sorted(m for m in sys.modules if m.endswith('_llm')))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == "[]"
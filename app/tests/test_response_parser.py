@@ -0,0 +1,118 @@
+"""
+Tests for the shared LLM response parser (app/llm/response_parser.py) and its use by the providers.
+"""
+import pytest
+import json
+from unittest.mock import patch, AsyncMock
+
+from app.config import settings
+from app.models import Transaction
+from app.llm.response_parser import extract_json, parse_json, parse_analysis, normalize_action
+from app.llm.claude_llm import ClaudeLLM
+from app.utils import metrics
+
+ANSWER = {
+    "risk_score": 0.35,
+    "risk_factors": ["Cross-border {card} use"],
+    "reasoning": "Card issued in \"CA\", customer's first purchase",
+    "recommended_action": "review"
+}
+
+
+class TestExtraction:
+    def test_object_after_think_and_fence(self):
+        """Test that braces inside <think> and text around a fenced answer are skipped"""
+        text = "<think>maybe {not this}</think>\nSure:\n```json\n" + json.dumps(ANSWER) + "\n```\nDone {x}"
+        assert json.loads(extract_json(text)) == ANSWER
+
+    def test_clean_json_is_not_rewritten(self):
+        """Test that strict JSON comes back unchanged and without repairs"""
+        text = json.dumps(ANSWER, indent=2)
+        repairs = []
+        assert extract_json(text, repairs=repairs) == text
+        assert repairs == []
+
+    def test_near_json_is_repaired(self):
+        """Test trailing commas, single quotes, comments and Python literals"""
+        text = """{
+            'risk_score': 0.35, // 0.0-1.0
+            "risk_factors": ['Cross-border {card} use',],  /* factor1, factor2 */
+            "reasoning": 'Card issued in "CA", customer\\'s first purchase',  # why
+            "recommended_action": "review",
+            "escalated": False,
+        }"""
+        repairs = []
+        result = json.loads(extract_json(text, repairs=repairs))
+        assert {k: result[k] for k in ANSWER} == ANSWER
+        assert result["escalated"] is False
+        assert set(repairs) == {"single_quote", "comment", "trailing_comma", "literal"}
+        assert metrics.llm_response_repairs.value("trailing_comma") == 0  # only parse_json records them
+
+    def test_batch_array(self):
+        """Test that an array can be extracted after reasoning that contains brackets"""
+        text = "<think>two items [reasoning]</think>[{'transaction_id': 'tx_1'},]"
+        assert parse_json(text, "[") == [{"transaction_id": "tx_1"}]
+        assert metrics.llm_response_repairs.value("single_quote") == 2
+
+    def test_missing_comma_still_fails(self):
+        """Test that defects that can't be repaired safely raise JSONDecodeError"""
+        with pytest.raises(json.JSONDecodeError) as excinfo:
+            parse_json('{"risk_score": 0.3 "risk_factors": []}')
+        assert "Error decoding JSON" in str(excinfo.value)
+        with pytest.raises(json.JSONDecodeError):
+            parse_json('<think>{"risk_score": 0.3}</think> no answer')
+        with pytest.raises(json.JSONDecodeError):
+            parse_json('{"risk_score": 0.3, "reasoning": "cut off')
+
+
+class TestNormalization:
+    def test_score_is_clamped(self):
+        """Test that an out-of-range score is clamped instead of failing validation"""
+        analysis = parse_analysis(json.dumps({**ANSWER, "risk_score": 1.3}))
+        assert analysis.risk_score == 1.0
+        assert metrics.llm_response_repairs.value("score_clamped") == 1
+
+    @pytest.mark.parametrize("reply", [
+        '{"risk_score": NaN, "risk_factors": [], "reasoning": "r", "recommended_action": "allow"}',
+        '{"risk_score": "nan", "risk_factors": [], "reasoning": "r", "recommended_action": "allow"}',
+    ])
+    def test_nan_score_is_rejected(self, reply):
+        """Test that a NaN score fails instead of reaching the response and the action thresholds"""
+        with pytest.raises(ValueError):
+            parse_analysis(reply)
+        assert metrics.llm_response_repairs.value("score_clamped") == 0
+
+    @pytest.mark.parametrize("action, expected", [
+        ("Allow", "allow"), ("BLOCK.", "block"), ("approve", "allow"), ("manual review", "review"),
+        ("Review manually", "review"), ("declined", "block"), ("wait and see", "wait and see"),
+    ])
+    def test_action_is_normalized(self, action, expected):
+        assert normalize_action(action) == expected
+
+    def test_schema_errors_are_not_hidden(self):
+        """Test that a reply that doesn't fit the model still raises ValueError"""
+        with pytest.raises(ValueError):
+            parse_analysis(json.dumps({**ANSWER, "risk_score": "medium"}))
+        with pytest.raises(ValueError):
+            parse_analysis("[1, 2]")
+
+
+class TestProviders:
+    @patch("app.llm.claude_llm.ClaudeLLM._complete", new_callable=AsyncMock)
+    async def test_slightly_off_reply_is_accepted(self, mock_complete):
+        """Test that a provider returns an analysis for a repairable reply instead of raising"""
+        mock_complete.return_value = "```json\n{'risk_score': 0.9, 'risk_factors': [], 'reasoning': 'r', 'recommended_action': 'Decline',}\n```"
+        transaction = Transaction(
+            transaction_id="tx_parse_01",
+            timestamp="2025-05-07T14:30:45Z",
+            amount=129.99,
+            currency="USD",
+            customer={"id": "cust_1", "country": "US", "ip_address": "192.168.1.1"},
+            payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "US"},
+            merchant={"id": "merch_1", "name": "Example Store", "category": "electronics"},
+        )
+        with patch.object(settings, "streaming_enabled", False):
+            analysis = await ClaudeLLM().analyze_transaction(transaction)
+
+        assert analysis.risk_score == 0.9
+        assert analysis.recommended_action == "block"
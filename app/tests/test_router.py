@@ -0,0 +1,163 @@
+"""
+Unit tests for provider failover with circuit breakers (app/business_logic/provider_router.py).
+"""
+import asyncio
+import pytest
+import random
+from unittest.mock import patch, AsyncMock
+
+from app.config import settings
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.llm.groq_llm import GroqLLM
+from app.business_logic import risk_analyzer
+from app.business_logic.provider_router import CircuitBreaker, ProviderRouter, CLOSED, OPEN, HALF_OPEN
+
+TRANSACTION = Transaction(
+    transaction_id="tx_router_01",
+    timestamp="2025-05-07T14:30:45Z",
+    amount=129.99,
+    currency="USD",
+    customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+)
+
+ANALYSIS = RiskAnalysis(risk_score=0.4, risk_factors=[], reasoning="groq", recommended_action="review")
+
+
+class TestCircuitBreaker:
+    def test_opens_on_errors(self):
+        """Test that the breaker opens once the error rate crosses the threshold"""
+        breaker = CircuitBreaker(error_rate_threshold=0.5, min_requests=3, alpha=0.5)
+        for _ in range(3):
+            breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.available()
+
+    def test_opens_when_too_slow(self):
+        """Test that a slow but working provider is taken out of rotation"""
+        breaker = CircuitBreaker(latency_threshold=1.0, min_requests=3)
+        for _ in range(3):
+            breaker.record_success(5.0)
+        assert breaker.state == OPEN
+
+    def test_half_open_probe(self):
+        """Test that one probe is allowed after the cooldown and closes the breaker on success"""
+        breaker = CircuitBreaker(min_requests=1, open_seconds=10.0, alpha=1.0)
+        breaker.record_failure()
+        opened_at = breaker.opened_at
+
+        assert not breaker.allow_request(now=opened_at + 5)
+        assert breaker.allow_request(now=opened_at + 11)
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow_request(now=opened_at + 11), "only one probe at a time"
+
+        breaker.record_success(0.1)
+        assert breaker.state == CLOSED
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe opens the breaker again"""
+        breaker = CircuitBreaker(min_requests=1, open_seconds=0.0, alpha=1.0)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+
+class TestProviderRouter:
+    def test_weighted_choice_and_failover_order(self):
+        """Test that the first provider is chosen by weight and the rest follow as failover"""
+        router = ProviderRouter(["openai", "claude", "groq"], {"groq": 8, "openai": 2}, rng=random.Random(1))
+        firsts = [router.candidates("groq")[0] for _ in range(1000)]
+        assert 0.7 < firsts.count("groq") / 1000 < 0.9
+        assert set(router.candidates("groq")) == {"groq", "openai"}
+
+    def test_open_provider_is_skipped(self):
+        """Test that an open breaker removes the provider from the candidates"""
+        router = ProviderRouter(["openai", "groq"], {"groq": 1, "openai": 1})
+        router.breakers["openai"].state = OPEN
+        router.breakers["openai"].opened_at = float("inf")
+        assert router.candidates("openai") == ["groq"]
+
+    @pytest.mark.asyncio
+    async def test_failover_to_healthy_provider(self):
+        """Test that a failing provider does not fail the request when another is healthy"""
+        with patch.object(settings, "routing_enabled", True), \
+             patch.object(risk_analyzer.provider_router, "weights", {"openai": 1000, "groq": 1}), \
+             patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_openai, \
+             patch.object(GroqLLM, "analyze_transaction", new_callable=AsyncMock) as mock_groq:
+            mock_openai.side_effect = Exception("openai brownout")
+            mock_groq.return_value = ANALYSIS
+
+            for _ in range(settings.breaker_min_requests):
+                result = await risk_analyzer.provider_router.call(TRANSACTION, "openai", risk_analyzer.provider_call)
+                assert result.reasoning == "groq"
+
+            #openai's breaker is now open, traffic goes straight to groq
+            calls_before = mock_openai.call_count
+            result = await risk_analyzer.analyze_transaction(TRANSACTION, "openai")
+
+        assert result.reasoning == "groq"
+        assert mock_openai.call_count == calls_before
+        assert risk_analyzer.provider_router.breakers["openai"].state == OPEN
+
+    @pytest.mark.asyncio
+    async def test_all_providers_down(self):
+        """Test that an error is raised when no provider is available"""
+        router = ProviderRouter(["openai"], {})
+        router.breakers["openai"].state = OPEN
+        router.breakers["openai"].opened_at = float("inf")
+        with pytest.raises(RuntimeError):
+            await router.call(TRANSACTION, "openai", AsyncMock())
+
+    @pytest.mark.asyncio
+    async def test_cancelled_probe_is_released(self):
+        """Test that cancelling the half-open probe (hedge loser, client gone) lets the next call probe"""
+        router = ProviderRouter(["openai"], {})
+        breaker = router.breakers["openai"]
+        breaker.state = OPEN
+        breaker.opened_at = -float("inf")
+
+        async def hang(transaction, name):
+            await asyncio.sleep(10)
+
+        probe = asyncio.create_task(router.call(TRANSACTION, "openai", hang))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN and breaker.probe_in_flight
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert not breaker.probe_in_flight
+        assert breaker.available()
+
+    @pytest.mark.asyncio
+    async def test_probe_that_loses_the_hedge_is_released(self):
+        """Test that a half-open primary cancelled by a winning hedge can be probed again"""
+        async def slow(self, transaction):
+            await asyncio.sleep(1.0)
+
+        breaker = risk_analyzer.provider_router.breakers["openai"]
+        with patch.object(settings, "routing_enabled", True), \
+             patch.object(settings, "hedge_enabled", True), \
+             patch.object(settings, "hedge_provider", "groq"), \
+             patch.object(settings, "hedge_default_delay", 0.01), \
+             patch.object(settings, "hedge_min_delay", 0.01), \
+             patch.object(risk_analyzer.provider_router, "weights", {"openai": 1}), \
+             patch.object(breaker, "state", OPEN), \
+             patch.object(breaker, "opened_at", -float("inf")), \
+             patch.object(OpenAILLM, "analyze_transaction", slow), \
+             patch.object(GroqLLM, "analyze_transaction", new_callable=AsyncMock) as mock_groq:
+            mock_groq.return_value = ANALYSIS
+            result = await risk_analyzer.provider_router.call(TRANSACTION, "openai", risk_analyzer.provider_call)
+            await asyncio.sleep(0)
+
+            assert result.reasoning == "groq"
+            assert breaker.state == HALF_OPEN
+            assert not breaker.probe_in_flight
+            assert breaker.available()
+
+
+if __name__ == "__main__":
+    pytest.main()
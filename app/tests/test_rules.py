@@ -0,0 +1,109 @@
+"""
+Unit tests for the rule pre-screen (app/business_logic/rules.py) and its place in front of the LLM.
+"""
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from app.config import Settings
+from app.models import Transaction, RiskAnalysis
+from app.llm.openai_llm import OpenAILLM
+from app.business_logic.rules import RuleEngine, rule_engine
+from app.business_logic.risk_analyzer import analyze_transaction
+
+def make_transaction(amount=49.99, country="US", card_country="US", currency="USD"):
+    return Transaction(
+        transaction_id="tx_rules_01",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency=currency,
+        customer={"id": "cust_98765zyxwv", "country": country, "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": card_country},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+
+class TestRuleEngine:
+    def test_small_domestic_purchase_is_allowed(self):
+        """Test that a small domestic purchase is allowed without the LLM"""
+        result = rule_engine.prescreen(make_transaction())
+        assert result is not None
+        assert result.recommended_action == "allow"
+        assert result.risk_score < 0.3
+
+    def test_high_risk_combination_is_blocked(self):
+        """Test that a large cross-border payment with a high-risk card is blocked"""
+        result = rule_engine.prescreen(make_transaction(amount=4999.99, card_country="RU"))
+        assert result is not None
+        assert result.recommended_action == "block"
+        assert result.risk_score >= 0.9
+        assert any("RU" in factor for factor in result.risk_factors)
+
+    def test_ambiguous_transaction_goes_to_llm(self):
+        """Test that the middle band is left for the LLM"""
+        assert rule_engine.prescreen(make_transaction(card_country="CA")) is None
+        assert rule_engine.prescreen(make_transaction(amount=600.0)) is None
+
+    def test_country_codes_are_case_insensitive(self):
+        """Test that lowercase country codes are matched"""
+        score, factors = rule_engine.evaluate(make_transaction(country="us", card_country="US"))
+        assert score == 0.0 and factors == []
+
+    def test_rules_are_configurable(self):
+        """Test that thresholds and weights come from the settings"""
+        cfg = Settings(prescreen_allow_max_amount=10.0, prescreen_rule_weights={"above_allow_amount": 0.1})
+        engine = RuleEngine(cfg)
+        assert len(engine.rules) == 1
+        assert engine.prescreen(make_transaction(amount=49.99)) is None
+        assert engine.prescreen(make_transaction(amount=5.0)).recommended_action == "allow"
+
+    def test_amount_bands_account_for_currency(self):
+        """Test that amounts are compared in the thresholds' currency"""
+        assert rule_engine.prescreen(make_transaction(amount=10000, currency="JPY")).recommended_action == "allow"
+        score, factors = rule_engine.evaluate(make_transaction(amount=10000, currency="USD"))
+        assert any("Unusually large" in factor for factor in factors)
+        score, factors = rule_engine.evaluate(make_transaction(amount=10000, currency="jpy"))
+        assert factors == []
+
+    def test_unknown_currency_is_not_a_small_purchase(self):
+        """Test that a currency without a rate goes past the allow band but does not count as a large amount"""
+        score, factors = rule_engine.evaluate(make_transaction(amount=5, currency="XYZ"))
+        assert factors == ["Amount 5.00 XYZ above the small purchase band"]
+
+    def test_lookups_run_once_per_transaction(self):
+        """Test that rules and their descriptions share one geoip, velocity and baseline lookup"""
+        cfg = Settings(velocity_limits={"card_1m": 0}, baseline_z_threshold=-100.0, prescreen_rule_weights={
+            "high_risk_country": 0.5, "ip_country_mismatch": 0.2, "high_velocity": 0.3, "amount_anomaly": 0.2})
+        engine = RuleEngine(cfg)
+        baseline = {"amount_z": 0.0, "customer_mean": 40.0, "category_percentile": None}
+        with patch("app.business_logic.rules.geoip.country", return_value="RU") as mock_country, \
+             patch("app.business_logic.rules.feature_store.exceeded", return_value=["4 transactions"]) as mock_exceeded, \
+             patch("app.business_logic.rules.baseline_store.features", return_value=baseline) as mock_baseline:
+            score, factors = engine.evaluate(make_transaction())
+
+        assert len(factors) == 4
+        assert (mock_country.call_count, mock_exceeded.call_count, mock_baseline.call_count) == (1, 1, 1)
+
+
+class TestPrescreenStage:
+    @pytest.mark.asyncio
+    async def test_clear_cut_transaction_skips_llm(self):
+        """Test that the analyzer returns the pre-screen decision without calling the LLM"""
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze:
+            result = await analyze_transaction(make_transaction(), "openai")
+            assert not mock_analyze.called
+            assert result.recommended_action == "allow"
+
+    @pytest.mark.asyncio
+    async def test_prescreen_can_be_disabled(self):
+        """Test that every transaction reaches the LLM when the pre-screen is off"""
+        with patch.object(OpenAILLM, "analyze_transaction", new_callable=AsyncMock) as mock_analyze, \
+             patch("app.business_logic.risk_analyzer.settings.prescreen_enabled", False):
+            mock_analyze.return_value = RiskAnalysis(
+                risk_score=0.1, risk_factors=[], reasoning="ok", recommended_action="allow"
+            )
+            await analyze_transaction(make_transaction(), "openai")
+            assert mock_analyze.called
+
+
+if __name__ == "__main__":
+    pytest.main()
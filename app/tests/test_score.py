@@ -0,0 +1,170 @@
+"""
+Tests for the offline bulk scoring CLI (app/score.py).
+"""
+import asyncio
+import io
+import json
+from unittest.mock import patch, AsyncMock
+
+from app.models import RiskAnalysis
+from app.business_logic import risk_analyzer
+from app.business_logic.feature_store import feature_store
+from app.score import BulkScorer, Checkpoint, main, score_file
+
+SAMPLE_RISK_ANALYSIS = RiskAnalysis(
+    risk_score=0.2,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Minor geographic mismatch",
+    recommended_action="allow"
+)
+
+def make_transaction(transaction_id):
+    return {
+        "transaction_id": transaction_id,
+        "timestamp": "2025-05-07T14:30:45Z",
+        "amount": 129.99,
+        "currency": "USD",
+        "customer": {"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        "payment_method": {"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        "merchant": {"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"}
+    }
+
+def write_input(path, lines):
+    path.write_text("".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines))
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def make_scorer(tmp_path, **kwargs):
+    kwargs.setdefault("progress", io.StringIO())
+    return BulkScorer(str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), "openai", **kwargs)
+
+
+class TestBulkScorer:
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_scores_every_line(self, mock_analyze, tmp_path):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        write_input(tmp_path / "in.ndjson", [
+            make_transaction("txn_1"), "{not json", "", {"transaction_id": "txn_bad"}, make_transaction("txn_2"),
+        ])
+
+        summary = await make_scorer(tmp_path).run()
+
+        results = {r["line"]: r for r in read_output(tmp_path / "out.ndjson")}
+        assert sorted(results) == [0, 1, 3, 4]  # blank line has no result
+        assert results[0]["status"] == "ok" and results[0]["analysis"]["risk_score"] == 0.2
+        assert results[1]["status"] == "error" and "Invalid JSON" in results[1]["error"]
+        assert results[3]["status"] == "error" and results[3]["transaction_id"] == "txn_bad"
+        assert results[4]["transaction_id"] == "txn_2"
+        assert mock_analyze.call_count == 2
+        assert summary["scored"] == 4 and summary["failed"] == 2
+        assert summary["checkpoint_line"] == 5
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_llm_failure_is_reported_per_line(self, mock_analyze, tmp_path):
+        mock_analyze.side_effect = [Exception("LLM down"), SAMPLE_RISK_ANALYSIS]
+        write_input(tmp_path / "in.ndjson", [make_transaction("txn_1"), make_transaction("txn_2")])
+
+        await make_scorer(tmp_path, concurrency=1).run()
+
+        results = read_output(tmp_path / "out.ndjson")
+        assert results[0]["status"] == "error" and "LLM down" in results[0]["error"]
+        assert results[1]["status"] == "ok"
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_invalid_utf8_is_reported_per_line(self, mock_analyze, tmp_path):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        lines = [json.dumps(make_transaction(f"txn_{index}")).encode() for index in range(2)]
+        (tmp_path / "in.ndjson").write_bytes(lines[0] + b"\n" + b'{"transaction_id": "\xff\xfe"}\n' + lines[1] + b"\n")
+
+        summary = await make_scorer(tmp_path).run()
+
+        results = {r["line"]: r for r in read_output(tmp_path / "out.ndjson")}
+        assert results[1]["status"] == "error" and "Invalid UTF-8" in results[1]["error"]
+        assert results[0]["status"] == results[2]["status"] == "ok"
+        assert summary["failed"] == 1 and summary["checkpoint_line"] == 3
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_concurrency_is_bounded(self, mock_analyze, tmp_path):
+        in_flight = peak = 0
+
+        async def slow_analyze(transaction, provider):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return SAMPLE_RISK_ANALYSIS
+
+        mock_analyze.side_effect = slow_analyze
+        write_input(tmp_path / "in.ndjson", [make_transaction(f"txn_{i}") for i in range(20)])
+
+        await make_scorer(tmp_path, concurrency=3).run()
+
+        assert peak == 3
+        assert len(read_output(tmp_path / "out.ndjson")) == 20
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_resumes_from_checkpoint(self, mock_analyze, tmp_path):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        lines = [make_transaction(f"txn_{i}") for i in range(6)]
+        write_input(tmp_path / "in.ndjson", lines)
+
+        #a crashed run: lines 0-1 checkpointed, line 3 finished after the checkpoint, line 4 cut off mid-write
+        done = [{"line": i, "transaction_id": f"txn_{i}", "status": "ok"} for i in (0, 1)]
+        head = "".join(json.dumps(r) + "\n" for r in done)
+        (tmp_path / "out.ndjson").write_text(head + json.dumps({"line": 3, "status": "ok"}) + "\n" + '{"line": 4, "sta')
+        checkpoint = Checkpoint(str(tmp_path / "out.ndjson.checkpoint"))
+        checkpoint.line = 2
+        checkpoint.offset = sum(len(json.dumps(t)) + 1 for t in lines[:2])
+        checkpoint.output_size = len(head)
+        checkpoint.save()
+
+        summary = await make_scorer(tmp_path).run()
+
+        scored = sorted(call.args[0].transaction_id for call in mock_analyze.call_args_list)
+        assert scored == ["txn_2", "txn_4", "txn_5"]
+        assert sorted(r["line"] for r in read_output(tmp_path / "out.ndjson")) == [0, 1, 2, 3, 4, 5]
+        assert summary["skipped"] == 1
+        assert summary["checkpoint_line"] == 6
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    async def test_rerun_after_completion_scores_nothing(self, mock_analyze, tmp_path):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        write_input(tmp_path / "in.ndjson", [make_transaction(f"txn_{i}") for i in range(4)])
+
+        await make_scorer(tmp_path, checkpoint_every=1).run()
+        await make_scorer(tmp_path).run()
+
+        assert mock_analyze.call_count == 4
+        assert len(read_output(tmp_path / "out.ndjson")) == 4
+
+    async def test_backfill_velocity_uses_transaction_timestamps(self, tmp_path):
+        """Test that historical transactions a day apart don't look like a burst because they are read quickly"""
+        alerts = []
+
+        async def decide(transaction, llm_name):
+            alerts.extend(feature_store.exceeded(transaction, {"card_1m": 3, "customer_1h": 10}))
+            return SAMPLE_RISK_ANALYSIS
+
+        write_input(tmp_path / "in.ndjson", [
+            {**make_transaction(f"txn_{day}"), "timestamp": f"2025-05-{day:02d}T14:30:45Z"} for day in range(1, 13)
+        ])
+        with patch.object(risk_analyzer, "decide", side_effect=decide):
+            summary = await score_file(make_scorer(tmp_path, concurrency=1))
+
+        assert summary["scored"] == 12 and summary["failed"] == 0
+        assert alerts == []
+        assert feature_store.event_time is False
+
+    @patch("app.business_logic.risk_analyzer.analyze_transaction", new_callable=AsyncMock)
+    def test_cli_restart_ignores_checkpoint(self, mock_analyze, tmp_path):
+        mock_analyze.return_value = SAMPLE_RISK_ANALYSIS
+        write_input(tmp_path / "in.ndjson", [make_transaction("txn_1")])
+        args = [str(tmp_path / "in.ndjson"), str(tmp_path / "out.ndjson"), "--provider", "openai"]
+
+        main(args)
+        main(args + ["--restart"])
+
+        assert mock_analyze.call_count == 2
+        assert len(read_output(tmp_path / "out.ndjson")) == 1
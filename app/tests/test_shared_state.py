@@ -0,0 +1,180 @@
+"""
+Tests for the cross-worker shared state (app/utils/shared_state.py): the same behaviour from the in-memory,
+SQLite-WAL and Redis-protocol backends, the latter against the local stand-in server in benchmarks/fake_redis.py.
+"""
+import asyncio
+import sqlite3
+import time
+import pytest
+
+from app.models import Transaction, RiskAnalysis
+from app.business_logic.analysis_cache import AnalysisCache, make_key_builder
+from app.utils.shared_state import MemoryState, SQLiteState, RedisState, RedisError, make_shared_state
+from benchmarks.fake_redis import FakeRedis
+
+TRANSACTION = Transaction(
+    transaction_id="tx_shared_01",
+    timestamp="2025-05-07T14:30:45Z",
+    amount=129.99,
+    currency="USD",
+    customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+    payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+    merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+)
+
+ANALYSIS = RiskAnalysis(
+    risk_score=0.3,
+    risk_factors=["Cross-border transaction"],
+    reasoning="Minor geographic mismatch",
+    recommended_action="allow",
+)
+
+
+@pytest.fixture
+async def redis_server():
+    server = FakeRedis()
+    port = await server.start()
+    server.url = f"redis://127.0.0.1:{port}/0"
+    yield server
+    await server.stop()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+async def state(request, tmp_path, redis_server):
+    if request.param == "memory":
+        backend = MemoryState()
+    elif request.param == "sqlite":
+        backend = SQLiteState(str(tmp_path / "state.db"))
+    else:
+        backend = RedisState.from_url(redis_server.url, prefix="test:")
+    yield backend
+    await backend.aclose()
+
+
+class TestSharedStateBackends:
+    async def test_set_get_delete(self, state):
+        """Test the basic key/value operations"""
+        assert await state.get("k") is None
+        await state.set("k", "v1")
+        await state.set("k", "v2")
+        assert await state.get("k") == "v2"
+        await state.delete("k")
+        assert await state.get("k") is None
+
+    async def test_ttl_expires_keys(self, state):
+        """Test that keys disappear after their ttl and that add treats them as absent"""
+        await state.set("short", "v", ttl=0.05)
+        assert await state.add("nx", "first", ttl=0.05) is True
+        assert await state.add("nx", "second") is False
+        await asyncio.sleep(0.1)
+        assert await state.get("short") is None
+        assert await state.add("nx", "third") is True
+        assert await state.get("nx") == "third"
+
+    async def test_incr_is_atomic_and_keeps_the_first_ttl(self, state):
+        """Test that concurrent increments are all counted and the ttl is only set on creation"""
+        results = await asyncio.gather(*(state.incr("counter", ttl=0.2) for _ in range(40)))
+        assert sorted(results) == list(range(1, 41))
+        assert await state.incr("counter", 10) == 50
+        await asyncio.sleep(0.25)
+        assert await state.incr("counter", ttl=0.2) == 1
+
+    async def test_clear(self, state):
+        await state.set("a", "1")
+        await state.incr("b")
+        await state.clear()
+        assert await state.get("a") is None and await state.get("b") is None
+
+
+class TestBackendSpecifics:
+    async def test_sqlite_file_is_shared_between_connections(self, tmp_path):
+        """Test that two workers opening the same file see each other's writes and count together"""
+        path = str(tmp_path / "state.db")
+        first, second = SQLiteState(path), SQLiteState(path)
+        await first.set("k", "from first")
+        assert await second.get("k") == "from first"
+        await asyncio.gather(*(state.incr("hits") for _ in range(25) for state in (first, second)))
+        assert await first.get("hits") == "50"
+        first.close()
+        second.close()
+
+    async def test_sqlite_read_does_not_wait_for_a_blocked_writer(self, tmp_path):
+        """Test that get stays fast while a write waits for another process's write lock"""
+        path = str(tmp_path / "state.db")
+        state = SQLiteState(path, busy_timeout=2.0)
+        await state.set("k", "v")
+        other_process = sqlite3.connect(path)
+        other_process.execute("BEGIN IMMEDIATE")
+
+        writing = asyncio.create_task(state.set("k2", "v2"))
+        await asyncio.sleep(0.1)  # the writer thread now holds the lock and waits on busy_timeout
+        start = time.perf_counter()
+        assert await state.get("k") == "v"
+        assert time.perf_counter() - start < 0.5
+
+        other_process.rollback()
+        await writing
+        assert await state.get("k2") == "v2"
+        other_process.close()
+        state.close()
+
+    async def test_redis_prefix_auth_and_db(self):
+        """Test AUTH from the URL, and that clear only removes keys under the store's prefix"""
+        server = FakeRedis(password="s3cret")
+        port = await server.start()
+        ours = RedisState.from_url(f"redis://:s3cret@127.0.0.1:{port}/2", prefix="risk:")
+        other = RedisState.from_url(f"redis://:s3cret@127.0.0.1:{port}/2", prefix="other:")
+        await ours.set("k", "ours")
+        await other.set("k", "theirs")
+        await ours.clear()
+        assert await ours.get("k") is None
+        assert await other.get("k") == "theirs"
+        assert b"risk:k" not in server.data and b"other:k" in server.data
+
+        with pytest.raises(RedisError):
+            await RedisState.from_url(f"redis://:wrong@127.0.0.1:{port}/0").get("k")
+        await ours.aclose()
+        await other.aclose()
+        await server.stop()
+
+    async def test_redis_pipelines_incr_with_expiry(self, redis_server):
+        """Test that incr with a ttl costs one connection and sets the expiry"""
+        state = RedisState.from_url(redis_server.url)
+        await state.incr("velocity", ttl=60)
+        assert 0 < await state._command("PTTL", "velocity") <= 60000
+        assert redis_server.connections == 1
+        await state.aclose()
+
+    def test_factory(self, tmp_path):
+        assert isinstance(make_shared_state("memory"), MemoryState)
+        assert isinstance(make_shared_state(f"sqlite:///{tmp_path}/s.db"), SQLiteState)
+        redis = make_shared_state("redis://cache.internal:6380/1", prefix="risk:")
+        assert (redis.host, redis.port, redis.db, redis.prefix) == ("cache.internal", 6380, 1, "risk:")
+        with pytest.raises(ValueError):
+            make_shared_state("memcached://localhost")
+
+
+class TestSharedAnalysisCache:
+    def make_cache(self, shared):
+        return AnalysisCache(ttl=60, max_entries=100, key_builder=make_key_builder(["customer.id"], 10.0), disk=shared)
+
+    async def test_workers_share_cached_verdicts(self, redis_server):
+        """Test that a verdict cached by one worker is a hit in another"""
+        worker_1 = self.make_cache(RedisState.from_url(redis_server.url, prefix="risk:"))
+        worker_2 = self.make_cache(RedisState.from_url(redis_server.url, prefix="risk:"))
+
+        await worker_1.set(TRANSACTION, "groq", ANALYSIS)
+        assert await worker_2.get(TRANSACTION, "groq") == ANALYSIS
+        assert worker_2.stats()["disk_hits"] == 1
+        assert await worker_2.get(TRANSACTION, "groq") == ANALYSIS
+        assert worker_2.stats()["hits"] == 1  # now served from its own LRU
+        await worker_1.disk.aclose()
+        await worker_2.disk.aclose()
+
+    async def test_unavailable_tier_is_a_miss(self):
+        """Test that a shared tier that can't be reached doesn't fail the lookup"""
+        cache = self.make_cache(RedisState("127.0.0.1", 1, timeout=0.5))
+        await cache.set(TRANSACTION, "groq", ANALYSIS)
+        cache.clear()
+        assert await cache.get(TRANSACTION, "groq") is None
+        assert cache.stats()["misses"] == 1
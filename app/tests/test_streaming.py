@@ -0,0 +1,156 @@
+"""
+Tests for streaming completions: the incremental parser and SSE decoding in app/llm/streaming.py
+and the early-closing stream in app/llm/base.py.
+"""
+import pytest
+import json
+import httpx
+from unittest.mock import patch
+
+from app.config import settings
+from app.models import Transaction
+from app.llm.streaming import IncrementalJSONParser, iter_sse, stream_stats
+from app.llm.openai_llm import OpenAILLM
+from app.llm.claude_llm import ClaudeLLM
+from app.llm.groq_llm import GroqLLM
+
+ANSWER = {
+    "risk_score": 0.35,
+    "risk_factors": ["Cross-border {card} use"],
+    "reasoning": "Card issued in \"CA\", customer in US",
+    "recommended_action": "review"
+}
+
+def make_transaction():
+    return Transaction(
+        transaction_id="tx_stream_01",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=129.99,
+        currency="USD",
+        customer={"id": "cust_98765zyxwv", "country": "US", "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": "CA"},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def openai_events(pieces):
+    for piece in pieces:
+        yield "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+def claude_events(pieces):
+    yield "event: message_start\ndata: " + json.dumps({"type": "message_start"}) + "\n\n"
+    for piece in pieces:
+        yield "event: content_block_delta\ndata: " + json.dumps(
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": piece}}) + "\n\n"
+    yield "event: message_stop\ndata: " + json.dumps({"type": "message_stop"}) + "\n\n"
+
+def streaming_client(events, sent, status_code=200):
+    """Client whose responses stream the given SSE events, recording how many were pulled by the reader"""
+    async def body():
+        for event in events():
+            sent.append(event)
+            yield event.encode()
+
+    def handler(request: httpx.Request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(status_code, headers={"content-type": "text/event-stream"}, content=body())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestIncrementalJSONParser:
+    @pytest.mark.parametrize("size", [1, 3, 7, 64, 10_000])
+    def test_assembles_object_across_chunks(self, size):
+        """Test that the object is found regardless of how the text is split, skipping <think> blocks"""
+        text = "<think>maybe {not this} </thi nk> still thinking</think>\n```json\n" + json.dumps(ANSWER) + "\n```"
+        parser = IncrementalJSONParser()
+        results = [parser.feed(piece) for piece in chunked(text, size)]
+        completed = [r for r in results if r is not None]
+        assert json.loads(completed[0]) == ANSWER
+        assert parser.skipped_chars > 0
+
+    def test_returns_at_closing_brace(self):
+        """Test that the object is reported as soon as it is complete"""
+        parser = IncrementalJSONParser()
+        assert parser.feed('<reasoning>x</reasoning>{"risk_score": 0.1, "nested": {"a": "}"}') is None
+        assert parser.feed("}") == '{"risk_score": 0.1, "nested": {"a": "}"}}'
+        assert parser.done
+
+    def test_incomplete_object(self):
+        """Test that a truncated reply never yields a result"""
+        parser = IncrementalJSONParser()
+        assert parser.feed('<think>long') is None
+        assert parser.feed('</think>{"risk_score": 0.') is None
+        assert not parser.done
+
+
+class TestSSE:
+    @pytest.mark.asyncio
+    async def test_decodes_data_fields(self):
+        """Test that data fields are decoded per event and [DONE] ends the stream"""
+        async def lines():
+            for line in [": keep-alive", "event: delta", 'data: {"a":', 'data: 1}', "", 'data: {"b": 2}', "", "data: [DONE]", "", 'data: {"c": 3}', ""]:
+                yield line
+
+        assert [event async for event in iter_sse(lines())] == [{"a": 1}, {"b": 2}]
+
+
+class TestStreamingProviders:
+    @pytest.mark.asyncio
+    async def test_groq_stream_closes_early(self):
+        """Test that the Groq stream stops reading once the answer is complete"""
+        stream_stats.clear()
+        sent = []
+        text = "<think>" + "reasoning " * 200 + "</think>" + json.dumps(ANSWER) + "trailing text " * 50
+        pieces = chunked(text, 16)
+        client = streaming_client(lambda: openai_events(pieces), sent)
+
+        with patch.object(settings, "streaming_enabled", True):
+            result = await GroqLLM(client=client).analyze_transaction(make_transaction())
+        await client.aclose()
+
+        assert result.risk_score == 0.35
+        assert len(sent) < len(pieces)
+        stats = stream_stats["groq"].stats()
+        assert stats["streams"] == 1 and stats["early_closes"] == 1
+        assert stats["skipped_reasoning_chars"] >= 2000
+        assert stats["avg_time_to_decision_ms"] <= stats["avg_total_generation_ms"]
+
+    @pytest.mark.asyncio
+    async def test_claude_stream(self):
+        """Test the Anthropic content_block_delta event format"""
+        stream_stats.clear()
+        sent = []
+        client = streaming_client(lambda: claude_events(chunked(json.dumps(ANSWER), 5)), sent)
+
+        with patch.object(settings, "streaming_enabled", True):
+            result = await ClaudeLLM(client=client).analyze_transaction(make_transaction())
+        await client.aclose()
+
+        assert result.recommended_action == "review"
+        assert stream_stats["claude"].streams == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_without_object(self):
+        """Test that a stream without a JSON object raises JSONDecodeError"""
+        client = streaming_client(lambda: openai_events(["no ", "answer"]), [])
+
+        with patch.object(settings, "streaming_enabled", True), pytest.raises(json.JSONDecodeError):
+            await OpenAILLM(client=client).analyze_transaction(make_transaction())
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_http_error(self):
+        """Test that an error status is raised before any parsing"""
+        client = streaming_client(lambda: iter(['{"error": "boom"}']), [], status_code=500)
+
+        with patch.object(settings, "streaming_enabled", True), pytest.raises(httpx.HTTPStatusError):
+            await OpenAILLM(client=client).analyze_transaction(make_transaction())
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -341,7 +341,7 @@ class TestAPINotifier:
         risk_analysis = RiskAnalysis(**HIGH_RISK_ANALYSIS)
         
         with patch("httpx.AsyncClient.post", new_callable=AsyncMock) as mock_post, \
-             patch("builtins.print") as mock_print:
+             patch("app.business_logic.api_notifier.logger") as mock_logger:
             
             # Simulate HTTP error
             mock_post.side_effect = httpx.HTTPStatusError(
@@ -354,8 +354,8 @@ class TestAPINotifier:
             await notify_api(transaction, risk_analysis)
             
             # Verify error was logged
-            assert mock_print.called
-            assert "HTTP error occurred" in mock_print.call_args[0][0]
+            assert mock_logger.error.called
+            assert "HTTP error occurred" in mock_logger.error.call_args[0][0]
 
 
 class TestEndToEndFlow:
@@ -0,0 +1,270 @@
+#Offline IP geolocation: IP range -> country / ASN from a local index file, memory-mapped so the OS pages it in
+#on demand and the process only holds the mapping, not a copy.
+#Ranges are stored as sorted integer columns and looked up with a binary search (bisect over a typed memoryview),
+#narrowed first by a table of where each 16-bit address prefix begins so only a few entries are searched.
+#
+#File layout (little endian, every column 8-byte aligned):
+#  header   "GEOIPIX1" | u32 ipv4 ranges | u32 ipv6 ranges
+#  ipv4     u32 starts[n] | u32 ends[n] | u32 asns[n] | 2-byte country codes[n] | u32 prefix table[65537]
+#  ipv6     u64 starts[n] | u64 ends[n] | u32 asns[n] | 2-byte country codes[n] | u32 prefix table[65537]
+#IPv6 ranges are indexed by their upper 64 bits (the /64 prefix), which is the finest granularity geo data uses.
+#
+#Build an index from a CSV of "first_ip,last_ip,country,asn" or "cidr,country,asn" rows:
+#  python -m app.utils.geoip build ranges.csv geoip.idx
+
+import bisect
+import csv
+import ipaddress
+import mmap
+import socket
+import struct
+import sys
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+from app.config import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GEOIPIX1"
+_HEADER = struct.Struct("<8sII")
+_MAPPED_V4_PREFIX = b"\x00" * 10 + b"\xff\xff"
+_PREFIX_BITS = 16
+_PREFIXES = (1 << _PREFIX_BITS) + 1
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+_U32 = struct.Struct(">I").unpack
+_U64 = struct.Struct(">Q").unpack_from
+_inet_pton = socket.inet_pton
+
+
+def parse_ip(ip: str) -> Optional[Tuple[int, int]]:
+    """
+    (4, 32-bit value) or (6, upper 64 bits) for an address string, None if it isn't one.
+    IPv4-mapped IPv6 addresses are looked up as IPv4.
+    """
+    try:
+        if ":" not in ip:
+            return 4, _U32(_inet_pton(socket.AF_INET, ip))[0]
+        packed = _inet_pton(socket.AF_INET6, ip.split("%", 1)[0])
+    except (OSError, ValueError, TypeError):
+        return None
+    if packed[:12] == _MAPPED_V4_PREFIX:
+        return 4, _U32(packed[12:])[0]
+    return 6, _U64(packed)[0]
+
+
+class GeoIPIndex:
+    """
+    Read-only view over an index file. Lookups do no allocation besides the result.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"GeoIP index {path} is empty")
+        view = memoryview(self._mmap)
+        magic, n4, n6 = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            view.release()
+            self.close()
+            raise ValueError(f"{path} is not a GeoIP index")
+        self.ipv4_ranges, self.ipv6_ranges = n4, n6
+        self._country_names = {}
+        offset = _pad(_HEADER.size)
+        self._v4, offset = self._columns(view, offset, n4, "I", 4)
+        self._v6, offset = self._columns(view, offset, n6, "Q", 8)
+        self._view = view
+
+    @staticmethod
+    def _columns(view: memoryview, offset: int, n: int, fmt: str, width: int):
+        columns = []
+        for col_fmt, col_width in ((fmt, width), (fmt, width), ("I", 4)):
+            columns.append(view[offset:offset + n * col_width].cast(col_fmt))
+            offset = _pad(offset + n * col_width)
+        columns.append(view[offset:offset + 2 * n].cast("H"))  # two ASCII letters, read as one integer
+        offset = _pad(offset + 2 * n)
+        columns.append(view[offset:offset + 4 * _PREFIXES].cast("I"))
+        return tuple(columns), _pad(offset + 4 * _PREFIXES)
+
+    def lookup(self, ip: str) -> Optional[Tuple[str, int]]:
+        """
+        (country, asn) of the range containing ip, None if unknown.
+        """
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return None
+        version, key = parsed
+        if version == 4:
+            starts, ends, asns, countries, prefixes = self._v4
+            prefix = key >> (32 - _PREFIX_BITS)
+        else:
+            starts, ends, asns, countries, prefixes = self._v6
+            prefix = key >> (64 - _PREFIX_BITS)
+        #a range covering key starts inside key's prefix block or is the last one before it
+        i = bisect.bisect_right(starts, key, prefixes[prefix], prefixes[prefix + 1]) - 1
+        if i < 0 or key > ends[i]:
+            return None
+        code = countries[i]
+        name = self._country_names.get(code)
+        if name is None:
+            name = self._country_names[code] = code.to_bytes(2, "little").decode("ascii")
+        return name, asns[i]
+
+    def country(self, ip: str) -> Optional[str]:
+        result = self.lookup(ip)
+        return result[0] if result else None
+
+    def close(self):
+        for columns in (getattr(self, "_v4", ()), getattr(self, "_v6", ())):
+            for column in columns:
+                column.release()
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+        if getattr(self, "_mmap", None) is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+Range = Tuple[int, int, int, str, int]  # (version, first, last, country, asn)
+
+
+def parse_row(row: List[str]) -> Range:
+    """
+    ["first_ip", "last_ip", "CC", "asn"] or ["cidr", "CC", "asn"] -> (version, first, last, country, asn).
+    """
+    if len(row) >= 4:
+        first, last = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+        country, asn = row[2], row[3]
+    else:
+        network = ipaddress.ip_network(row[0].strip(), strict=False)
+        first, last = network[0], network[-1]
+        country, asn = row[1], row[2] if len(row) > 2 else "0"
+    if first.version != last.version or int(first) > int(last):
+        raise ValueError(f"Invalid range {row}")
+    country = country.strip().upper()
+    if len(country) != 2 or not country.isascii():
+        raise ValueError(f"Invalid country code {country!r}")
+    return first.version, int(first), int(last), country, int(asn.strip().upper().lstrip("AS") or 0)
+
+
+def build_index(ranges: Iterable[Range], path: str) -> Tuple[int, int]:
+    """
+    Write an index file from (version, first, last, country, asn) ranges. Overlapping ranges are rejected.
+    Returns the number of IPv4 and IPv6 ranges written.
+    """
+    v4, v6 = [], []
+    for version, first, last, country, asn in ranges:
+        if version == 4:
+            v4.append((first, last, country, asn))
+        else:
+            v6.append((first >> 64, last >> 64, country, asn))
+    out = bytearray(_HEADER.pack(MAGIC, len(v4), len(v6)))
+    for rows, fmt, bits in ((v4, "I", 32), (v6, "Q", 64)):
+        rows.sort()
+        for prev, cur in zip(rows, rows[1:]):
+            if cur[0] <= prev[1]:
+                raise ValueError(f"Overlapping ranges starting at {prev[0]} and {cur[0]}")
+        for column in (
+            [r[0] for r in rows],
+            [r[1] for r in rows],
+        ):
+            out += b"\x00" * (_pad(len(out)) - len(out))
+            out += struct.pack(f"<{len(rows)}{fmt}", *column)
+        out += b"\x00" * (_pad(len(out)) - len(out))
+        out += struct.pack(f"<{len(rows)}I", *(r[3] for r in rows))
+        out += b"\x00" * (_pad(len(out)) - len(out))
+        out += b"".join(r[2].encode("ascii") for r in rows)
+        #prefixes[p] = index of the first range starting at or after prefix p
+        prefixes, i = [], 0
+        for p in range(_PREFIXES):
+            while i < len(rows) and rows[i][0] >> (bits - _PREFIX_BITS) < p:
+                i += 1
+            prefixes.append(i)
+        out += b"\x00" * (_pad(len(out)) - len(out))
+        out += struct.pack(f"<{_PREFIXES}I", *prefixes)
+    out += b"\x00" * (_pad(len(out)) - len(out))
+    with open(path, "wb") as f:
+        f.write(out)
+    return len(v4), len(v6)
+
+
+def build_from_csv(csv_path: str, path: str) -> Tuple[int, int]:
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = (row for row in csv.reader(f) if row and not row[0].startswith("#"))
+        return build_index((parse_row(row) for row in rows), path)
+
+
+class GeoIP:
+    """
+    Lazily opened index from settings.geoip_db_path; every lookup returns None when no index is configured.
+    """
+    def __init__(self, path: Optional[str] = None, cache_size: int = 65536):
+        self.path = path
+        self._index: Optional[GeoIPIndex] = None
+        self._failed = False
+        #customer IPs repeat and the rules + prompt ask for the same address several times per transaction
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @property
+    def index(self) -> Optional[GeoIPIndex]:
+        if self._index is None and not self._failed:
+            path = self.path or settings.geoip_db_path
+            if path:
+                try:
+                    self._index = GeoIPIndex(path)
+                except (OSError, ValueError) as e:
+                    logger.error(f"GeoIP index unavailable: {e}")
+                    self._failed = True
+        return self._index
+
+    def open(self, path: str):
+        self.close()
+        self.path = path
+
+    def _lookup(self, ip: str) -> Optional[Tuple[str, int]]:
+        index = self.index
+        return index.lookup(ip) if index is not None else None
+
+    def country(self, ip: str) -> Optional[str]:
+        result = self.lookup(ip)
+        return result[0] if result else None
+
+    def close(self):
+        self.lookup.cache_clear()
+        if self._index is not None:
+            self._index.close()
+        self._index = None
+        self._failed = False
+        self.path = None
+
+    def stats(self) -> dict:
+        index = self.index
+        if index is None:
+            return {"loaded": False}
+        cache = self.lookup.cache_info()
+        return {
+            "loaded": True,
+            "path": index.path,
+            "ipv4_ranges": index.ipv4_ranges,
+            "ipv6_ranges": index.ipv6_ranges,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+        }
+
+
+geoip = GeoIP()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        sys.exit("usage: python -m app.utils.geoip build <ranges.csv> <index file>")
+    n4, n6 = build_from_csv(sys.argv[2], sys.argv[3])
+    print(f"wrote {n4} IPv4 and {n6} IPv6 ranges to {sys.argv[3]}")
@@ -0,0 +1,87 @@
+#Shared, long-lived httpx clients (one connection pool per provider).
+#Creating a new AsyncClient per call means a fresh TCP+TLS handshake for every webhook,
+#so the clients are created once by the app lifespan (app/main.py) and injected into the LLMs and the notifier.
+
+import httpx
+from typing import Dict
+from app.config import settings
+
+#HTTP/2 needs the optional h2 package, fall back to HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened connections for one pool using the httpcore trace extension.
+    Every request that did not open a connection reused a pooled one.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+
+    async def on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    def as_dict(self) -> dict:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+class HTTPClientPool:
+    """
+    Holds one AsyncClient per provider name ("openai", "claude", "groq", "notifier").
+    Clients are created on first use so the LLMs still work outside of the app lifespan (e.g. in tests).
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, ConnectionStats] = {}
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        stats = self._stats.setdefault(name, ConnectionStats())
+        return httpx.AsyncClient(
+            http2=settings.http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.http_connect_timeout,
+                read=settings.http_read_timeout,
+                write=settings.http_write_timeout,
+                pool=settings.http_pool_timeout,
+            ),
+            event_hooks={"request": [stats.on_request]},
+        )
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def stats(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+
+http_clients = HTTPClientPool()
@@ -0,0 +1,152 @@
+#Structured JSON logging that stays off the event loop.
+#Loggers hand records to a bounded in-memory queue (QueueHandler); a background thread (QueueListener)
+#formats them as one JSON object per line and does the blocking write, so a slow stdout never stalls a request.
+#Every record carries the transaction_id of the request it was logged for (a contextvar set with log_context),
+#and INFO/DEBUG lines can be sampled per transaction so a request's lines are kept or dropped together.
+#
+#  logger = logging.getLogger(__name__)
+#  logger.info("Provider response", extra={"provider": "groq", "duration_ms": 812})
+#  -> {"ts": "...", "level": "INFO", "logger": "app.llm.groq_llm", "message": "Provider response",
+#      "transaction_id": "tx_01", "provider": "groq", "duration_ms": 812}
+
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from app.config import settings
+from app.utils.metrics import registry
+
+transaction_id_var: ContextVar[Optional[str]] = ContextVar("transaction_id", default=None)
+
+log_records_dropped = registry.counter(
+    "risk_log_records_dropped_total", "Log records dropped because the log queue was full")
+log_records_sampled_out = registry.counter(
+    "risk_log_records_sampled_out_total", "INFO/DEBUG log records skipped by sampling")
+
+#attributes every LogRecord has, anything else on a record came in through extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "transaction_id"}
+
+
+@contextmanager
+def log_context(transaction_id: Optional[str]):
+    """
+    Tag every record logged inside the block (and in tasks started from it) with transaction_id.
+    """
+    token = transaction_id_var.set(transaction_id)
+    try:
+        yield
+    finally:
+        transaction_id_var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Attaches the current transaction_id and applies sampling. Runs in the caller, before the record is queued.
+    """
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self._threshold = int(sample_rate * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        transaction_id = transaction_id_var.get()
+        record.transaction_id = transaction_id
+        if self.sample_rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if transaction_id is not None:
+            keep = zlib.crc32(transaction_id.encode()) <= self._threshold  # same decision for every line of a transaction
+        else:
+            keep = random.random() < self.sample_rate
+        if not keep:
+            log_records_sampled_out.inc()
+        return keep
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        transaction_id = getattr(record, "transaction_id", None)
+        if transaction_id is not None:
+            entry["transaction_id"] = transaction_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queues the record as is: message formatting and JSON encoding happen on the listener thread,
+    and once max_size records are waiting further records are dropped instead of blocking the caller.
+    Takes a SimpleQueue (lock-free put, an order of magnitude cheaper than queue.Queue) and bounds it itself.
+    """
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = 10000):
+        super().__init__(log_queue)
+        self.max_size = max_size
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            log_records_dropped.inc()
+            return
+        self.queue.put_nowait(record)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging(cfg=settings, stream=None):
+    """
+    Route all logging through the queue to a JSON writer thread. Calling it again reconfigures.
+    """
+    global _listener, _handler
+    stop_logging()
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JSONFormatter())
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _handler = NonBlockingQueueHandler(log_queue, cfg.log_queue_max)
+    _handler.addFilter(ContextFilter(cfg.log_sample_rate))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(cfg.log_level.upper())
+    for name, level in cfg.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Flush the queue and stop the writer thread.
+    """
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
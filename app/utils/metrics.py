@@ -0,0 +1,212 @@
+#Prometheus metrics, served as text exposition format 0.0.4 on GET /metrics.
+#Recording is plain arithmetic on a dict keyed by the label values, without locks or per-call allocations
+#besides the label tuple: everything that records runs on the event loop thread, so there is nothing to race with.
+#Counters/histograms are created once at import time and label values are passed positionally:
+#  llm_retries.inc("groq")   stage_duration.observe(0.012, "prompt_build")   with time_stage("validate"): ...
+
+import bisect
+import math
+from time import perf_counter
+from typing import Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#seconds, from sub-millisecond stages up to slow provider calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        values = self._values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self):
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = self._values if self._values or self.labelnames else {(): 0}
+        for labels, value in list(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Per label set: one count per bucket (non-cumulative, +Inf last) and the sum.
+    """
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1  # first bucket with value <= le
+        series[-1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def clear(self):
+        self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "risk_http_requests_total", "HTTP requests by route template, method and status code", ("route", "method", "status"))
+http_request_duration = registry.histogram(
+    "risk_http_request_duration_seconds", "HTTP request latency by route template", ("route",))
+stage_duration = registry.histogram(
+    "risk_stage_duration_seconds",
+    "Time per pipeline stage (parse, validate, prompt_build, provider_call, response_parse, notification)", ("stage",))
+provider_duration = registry.histogram(
+    "risk_provider_request_duration_seconds", "Latency of LLM provider calls, including retries", ("provider",))
+provider_errors = registry.counter(
+    "risk_provider_errors_total", "LLM provider calls that failed", ("provider",))
+llm_tokens = registry.counter(
+    "risk_llm_tokens_total", "Prompt (in) and completion (out) tokens, estimated locally when the provider reports none",
+    ("provider", "model", "direction"))
+llm_retries = registry.counter(
+    "risk_llm_retries_total", "LLM requests re-queued after a rate limit response", ("provider",))
+llm_rate_limited = registry.counter(
+    "risk_llm_rate_limited_total", "HTTP 429 responses from LLM providers", ("provider",))
+llm_response_repairs = registry.counter(
+    "risk_llm_response_repairs_total",
+    "LLM replies fixed up instead of failing (trailing_comma, single_quote, comment, literal, score_clamped, action_normalized)",
+    ("kind",))
+cache_lookups = registry.counter(
+    "risk_cache_lookups_total", "Analysis cache lookups (hit, miss, bypassed on a velocity alert)", ("result",))
+decisions = registry.counter(
+    "risk_decisions_total", "Verdicts by source (prescreen, cache, llm) and recommended action", ("source", "action"))
+risk_scores = registry.histogram(
+    "risk_score", "Distribution of risk scores by verdict source", ("source",), buckets=SCORE_BUCKETS)
+notifications = registry.counter(
+    "risk_notifications_total", "Admin notifications by result (sent, failed)", ("result",))
+webhook_coalesced = registry.counter(
+    "risk_webhook_coalesced_total", "Webhook requests that joined the in-flight analysis of the same transaction_id")
+webhook_replayed = registry.counter(
+    "risk_webhook_replayed_total", "Webhook requests answered with the stored analysis of the same transaction_id")
+
+
+class time_stage:
+    """
+    Context manager recording the duration of a pipeline stage in stage_duration.
+    """
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        stage_duration.observe(perf_counter() - self.start, self.stage)
+        return False
+
+
+def record_decision(source: str, risk_analysis):
+    decisions.inc(source, risk_analysis.recommended_action)
+    risk_scores.observe(risk_analysis.risk_score, source)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests and their latency per route template (/analysis/{transaction_id},
+    not the concrete path, so label cardinality stays bounded).
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(route, scope["method"], str(status))
+            http_request_duration.observe(perf_counter() - start, route)
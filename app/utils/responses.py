@@ -0,0 +1,14 @@
+#JSON response that serializes pydantic models with their compiled serializer (model_dump_json),
+#instead of FastAPI's generic path (jsonable_encoder walks the model into dicts, then json.dumps encodes them).
+
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class ModelJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode("utf-8")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,63 @@
+"""
+Benchmark for the velocity feature store (app/business_logic/feature_store.py) with millions of keys.
+Reports update and read throughput and the memory used per key.
+
+Run: python -m benchmarks.bench_features [keys]
+"""
+import random
+import resource
+import sys
+import time
+
+from app.business_logic.feature_store import VelocityTable
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(keys: int = 2_000_000):
+    rng = random.Random(42)
+    table = VelocityTable(max_keys=keys)
+    names = [f"cust_{i:09d}" for i in range(keys)]
+    before = rss_mb()
+
+    #first sighting of every key, spread over one day
+    start = time.perf_counter()
+    for i, name in enumerate(names):
+        table.add(name, 50.0, i * 86400 / keys)
+    elapsed = time.perf_counter() - start
+    grown = rss_mb() - before
+    print(f"insert: {keys / elapsed:,.0f} new keys/s, {len(table):,} keys, "
+          f"~{grown * 1024 * 1024 / keys:,.0f} bytes/key (RSS), ~{table.memory_bytes() / keys:,.0f} bytes/key (estimate)")
+
+    #repeat traffic on a hot subset, then reads
+    now = 86400.0
+    hot = names[:: max(keys // 100_000, 1)]
+    updates = 1_000_000
+    start = time.perf_counter()
+    for i in range(updates):
+        table.add(hot[rng.randrange(len(hot))], 20.0, now + i / 1000)
+    elapsed = time.perf_counter() - start
+    print(f"update: {updates / elapsed:,.0f} updates/s ({elapsed / updates * 1e6:.2f} us each)")
+
+    reads = 500_000
+    now += updates / 1000
+    start = time.perf_counter()
+    for i in range(reads):
+        table.get(names[rng.randrange(keys)], now)
+    elapsed = time.perf_counter() - start
+    print(f"read:   {reads / elapsed:,.0f} reads/s ({elapsed / reads * 1e6:.2f} us each, all windows)")
+
+    #a bounded table keeps its size and recycles slots
+    bounded = VelocityTable(max_keys=keys // 4)
+    start = time.perf_counter()
+    for i, name in enumerate(names):
+        bounded.add(name, 50.0, float(i))
+    elapsed = time.perf_counter() - start
+    print(f"bounded to {bounded.max_keys:,} keys: {keys / elapsed:,.0f} inserts/s, {len(bounded):,} kept, "
+          f"{bounded.evicted:,} evicted (LRU), {bounded.expired:,} expired (idle)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
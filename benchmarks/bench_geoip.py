@@ -0,0 +1,83 @@
+"""
+Benchmarks for the memory-mapped GeoIP index (app/utils/geoip.py).
+loader: time to build and open an index with many ranges; lookup: address lookups per second for IPv4 and IPv6.
+
+Run: python -m benchmarks.bench_geoip [ipv4 ranges]
+"""
+import bisect
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app.utils.geoip import GeoIPIndex, build_index, parse_ip
+
+COUNTRIES = ["US", "CA", "GB", "DE", "FR", "RU", "CN", "BR", "IN", "AU"]
+
+
+def synthetic_ranges(n4: int, n6: int, rng: random.Random):
+    #disjoint ranges spread over the address space with gaps in between
+    step4 = (2 ** 32) // n4
+    for i in range(n4):
+        first = i * step4
+        yield 4, first, first + rng.randrange(1, step4), rng.choice(COUNTRIES), rng.randrange(1, 400000)
+    step6 = (2 ** 64) // n6
+    for i in range(n6):
+        first = (i * step6) << 64
+        last = ((i * step6 + rng.randrange(1, step6)) << 64) | (2 ** 64 - 1)
+        yield 6, first, last, rng.choice(COUNTRIES), rng.randrange(1, 400000)
+
+
+def loader(path: str, n4: int, n6: int):
+    start = time.perf_counter()
+    build_index(synthetic_ranges(n4, n6, random.Random(42)), path)
+    built = time.perf_counter() - start
+    print(f"build: {n4:,} IPv4 + {n6:,} IPv6 ranges in {built:.2f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        GeoIPIndex(path).close()
+    print(f"open:  {(time.perf_counter() - start) / runs * 1e6:.1f} us per open (mmap, no parsing)")
+
+
+def lookups(path: str, count: int = 500_000):
+    rng = random.Random(7)
+    index = GeoIPIndex(path)
+    v4 = [str(ipaddress.IPv4Address(rng.randrange(2 ** 32))) for _ in range(count)]
+    v6 = [str(ipaddress.IPv6Address(rng.randrange(2 ** 128))) for _ in range(count)]
+
+    for label, addresses in (("IPv4", v4), ("IPv6", v6)):
+        for ip in addresses[:50_000]:
+            index.lookup(ip)  # fault the mapped pages in first
+        start = time.perf_counter()
+        hits = 0
+        for ip in addresses:
+            if index.lookup(ip) is not None:
+                hits += 1
+        elapsed = time.perf_counter() - start
+        print(f"lookup {label}: {elapsed / count * 1e9:,.0f} ns per lookup from string ({hits / count:.0%} hits)")
+
+    #search cost alone, without parsing the address string
+    starts, prefixes = index._v4[0], index._v4[4]
+    keys = [parse_ip(ip)[1] for ip in v4]
+    start = time.perf_counter()
+    for key in keys:
+        bisect.bisect_right(starts, key, prefixes[key >> 16], prefixes[(key >> 16) + 1])
+    print(f"search IPv4: {(time.perf_counter() - start) / count * 1e9:,.0f} ns per binary search (prefix table + bisect)")
+    del starts
+    index.close()
+
+
+def main(n4: int = 1_000_000):
+    n6 = max(n4 // 5, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geoip.idx")
+        loader(path, n4, n6)
+        lookups(path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
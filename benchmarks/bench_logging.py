@@ -0,0 +1,118 @@
+"""
+Event-loop overhead of logging per request: the time a request spends inside its log calls, which is time
+the event loop can't serve anything else. Compares print() and a synchronous logging handler with the
+queue-based JSON logger of app/utils/log.py (with and without sampling), writing to a file and to a pipe
+drained at a limited rate (like stdout going to a busy log shipper, where every blocking write stalls the loop).
+
+Run: python -m benchmarks.bench_logging [requests] [pipe KB/s]
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from app.utils.log import JSONFormatter, ContextFilter, setup_logging, stop_logging, log_context
+
+LINES_PER_REQUEST = 6  # roughly what one webhook request logs on the LLM path
+logger = logging.getLogger("bench.request")
+
+
+async def request_with_print(i: int) -> float:
+    start = time.perf_counter()
+    for line in range(LINES_PER_REQUEST):
+        print(f"Analyzing transaction tx_{i} step {line} | Response time: 0.81s | Tokens: 412")
+    return time.perf_counter() - start
+
+
+async def request_with_logging(i: int) -> float:
+    start = time.perf_counter()
+    with log_context(f"tx_{i}"):
+        for line in range(LINES_PER_REQUEST):
+            logger.info(f"Analyzing transaction tx_{i} step {line}", extra={"duration_ms": 812.4, "tokens": 412})
+    return time.perf_counter() - start
+
+
+async def run(request, n: int) -> float:
+    spent = 0.0
+    for i in range(n):
+        spent += await request(i)
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # give other tasks (and the writer thread) a turn, like a real server
+    return spent / n
+
+
+@contextlib.contextmanager
+def file_sink(tmp: str):
+    with open(os.path.join(tmp, "bench.log"), "w") as out:
+        yield out
+
+
+@contextlib.contextmanager
+def pipe_sink(kb_per_second: float):
+    read_fd, write_fd = os.pipe()
+    stop = threading.Event()
+
+    def drain():
+        chunk = 4096
+        while True:
+            data = os.read(read_fd, chunk)
+            if not data:
+                return
+            if not stop.is_set():
+                time.sleep(len(data) / (kb_per_second * 1024))
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    out = os.fdopen(write_fd, "w")
+    try:
+        yield out
+    finally:
+        stop.set()  # drain the rest at full speed
+        out.close()
+        reader.join()
+        os.close(read_fd)
+
+
+def measure(sink, n: int):
+    root = logging.getLogger()
+    results = []
+    with sink() as out, contextlib.redirect_stdout(out):
+        results.append(("print()", asyncio.run(run(request_with_print, n)), None))
+        out.flush()
+
+    with sink() as out:
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(ContextFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        results.append(("sync JSON handler", asyncio.run(run(request_with_logging, n)), None))
+        root.removeHandler(handler)
+
+    for rate in (1.0, 0.1):
+        with sink() as out:
+            setup_logging(SimpleNamespace(log_level="INFO", log_levels={}, log_sample_rate=rate, log_queue_max=1_000_000), stream=out)
+            per_request = asyncio.run(run(request_with_logging, n))
+            start = time.perf_counter()
+            stop_logging()
+            results.append((f"queue JSON, sample {rate:g}", per_request, time.perf_counter() - start))
+    return results
+
+
+def main(n: int = 5_000, kb_per_second: float = 2048):
+    with tempfile.TemporaryDirectory() as tmp:
+        sinks = (("file", lambda: file_sink(tmp)), (f"pipe at {kb_per_second:g} KB/s", lambda: pipe_sink(kb_per_second)))
+        for name, sink in sinks:
+            print(f"{name}:")
+            for label, per_request, drain in measure(sink, n):
+                extra = f" (writer thread drained the rest in {drain * 1000:.0f} ms)" if drain is not None else ""
+                print(f"  {label:<24} {per_request * 1e6:9.1f} us/request on the event loop{extra}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000, float(sys.argv[2]) if len(sys.argv) > 2 else 2048)
@@ -0,0 +1,52 @@
+"""
+Recording overhead of the Prometheus metrics (app/utils/metrics.py), to check they are cheap enough to leave on.
+Reports nanoseconds per counter increment, histogram observation and timed stage, and the /metrics render time.
+
+Run: python -m benchmarks.bench_metrics [iterations]
+"""
+import sys
+import time
+
+from app.utils.metrics import Registry, time_stage, registry
+
+
+def per_call_ns(fn, n: int) -> float:
+    start = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main(n: int = 1_000_000):
+    local = Registry()
+    counter = local.counter("bench_total", "Benchmark counter", ("provider",))
+    histogram = local.histogram("bench_seconds", "Benchmark histogram", ("stage",))
+
+    def inc(n):
+        for _ in range(n):
+            counter.inc("groq")
+
+    def observe(n):
+        for i in range(n):
+            histogram.observe(i % 1000 / 1000, "provider_call")
+
+    def stage(n):
+        for _ in range(n):
+            with time_stage("bench"):
+                pass
+
+    def baseline(n):
+        for _ in range(n):
+            pass
+
+    empty = per_call_ns(baseline, n)
+    print(f"counter inc:        {per_call_ns(inc, n) - empty:,.0f} ns")
+    print(f"histogram observe:  {per_call_ns(observe, n) - empty:,.0f} ns")
+    print(f"time_stage block:   {per_call_ns(stage, n) - empty:,.0f} ns")
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"render /metrics:    {(time.perf_counter() - start) * 1000:,.2f} ms ({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
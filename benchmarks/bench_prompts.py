@@ -0,0 +1,84 @@
+"""
+Benchmark for the compact prompt builder (app/llm/prompts.py) against the previous indented-JSON prompts.
+Reports build time per prompt, estimated input tokens and the input cost they imply.
+
+Run: python -m benchmarks.bench_prompts [iterations]
+"""
+import sys
+import time
+
+from app.llm.prompts import TEMPLATES, estimate_tokens
+from benchmarks.bench_rules import traffic_mix
+
+#USD per 1M input tokens, adjust to the models and pricing actually in use
+INPUT_PRICE_PER_M = {"openai": 0.50, "claude": 15.00, "groq": 0.75}
+
+
+def legacy_prompt(transaction) -> str:
+    #the per-provider prompt as it was before the shared builder (OpenAI variant)
+    transaction_json = transaction.model_dump_json(indent=2)
+    return f"""
+You are a financial-fraud analyst.
+
+Return **only** this JSON, no markdown, no extra keys:
+
+{{
+  "risk_score": 0.0-1.0,          // float
+  "risk_factors": ["…"],          // list of short strings
+  "reasoning": "…",               // ≤ 40 words
+  "recommended_action": "allow" | "review" | "block"
+}}
+
+Assess risk using:
+• Geographic mismatch (customer ↔ card ↔ IP, high-risk country list)
+• Pattern anomalies (amount, time-of-day, velocity)
+• Payment-method risk
+• Merchant reputation / category
+
+Guidelines  
+HIGH_RISK_COUNTRIES = ['RU', 'IR', 'KP', 'VE', 'MM']
+Assign higher risk scores to combinations of multiple risk factors 
+Consider the transaction amount, higher amounts generally warrant more 
+scrutiny 
+Account for normal cross-border shopping patterns while flagging unusual 
+combinations 
+Provide actionable reasoning that explains why the transaction received 
+its risk score
+0.0-0.3 → allow 0.3-0.7 → review 0.7-1.0 → block
+
+Transaction:
+{transaction_json}
+
+"""
+
+
+def measure(build, transactions, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        build(transactions[i % len(transactions)])
+    elapsed = time.perf_counter() - start
+    sample = [build(t) for t in transactions[:1000]]
+    tokens = sum(estimate_tokens(p) for p in sample) / len(sample)
+    chars = sum(len(p) for p in sample) / len(sample)
+    return elapsed / iterations * 1e6, chars, tokens
+
+
+def main(iterations: int = 100_000):
+    transactions = traffic_mix(10_000)
+    results = {"legacy": measure(legacy_prompt, transactions, iterations)}
+    for name, template in TEMPLATES.items():
+        results[name] = measure(template.render, transactions, iterations)
+
+    legacy_tokens = results["legacy"][2]
+    print(f"{'prompt':<8} {'build us':>9} {'chars':>7} {'tokens':>7} {'vs legacy':>10}")
+    for name, (micros, chars, tokens) in results.items():
+        print(f"{name:<8} {micros:>9.2f} {chars:>7.0f} {tokens:>7.0f} {tokens / legacy_tokens - 1:>+10.0%}")
+
+    print("\ninput cost per 1M requests (USD):")
+    for name, price in INPUT_PRICE_PER_M.items():
+        before, after = legacy_tokens * price, results[name][2] * price
+        print(f"{name:<8} legacy {before:>10,.2f} -> compact {after:>10,.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,63 @@
+"""
+Benchmark for the rule pre-screen (app/business_logic/rules.py).
+Reports rule evaluations per second and how much of a typical traffic mix skips the LLM.
+
+Run: python -m benchmarks.bench_rules [iterations]
+"""
+import sys
+import time
+import random
+
+from app.models import Transaction
+from app.business_logic.rules import RuleEngine
+
+
+def make_transaction(i: int, country: str, card_country: str, amount: float) -> Transaction:
+    return Transaction(
+        transaction_id=f"tx_bench_{i}",
+        timestamp="2025-05-07T14:30:45Z",
+        amount=amount,
+        currency="USD",
+        customer={"id": f"cust_{i % 1000}", "country": country, "ip_address": "192.168.1.1"},
+        payment_method={"type": "credit_card", "last_four": "4242", "country_of_issue": card_country},
+        merchant={"id": "merch_abcde12345", "name": "Example Store", "category": "electronics"},
+    )
+
+
+def traffic_mix(n: int):
+    #mostly small domestic purchases, a few cross-border and high-risk ones
+    rng = random.Random(42)
+    transactions = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.85:
+            transactions.append(make_transaction(i, "US", "US", rng.uniform(5, 200)))
+        elif roll < 0.95:
+            transactions.append(make_transaction(i, "US", "CA", rng.uniform(50, 800)))
+        else:
+            transactions.append(make_transaction(i, "US", "RU", rng.uniform(500, 5000)))
+    return transactions
+
+
+def main(iterations: int = 200_000):
+    engine = RuleEngine()
+    transactions = traffic_mix(10_000)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        engine.evaluate(transactions[i % len(transactions)])
+    elapsed = time.perf_counter() - start
+    print(f"evaluate():  {iterations / elapsed:,.0f} evaluations/s ({elapsed / iterations * 1e6:.2f} us each)")
+
+    start = time.perf_counter()
+    decided = 0
+    for i in range(iterations):
+        if engine.prescreen(transactions[i % len(transactions)]) is not None:
+            decided += 1
+    elapsed = time.perf_counter() - start
+    print(f"prescreen(): {iterations / elapsed:,.0f} decisions/s ({elapsed / iterations * 1e6:.2f} us each)")
+    print(f"decided without the LLM: {decided / iterations:.1%} of the traffic mix")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
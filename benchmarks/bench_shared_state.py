@@ -0,0 +1,111 @@
+"""
+Analysis-cache hit ratio and lookup cost with several worker processes, per backend of app/utils/shared_state.py.
+A load balancer spreads a request stream with repeated (Zipf-distributed) cache keys round-robin over the workers;
+with per-process memory every worker has to miss on a key once, with a shared backend only the first worker does.
+Each worker is a real process. Without --redis-url the Redis backend runs against benchmarks/fake_redis.py.
+
+Run: python -m benchmarks.bench_shared_state [--workers 4] [--requests 20000] [--keys 5000] [--redis-url redis://host:6379/0]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+
+def make_stream(requests: int, keys: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return [f"cache|cust_{key}" for key in rng.choices(range(keys), weights=weights, k=requests)]
+
+
+def worker(url: str, keys: List[str], results):
+    from app.utils.shared_state import make_shared_state
+
+    async def run():
+        state = make_shared_state(url, prefix="bench:")
+        hits = 0
+        start = time.perf_counter()
+        for key in keys:
+            if await state.get(key) is not None:
+                hits += 1
+            else:
+                await state.set(key, "analysis", ttl=300)
+        elapsed = time.perf_counter() - start
+        await state.aclose()
+        return hits, elapsed
+
+    results.put(asyncio.run(run()))
+
+
+def run_fake_redis(ports):
+    from benchmarks.fake_redis import FakeRedis
+
+    async def serve():
+        server = FakeRedis()
+        ports.put(await server.start())
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def measure(ctx, url: str, stream: List[str], workers: int) -> dict:
+    results = ctx.Queue()
+    slices = [stream[i::workers] for i in range(workers)]
+    processes = [ctx.Process(target=worker, args=(url, keys, results)) for keys in slices]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=600) for _ in processes]
+    for process in processes:
+        process.join()
+    hits = sum(hits for hits, _ in outcomes)
+    busiest = max(elapsed for _, elapsed in outcomes)
+    return {
+        "hit_ratio": hits / len(stream),
+        "us_per_lookup": sum(elapsed for _, elapsed in outcomes) / len(stream) * 1e6,
+        "lookups_per_s": len(stream) / busiest,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_shared_state")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=5000, help="distinct cache keys in the stream")
+    parser.add_argument("--redis-url", help="real Redis server to use instead of the local stand-in")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    ctx = multiprocessing.get_context("spawn")
+    stream = make_stream(args.requests, args.keys, args.seed)
+    fake = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        ports = ctx.Queue()
+        fake = ctx.Process(target=run_fake_redis, args=(ports,), daemon=True)
+        fake.start()
+        redis_url = f"redis://127.0.0.1:{ports.get(timeout=30)}/0"
+
+    print(f"{args.requests} lookups over {args.keys} keys, {args.workers} worker processes")
+    print(f"{'':22} {'hit ratio':>10} {'us/lookup':>10} {'lookups/s':>10}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            backends = [
+                ("single process", "memory", 1),
+                ("memory per worker", "memory", args.workers),
+                ("sqlite (WAL) shared", f"sqlite:///{os.path.join(tmp, 'state.db')}", args.workers),
+                ("redis shared", redis_url, args.workers),
+            ]
+            for label, url, workers in backends:
+                result = measure(ctx, url, stream, workers)
+                print(f"{label:22} {result['hit_ratio']:10.1%} {result['us_per_lookup']:10.1f} {result['lookups_per_s']:10,.0f}")
+    finally:
+        if fake is not None:
+            fake.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Worker cold start: wall time and resident memory of importing the app in a fresh interpreter, with the providers
+loaded lazily (only on first use, the default) vs all constructed at startup (what every worker paid before the
+provider registry). Each scenario runs in its own process, the median of the runs is reported.
+
+Run: python -m benchmarks.bench_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2**20
+base = rss_mb()
+start = time.perf_counter()
+import {module}
+from app.business_logic import risk_analyzer
+imported = time.perf_counter()
+eager = {eager}
+if eager:
+    for name in risk_analyzer.llm_provider:
+        risk_analyzer.llm_provider[name]
+done = time.perf_counter()
+print(json.dumps({{
+    "ms": (done - start) * 1000,
+    "providers_ms": (done - imported) * 1000,
+    "rss_mb": rss_mb() - base,
+    "modules": len(sys.modules),
+}}))
+"""
+
+SCENARIOS = [
+    ("app.main, lazy providers", "app.main", False),
+    ("app.main, all providers", "app.main", True),
+    ("risk_analyzer only, lazy", "app.business_logic.risk_analyzer", False),
+    ("risk_analyzer only, all providers", "app.business_logic.risk_analyzer", True),
+]
+
+
+def run_once(module: str, eager: bool) -> dict:
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL="WARNING")
+    result = subprocess.run([sys.executable, "-c", CHILD.format(module=module, eager=eager)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int = 7):
+    print(f"{'':36} {'import':>10} {'providers':>10} {'rss':>9} {'modules':>8}")
+    for label, module, eager in SCENARIOS:
+        samples = [run_once(module, eager) for _ in range(runs)]
+        median = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+        print(f"{label:36} {median['ms']:8.1f}ms {median['providers_ms']:8.2f}ms "
+              f"{median['rss_mb']:7.1f}MB {median['modules']:8.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
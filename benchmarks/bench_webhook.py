@@ -0,0 +1,207 @@
+"""
+Load test of POST /webhook/transaction against a local fake provider (benchmarks/fake_provider.py).
+Requests are sent open-loop at a fixed rate, and latency is measured from each request's scheduled send time,
+so a slow server can't hide its queueing delay by slowing the load generator down.
+Reports p50/p95/p99 latency, throughput, error rate and CPU time per request, and exits with status 1 when
+--max-p99-ms / --max-error-rate are exceeded so it can gate a deploy.
+
+By default the app runs in this process over an ASGI transport (CPU per request then includes the load generator),
+the fake provider runs in a child process. With --url an already running server is driven instead;
+pass its --pid to report its CPU time (Linux).
+
+Run: python -m benchmarks.bench_webhook [--rps 50] [--duration 20] [--provider groq] [--stream]
+                                        [--latency lognormal:300,0.5] [--rate-429 0.02] [--malformed 0.01] [--think 0.3]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+from base64 import b64encode
+from typing import List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fake_provider import FakeProvider, add_arguments, config_from_args
+
+COUNTRIES = ["US", "US", "US", "GB", "DE", "CA", "FR", "BR", "NG", "RU"]
+CATEGORIES = ["electronics", "grocery", "travel", "gaming", "fashion"]
+
+
+def make_transaction(rng: random.Random, i: int) -> dict:
+    #unique ids (no analysis cache hits) over a bounded set of customers, cards and IPs
+    customer = rng.randrange(5000)
+    return {
+        "transaction_id": f"load_{os.getpid()}_{i}",
+        "timestamp": "2025-05-07T14:30:45Z",
+        "amount": round(rng.lognormvariate(4.0, 1.2), 2),
+        "currency": "USD",
+        "customer": {
+            "id": f"cust_{customer}",
+            "country": COUNTRIES[customer % len(COUNTRIES)],
+            "ip_address": f"10.{customer % 256}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+        },
+        "payment_method": {"type": "credit_card", "last_four": f"{customer % 10000:04d}", "country_of_issue": rng.choice(COUNTRIES)},
+        "merchant": {"id": f"merch_{rng.randrange(200)}", "name": "Load Store", "category": rng.choice(CATEGORIES)},
+    }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def process_cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    if pid is None:
+        return time.process_time()
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def run_fake_provider(config, ports):
+    async def serve():
+        provider = FakeProvider(config)
+        ports.put(await provider.start())
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+async def drive(client: httpx.AsyncClient, url: str, headers: dict, rps: float, duration: float,
+                seed: int) -> Tuple[List[float], List[str], float]:
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def send(scheduled: float, transaction: dict):
+        try:
+            response = await client.post(url, json=transaction, headers=headers)
+            if response.status_code != 200:
+                errors.append(str(response.status_code))
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(loop.time() - scheduled)
+
+    tasks = []
+    start = loop.time()
+    for i in range(int(rps * duration)):
+        scheduled = start + i / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(scheduled, make_transaction(rng, i))))
+    await asyncio.gather(*tasks)
+    return latencies, errors, loop.time() - start
+
+
+async def run(args) -> dict:
+    from app.config import settings
+    username, password = args.username or settings.auth_username, args.password or settings.auth_password
+    auth = b64encode(f"{username}:{password}".encode()).decode("ascii")
+    headers = {"Authorization": f"Basic {auth}"}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(args.timeout)
+
+    provider = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout)
+        app_context = contextlib.nullcontext()
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        ports = ctx.Queue()
+        provider = ctx.Process(target=run_fake_provider, args=(config_from_args(args), ports), daemon=True)
+        provider.start()
+        base = f"http://127.0.0.1:{ports.get(timeout=30)}"
+
+        from app.main import app
+        settings.openai_api_url = f"{base}/v1/chat/completions"
+        settings.groq_api_url = f"{base}/v1/chat/completions"
+        settings.anthropic_api_url = f"{base}/v1/messages"
+        settings.notifyadmin_api_url = f"{base}/v1/notify"
+        settings.llm_provider = args.provider
+        settings.streaming_enabled = args.stream
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=timeout)
+        app_context = app.router.lifespan_context(app)
+
+    try:
+        async with app_context, client:
+            cpu_before = process_cpu_seconds(args.pid)
+            latencies, errors, elapsed = await drive(client, "/webhook/transaction", headers, args.rps, args.duration, args.seed)
+            cpu_after = process_cpu_seconds(args.pid)
+            fake_stats = None
+            if provider is not None:
+                async with httpx.AsyncClient() as stats_client:
+                    fake_stats = (await stats_client.get(f"{base}/stats")).json()
+    finally:
+        if provider is not None:
+            provider.terminate()
+
+    latencies.sort()
+    total = len(latencies)
+    cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+    statuses = {}
+    for error in errors:
+        statuses[error] = statuses.get(error, 0) + 1
+    return {
+        "target_rps": args.rps,
+        "requests": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round((total - len(errors)) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "errors": statuses,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "cpu_ms_per_request": round(cpu / total * 1000, 3) if cpu is not None and total else None,
+        "fake_provider": fake_stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_webhook")
+    parser.add_argument("--rps", type=float, default=50.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--provider", default="groq", choices=["openai", "claude", "groq"])
+    parser.add_argument("--stream", action="store_true", help="enable streaming_enabled for the run")
+    parser.add_argument("--url", help="drive an already running server instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="pid of the --url server, for its CPU time")
+    parser.add_argument("--username", help="basic auth user (default: settings.auth_username)")
+    parser.add_argument("--password", help="basic auth password (default: settings.auth_password)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--max-p99-ms", type=float, help="fail when p99 latency is above this")
+    parser.add_argument("--max-error-rate", type=float, help="fail when the error rate is above this (0.0-1.0)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)  # the app logs several INFO lines per request, keep them out of the report
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['requests']} requests at {args.rps:g} rps target over {report['elapsed_s']}s: "
+              f"{report['throughput_rps']} ok/s, error rate {report['error_rate']:.2%} {report['errors'] or ''}")
+        print(f"latency p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  p99 {report['p99_ms']} ms  max {report['max_ms']} ms")
+        if report["cpu_ms_per_request"] is not None:
+            print(f"cpu {report['cpu_ms_per_request']} ms/request")
+        if report["fake_provider"]:
+            print(f"fake provider: {report['fake_provider']}")
+
+    failed = (args.max_p99_ms is not None and report["p99_ms"] > args.max_p99_ms) or \
+             (args.max_error_rate is not None and report["error_rate"] > args.max_error_rate)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
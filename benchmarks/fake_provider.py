@@ -0,0 +1,209 @@
+"""
+Local stand-in for the LLM providers and the admin notification API, used by the webhook load test.
+Speaks the OpenAI / Groq chat completions and Anthropic messages wire formats, with and without SSE streaming.
+
+Routes:
+  POST /v1/chat/completions   OpenAI and Groq
+  POST /v1/messages           Anthropic
+  POST /v1/notify             admin notifications (always 200)
+  GET  /stats                 request / 429 / malformed / <think> counters
+
+Latency specs (milliseconds): "fixed:50", "uniform:20,80", "lognormal:300,0.5" (median, sigma).
+
+Run: python -m benchmarks.fake_provider [--port 8900] [--latency lognormal:300,0.5] [--rate-429 0.02]
+                                        [--malformed 0.01] [--think 0.3]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict
+
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    Seconds-returning sampler for a "kind:params" latency spec in milliseconds.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Invalid latency spec {spec!r} (fixed:MS, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA)")
+
+
+@dataclass
+class FakeProviderConfig:
+    latency: str = "lognormal:300,0.5"
+    rate_429: float = 0.0  # share of LLM requests answered with 429 + retry-after
+    retry_after: float = 0.05
+    malformed: float = 0.0  # share of answers that are not valid JSON (missing comma)
+    think: float = 0.0  # share of answers wrapped in a <think> block
+    stream_chunk: int = 12  # characters per SSE delta
+    seed: int = 42
+
+
+@dataclass
+class FakeProvider:
+    config: FakeProviderConfig = field(default_factory=FakeProviderConfig)
+    counters: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(
+        ("requests", "rate_limited", "malformed", "think", "streamed", "notifications"), 0))
+
+    def __post_init__(self):
+        self.rng = random.Random(self.config.seed)
+        self.sample_latency = latency_sampler(self.config.latency, self.rng)
+        self._server = None
+
+    def answer(self) -> str:
+        score = round(self.rng.random(), 2)
+        action = "allow" if score < 0.3 else "review" if score < 0.7 else "block"
+        text = json.dumps({
+            "risk_score": score,
+            "risk_factors": ["Synthetic factor"],
+            "reasoning": "Load test answer",
+            "recommended_action": action,
+        })
+        if self.rng.random() < self.config.malformed:
+            self.counters["malformed"] += 1
+            text = text.replace(', "risk_factors"', ' "risk_factors"', 1)
+        if self.rng.random() < self.config.think:
+            self.counters["think"] += 1
+            text = "<think>" + "Weighing the geographic and amount signals. " * 20 + "</think>\n" + text
+        return text
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        #minimal HTTP/1.1 with keep-alive, enough for httpx
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._route(method, path, json.loads(body) if body else {}, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: dict, writer: asyncio.StreamWriter):
+        if method == "GET" and path == "/stats":
+            return await self._send(writer, 200, self.counters)
+        if path == "/v1/notify":
+            self.counters["notifications"] += 1
+            return await self._send(writer, 200, {"status": "received"})
+        if path not in ("/v1/chat/completions", "/v1/messages"):
+            return await self._send(writer, 404, {"error": {"message": "not found"}})
+
+        self.counters["requests"] += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.rng.random() < self.config.rate_429:
+            self.counters["rate_limited"] += 1
+            return await self._send(writer, 429, {"error": {"message": "Rate limit reached"}},
+                                    {"retry-after": str(self.config.retry_after)})
+
+        anthropic = path == "/v1/messages"
+        text = self.answer()
+        if body.get("stream"):
+            self.counters["streamed"] += 1
+            return await self._stream(writer, text, anthropic)
+        if anthropic:
+            payload = {
+                "content": [{"type": "text", "text": text}],
+                "usage": {"input_tokens": 300, "output_tokens": len(text) // 4},
+            }
+        else:
+            payload = {
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 300, "completion_tokens": len(text) // 4, "total_tokens": 300 + len(text) // 4},
+            }
+        await self._send(writer, 200, payload)
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: dict, extra: Dict[str, str] = None):
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}", "content-type: application/json",
+                f"content-length: {len(body)}"]
+        head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, text: str, anthropic: bool):
+        writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\ntransfer-encoding: chunked\r\n\r\n")
+        step = self.config.stream_chunk
+        for i in range(0, len(text), step):
+            piece = text[i:i + step]
+            if anthropic:
+                event = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": piece}}
+                data = f"event: content_block_delta\ndata: {json.dumps(event)}\n\n"
+            else:
+                data = f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n"
+            self._chunk(writer, data)
+            await writer.drain()
+        self._chunk(writer, 'event: message_stop\ndata: {"type":"message_stop"}\n\n' if anthropic else "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client closed the stream early once it had the answer
+
+    @staticmethod
+    def _chunk(writer: asyncio.StreamWriter, data: str):
+        raw = data.encode()
+        writer.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+
+
+async def serve(config: FakeProviderConfig, host: str, port: int):
+    provider = FakeProvider(config)
+    port = await provider.start(host, port)
+    print(f"fake provider listening on http://{host}:{port} (latency {config.latency}, 429 {config.rate_429:.0%}, "
+          f"malformed {config.malformed:.0%}, think {config.think:.0%})")
+    await asyncio.Event().wait()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default=FakeProviderConfig.latency, help="fixed:MS, uniform:MIN,MAX or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of LLM requests rejected with 429")
+    parser.add_argument("--malformed", type=float, default=0.0, help="share of answers that are not valid JSON")
+    parser.add_argument("--think", type=float, default=0.0, help="share of answers wrapped in <think> reasoning")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def config_from_args(args) -> FakeProviderConfig:
+    return FakeProviderConfig(latency=args.latency, rate_429=args.rate_429, malformed=args.malformed,
+                              think=args.think, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(config_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
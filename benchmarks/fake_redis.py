@@ -0,0 +1,156 @@
+"""
+Local stand-in for a Redis server: speaks RESP2 over TCP and implements the commands used by RedisState
+(app/utils/shared_state.py) against an in-memory dict: PING, AUTH, SELECT, GET, SET [NX] [PX|EX], DEL, INCR, INCRBY,
+PEXPIRE [NX], PTTL, SCAN [MATCH] [COUNT], DBSIZE, FLUSHDB. Good enough for tests and benchmarks without a Redis install.
+
+Run: python -m benchmarks.fake_redis [--port 6390] [--password secret]
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                self.commands += 1
+                name = command[0].upper()
+                if name == b"AUTH":
+                    authenticated = command[-1].decode() == self.password
+                    reply = b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n"
+                elif not authenticated:
+                    reply = b"-NOAUTH Authentication required.\r\n"
+                else:
+                    reply = self._execute(name, command[1:])
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, name: bytes, args: List[bytes]) -> bytes:
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"GET":
+            return _bulk(self._live(args[0]))
+        if name == b"SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.time() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires_at = time.time() + int(args[2 + options.index(b"EX") + 1])
+            if b"NX" in options and self._live(key) is not None:
+                return b"$-1\r\n"
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = sum(1 for key in args if self._live(key) is not None and self.data.pop(key, None))
+            return b":%d\r\n" % removed
+        if name in (b"INCR", b"INCRBY"):
+            key = args[0]
+            amount = int(args[1]) if name == b"INCRBY" else 1
+            current = self._live(key)
+            try:
+                value = (int(current) if current is not None else 0) + amount
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+            self.data[key] = (str(value).encode(), self.data[key][1] if current is not None else None)
+            return b":%d\r\n" % value
+        if name == b"PEXPIRE":
+            key, options = args[0], [a.upper() for a in args[2:]]
+            if self._live(key) is None or (b"NX" in options and self.data[key][1] is not None):
+                return b":0\r\n"
+            self.data[key] = (self.data[key][0], time.time() + int(args[1]) / 1000)
+            return b":1\r\n"
+        if name == b"PTTL":
+            if self._live(args[0]) is None:
+                return b":-2\r\n"
+            expires_at = self.data[args[0]][1]
+            return b":%d\r\n" % (-1 if expires_at is None else int((expires_at - time.time()) * 1000))
+        if name == b"SCAN":
+            #one pass over everything, the cursor is always finished
+            options = [a.upper() for a in args]
+            pattern = args[options.index(b"MATCH") + 1].decode() if b"MATCH" in options else "*"
+            keys = [key for key in list(self.data) if self._live(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)]
+            return b"*2\r\n" + _bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(_bulk(key) for key in keys)
+        if name == b"DBSIZE":
+            return b":%d\r\n" % sum(1 for key in list(self.data) if self._live(key) is not None)
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        server = FakeRedis(args.password)
+        port = await server.start(args.host, args.port)
+        print(f"fake redis listening on redis://{args.host}:{port}/0")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()